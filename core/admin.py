@@ -1,5 +1,6 @@
 from django.contrib.admin import AdminSite
 from django.contrib.admin.apps import AdminConfig
+from django.urls import path
 from django.utils.translation import gettext_lazy as _
 
 
@@ -11,6 +12,17 @@ class KabhishekAdminSite(AdminSite):
     site_header = _('Kabhishek18 Portfolio Admin')
     index_title = _('Dashboard')
     
+    def get_urls(self):
+        """Add the request profiles (core.middleware.ProfilerMiddleware)"""
+        from core import views
+        
+        urls = [
+            path('profiles/', self.admin_view(views.profile_list), name='profiles'),
+            path('profiles/<str:name>/', self.admin_view(views.profile_detail), name='profile_detail'),
+            path('profiles/<str:name>/download/', self.admin_view(views.profile_download), name='profile_download'),
+        ]
+        return urls + super().get_urls()
+    
     def get_app_list(self, request, app_label=None):
         """Customize the admin sidebar to group apps in a more user-friendly way"""
         app_list = super().get_app_list(request, app_label)
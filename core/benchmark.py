@@ -0,0 +1,235 @@
+"""
+In-process request benchmarks: each scenario is requested repeatedly through
+Django's test client, recording latency and query counts per request. Also
+a concurrent read/write benchmark of SQLite configurations.
+"""
+import gc
+import os
+import random
+import sqlite3
+import statistics
+import threading
+import time
+
+from django.apps import apps
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .db import apply_sqlite_pragmas
+
+
+class Scenario:
+    """
+    A named request to benchmark. ``paths`` is a list of URLs requested in
+    turn (e.g. different pages); ``user`` logs the client in first.
+    """
+    def __init__(self, name, paths, user=None):
+        self.name = name
+        self.paths = paths
+        self.user = user
+
+    def get_client(self):
+        client = Client()
+        if self.user is not None:
+            client.force_login(self.user)
+        return client
+
+
+def create_missing_tables():
+    """
+    Create tables for models that migrations don't cover (the jitsi app
+    has no migrations yet), so a fresh test database has every table.
+    """
+    existing = set(connection.introspection.table_names())
+    with connection.schema_editor() as editor:
+        for model in apps.get_models():
+            if model._meta.managed and not model._meta.proxy and model._meta.db_table not in existing:
+                editor.create_model(model)
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(scenario, requests=200, warmup=20):
+    """Request a scenario ``warmup`` + ``requests`` times; returns its statistics"""
+    client = scenario.get_client()
+    paths = scenario.paths
+    for i in range(warmup):
+        client.get(paths[i % len(paths)])
+
+    timings = []
+    queries = []
+    statuses = {}
+    gc.collect()
+    started = time.perf_counter()
+    for i in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            request_started = time.perf_counter()
+            response = client.get(paths[i % len(paths)])
+            timings.append((time.perf_counter() - request_started) * 1000)
+        queries.append(len(captured.captured_queries))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        'requests': requests,
+        'throughput_rps': round(requests / elapsed, 2),
+        'latency_ms': {
+            'min': round(timings[0], 3),
+            'p50': round(percentile(timings, 0.50), 3),
+            'p90': round(percentile(timings, 0.90), 3),
+            'p99': round(percentile(timings, 0.99), 3),
+            'max': round(timings[-1], 3),
+            'mean': round(statistics.fmean(timings), 3),
+        },
+        'queries': {
+            'min': min(queries),
+            'mean': round(statistics.fmean(queries), 2),
+            'max': max(queries),
+        },
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def compare_results(baseline, current, threshold=0.10):
+    """
+    Compare two benchmark result files. Returns a list of
+    (scenario, metric, baseline value, current value, change, regressed).
+    Latency or throughput worse by more than ``threshold`` (a fraction), or
+    any rise in the mean query count, counts as a regression.
+    """
+    rows = []
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        metrics = (
+            ('p50_ms', before['latency_ms']['p50'], result['latency_ms']['p50']),
+            ('p99_ms', before['latency_ms']['p99'], result['latency_ms']['p99']),
+            ('queries', before['queries']['mean'], result['queries']['mean']),
+            ('throughput_rps', before['throughput_rps'], result['throughput_rps']),
+        )
+        for metric, old, new in metrics:
+            change = (new - old) / old if old else 0.0
+            if metric == 'throughput_rps':
+                regressed = change < -threshold
+            elif metric == 'queries':
+                regressed = new > old
+            else:
+                regressed = change > threshold
+            rows.append((name, metric, old, new, change, regressed))
+    return rows
+
+
+def latency_summary(timings):
+    timings.sort()
+    return {
+        'p50': round(percentile(timings, 0.50), 3) if timings else None,
+        'p99': round(percentile(timings, 0.99), 3) if timings else None,
+        'max': round(timings[-1], 3) if timings else None,
+    }
+
+
+def run_sqlite_concurrency(path, pragmas, readers=4, writers=2, seconds=5.0, rows=10000, timeout=5.0):
+    """
+    Hammer a fresh SQLite database at ``path`` from ``readers`` threads
+    (50-row range reads) and ``writers`` threads (single-row update
+    transactions) for ``seconds``, each with its own connection set up with
+    ``pragmas``. Like Django, connections use autocommit and a ``timeout``
+    second busy timeout. Returns throughput, latency (ms) and the number of
+    "database is locked" errors.
+    """
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    def connect():
+        connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        apply_sqlite_pragmas(connection.cursor(), pragmas)
+        return connection
+
+    setup = connect()
+    setup.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, title TEXT, body TEXT, updated REAL)')
+    setup.execute('BEGIN')
+    setup.executemany(
+        'INSERT INTO item (id, title, body, updated) VALUES (?, ?, ?, ?)',
+        ((i, f'Item {i}', 'x' * 500, 0.0) for i in range(1, rows + 1)),
+    )
+    setup.execute('COMMIT')
+    setup.close()
+
+    results = {'read': [], 'write': []}
+    errors = {'read': 0, 'write': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(readers + writers + 1)
+    deadline = [0.0]
+
+    def reader(seed):
+        rng = random.Random(seed)
+        connection = connect()
+        timings = []
+        failures = 0
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            start = rng.randrange(1, rows - 50)
+            started = time.perf_counter()
+            try:
+                connection.execute('SELECT id, title, body FROM item WHERE id BETWEEN ? AND ?', (start, start + 49)).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            except sqlite3.OperationalError:
+                failures += 1
+        connection.close()
+        with lock:
+            results['read'].extend(timings)
+            errors['read'] += failures
+
+    def writer(seed):
+        rng = random.Random(seed)
+        connection = connect()
+        timings = []
+        failures = 0
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                connection.execute('BEGIN')
+                connection.execute(
+                    'UPDATE item SET body = ?, updated = ? WHERE id = ?',
+                    ('y' * rng.randrange(100, 1000), time.time(), rng.randrange(1, rows + 1)),
+                )
+                connection.execute('COMMIT')
+                timings.append((time.perf_counter() - started) * 1000)
+            except sqlite3.OperationalError:
+                failures += 1
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+        connection.close()
+        with lock:
+            results['write'].extend(timings)
+            errors['write'] += failures
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(readers + i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + seconds
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'reads_per_second': round(len(results['read']) / elapsed, 1),
+        'writes_per_second': round(len(results['write']) / elapsed, 1),
+        'read_latency_ms': latency_summary(results['read']),
+        'write_latency_ms': latency_summary(results['write']),
+        'locked_errors': errors['read'] + errors['write'],
+    }
@@ -0,0 +1,308 @@
+"""
+A two-tier cache backend: a small in-process LRU (L1) in front of a cache
+shared by all processes (L2, e.g. Redis or the filesystem).
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'shared',  # alias of the L2 cache
+            'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5},
+        },
+        'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://...'},
+    }
+
+L1 is kept coherent per key: every write stores a new version next to the
+entry in L2 (under "<key>:version"), and an L1 hit older than
+STAMP_CHECK_INTERVAL seconds is served only if that version is unchanged,
+so a write invalidates the key it wrote and nothing else. clear() bumps a
+stamp in L2 that makes every process drop its whole L1 on its next check.
+L1 entries also expire after L1_TIMEOUT seconds, which bounds staleness if
+a version check is missed.
+
+get_or_set() with a callable protects against stampedes. Values stay in L2
+for STALE_TIMEOUT seconds past their timeout. When a popular key expires,
+one caller recomputes it: within a process the others wait for that
+thread, and across processes a lock key in L2 decides. Meanwhile everyone
+else is served the stale value, or waits up to LOCK_WAIT seconds if there
+is none.
+
+Counters and locks meant to be atomic (incr(), add()) belong on the L2
+alias directly: here incr() is a read-modify-write like BaseCache's. The
+cross-process lock is only as atomic as L2's add(): Redis's is, the
+filesystem cache's is best-effort.
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metrics import count_cache
+
+CLEAR_STAMP_KEY = 'core.cache:cleared'
+
+_missing = object()
+
+
+def version_key(key):
+    """The L2 key holding the version of the entry stored under ``key``"""
+    return f'{key}:version'
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = location or options.get('L2', 'shared')
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self.stamp_check_interval = float(options.get('STAMP_CHECK_INTERVAL', 1))
+        self.stale_timeout = int(options.get('STALE_TIMEOUT', 60))
+        self.lock_timeout = int(options.get('LOCK_TIMEOUT', 30))
+        self.lock_wait = float(options.get('LOCK_WAIT', 10))
+        self.name = options.get('NAME', 'tiered')
+
+        # key -> (pickled value, soft expiry (time.time()) or None, version,
+        #         L1 expiry (time.monotonic()), version checked at (time.monotonic()))
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._stamp_checked_at = 0
+        # In-flight get_or_set() computations in this process, by key
+        self._flights = {}
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    # L1
+
+    def _check_stamp(self):
+        """Drop L1 if another process has cleared the cache since we last looked"""
+        now = time.monotonic()
+        if now - self._stamp_checked_at < self.stamp_check_interval:
+            return
+        stamp = self.l2.get(CLEAR_STAMP_KEY)
+        if stamp is None:
+            # Missing, evicted or cleared: start from a value no process has seen before
+            self.l2.add(CLEAR_STAMP_KEY, time.time_ns(), None)
+            stamp = self.l2.get(CLEAR_STAMP_KEY)
+        with self._lock:
+            self._stamp_checked_at = now
+            if stamp != self._stamp:
+                if self._stamp is not None:
+                    # On the first check there is nothing to compare with;
+                    # per-key versions cover entries written before it
+                    self._l1.clear()
+                self._stamp = stamp
+
+    def _l1_get(self, key):
+        """(value, soft expiry, version) if L1 has a current entry for ``key``"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[3] <= now:
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+        if now - entry[4] >= self.stamp_check_interval:
+            # Written by another process since?
+            if self.l2.get(version_key(key)) != entry[2]:
+                self._l1_delete(key, entry[2])
+                return None
+            with self._lock:
+                if key in self._l1 and self._l1[key][2] == entry[2]:
+                    self._l1[key] = entry[:4] + (now,)
+        return pickle.loads(entry[0]), entry[1], entry[2]
+
+    def _l1_set(self, key, value, soft_expires, version):
+        # Pickled, like LocMemCache, so callers can't mutate cached objects
+        now = time.monotonic()
+        entry = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), soft_expires, version, now + self.l1_timeout, now)
+        with self._lock:
+            self._l1[key] = entry
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key, version=_missing):
+        """Drop ``key`` from L1 (only if it still holds ``version``, when given)"""
+        with self._lock:
+            if version is _missing or self._l1.get(key, (None,) * 3)[2] == version:
+                self._l1.pop(key, None)
+
+    # Entries are stored in L2 as (value, soft expiry, version), kept
+    # STALE_TIMEOUT seconds past the soft expiry for get_or_set() to serve
+    # while refreshing. The version is also stored on its own under
+    # version_key(key), so L1 hits are validated without fetching the value.
+
+    def _l2_get(self, key):
+        entry = self.l2.get(key)
+        if not isinstance(entry, tuple) or len(entry) != 3:
+            # Missing, or written by an older release in another format
+            return None
+        return entry
+
+    def _get_entry(self, key):
+        """(value, soft expiry, version) from L1 or L2, possibly stale, or None"""
+        self._check_stamp()
+        entry = self._l1_get(key)
+        if entry is not None and not self._is_stale(entry):
+            count_cache(f'{self.name}_l1', hits=1)
+            return entry
+        count_cache(f'{self.name}_l1', misses=1)
+
+        entry = self._l2_get(key)
+        count_cache(f'{self.name}_l2', hits=entry is not None, misses=entry is None)
+        if entry is None:
+            return None
+        if not self._is_stale(entry):
+            self._l1_set(key, *entry)
+        return entry
+
+    def _is_stale(self, entry):
+        return entry[1] is not None and entry[1] <= time.time()
+
+    def _timeouts(self, timeout):
+        """(soft expiry, L2 timeout) for a cache timeout"""
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        if timeout is None:
+            return None, None
+        return time.time() + timeout, timeout + self.stale_timeout
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        entry = self._get_entry(key)
+        if entry is None or self._is_stale(entry):
+            return default
+        return entry[0]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None and timeout <= 0:
+            self._delete(key)
+            return
+        soft_expires, l2_timeout = self._timeouts(timeout)
+        version = new_version()
+        self.l2.set_many({key: (value, soft_expires, version), version_key(key): version}, l2_timeout)
+        self._l1_set(key, value, soft_expires, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        entry = self._l2_get(key)
+        if entry is not None and self._is_stale(entry):
+            # Logically expired: make room for the new value
+            self.l2.delete(key)
+        soft_expires, l2_timeout = self._timeouts(timeout)
+        version = new_version()
+        if not self.l2.add(key, (value, soft_expires, version), l2_timeout):
+            return False
+        self.l2.set(version_key(key), version, l2_timeout)
+        self._l1_set(key, value, soft_expires, version)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        entry = self._l2_get(full_key)
+        if entry is None or self._is_stale(entry):
+            return False
+        self.set(key, entry[0], timeout, version=version)
+        return True
+
+    def delete(self, key, version=None):
+        return self._delete(self.make_and_validate_key(key, version=version))
+
+    def _delete(self, key):
+        deleted = self.l2.delete(key)
+        self.l2.delete(version_key(key))
+        self._l1_delete(key)
+        return deleted
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def clear(self):
+        self.l2.clear()
+        # A new stamp makes the other processes drop their L1 too
+        stamp = time.time_ns()
+        self.l2.set(CLEAR_STAMP_KEY, stamp, None)
+        with self._lock:
+            self._l1.clear()
+            self._stamp = stamp
+            self._stamp_checked_at = time.monotonic()
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Like BaseCache.get_or_set(), but when ``default`` is a callable only
+        one caller at a time computes a missing or expired value; the others
+        get the stale value meanwhile, or wait for the new one.
+        """
+        if not callable(default):
+            return super().get_or_set(key, default, timeout, version)
+
+        full_key = self.make_and_validate_key(key, version=version)
+        entry = self._get_entry(full_key)
+        if entry is not None and not self._is_stale(entry):
+            return entry[0]
+
+        # Single flight within this process
+        with self._lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = threading.Event()
+        if not leader:
+            if entry is not None:
+                return entry[0]
+            flight.wait(self.lock_wait)
+            entry = self._get_entry(full_key)
+            if entry is not None:
+                return entry[0]
+            return self._compute(key, default, timeout, version)
+
+        try:
+            return self._refresh(key, full_key, entry, default, timeout, version)
+        finally:
+            with self._lock:
+                self._flights.pop(full_key, None)
+            flight.set()
+
+    def _refresh(self, key, full_key, stale_entry, default, timeout, version):
+        """Recompute a value, taking the L2 lock so one process does it at a time"""
+        lock_key = f'{full_key}:lock'
+        if self.l2.add(lock_key, 1, self.lock_timeout):
+            try:
+                return self._compute(key, default, timeout, version)
+            finally:
+                self.l2.delete(lock_key)
+
+        if stale_entry is not None:
+            # Another process is refreshing it
+            return stale_entry[0]
+        deadline = time.monotonic() + self.lock_wait
+        delay = 0.005
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+            entry = self._l2_get(full_key)
+            if entry is not None and not self._is_stale(entry):
+                self._l1_set(full_key, *entry)
+                return entry[0]
+        # The lock holder died or is too slow: compute it ourselves
+        return self._compute(key, default, timeout, version)
+
+    def _compute(self, key, default, timeout, version):
+        value = default()
+        self.set(key, value, timeout, version=version)
+        return value
@@ -0,0 +1,83 @@
+"""
+Database configuration: persistent connections with health checks for every
+backend, and PRAGMA tuning for SQLite.
+
+SQLite's defaults (a rollback journal and synchronous=FULL) make every write
+lock out readers and wait on an fsync. In WAL mode readers and a writer work
+concurrently, and synchronous=NORMAL is still safe against application
+crashes in WAL mode (a power loss can lose the last commits, never corrupt
+the database).
+
+WAL is a property of the database file rather than of the connection: it
+rewrites the file header and keeps -wal/-shm files next to it. It is
+therefore opt-in (settings.SQLITE_WAL) for the deployment database, so
+management commands run against the development database shipped in the
+repository leave it untouched.
+"""
+
+# Applied to every new SQLite connection by configure_sqlite(); override or
+# extend them with settings.SQLITE_PRAGMAS
+DEFAULT_SQLITE_PRAGMAS = {
+    'mmap_size': 256 * 1024 * 1024,  # bytes of the file read through mmap
+    'cache_size': -64 * 1024,  # negative: KiB of page cache per connection
+    'busy_timeout': 5000,  # ms to wait for a lock before "database is locked"
+    'temp_store': 'MEMORY',
+}
+
+# Added to DEFAULT_SQLITE_PRAGMAS when settings.SQLITE_WAL is true;
+# synchronous=NORMAL is only safe with the write-ahead log
+WAL_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+}
+
+
+def database_config(database_url=None, sqlite_path=None, conn_max_age=600, conn_health_checks=True):
+    """
+    DATABASES['default'] for ``database_url`` (parsed with dj-database-url)
+    or, without one, the SQLite file at ``sqlite_path``.
+
+    Connections are kept open for ``conn_max_age`` seconds instead of being
+    opened for every request; with ``conn_health_checks`` Django pings a
+    reused connection at the start of each request and reconnects if it
+    went away (e.g. the database restarted).
+    """
+    if database_url:
+        import dj_database_url
+
+        return dj_database_url.parse(database_url, conn_max_age=conn_max_age, conn_health_checks=conn_health_checks)
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': sqlite_path,
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': conn_health_checks,
+    }
+
+
+def get_sqlite_pragmas(wal=None):
+    """The PRAGMAs for new connections; ``wal`` defaults to settings.SQLITE_WAL"""
+    from django.conf import settings
+
+    if wal is None:
+        wal = getattr(settings, 'SQLITE_WAL', False)
+    pragmas = {**DEFAULT_SQLITE_PRAGMAS, **(WAL_SQLITE_PRAGMAS if wal else {})}
+    return {**pragmas, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def apply_sqlite_pragmas(cursor, pragmas):
+    """Run ``PRAGMA name = value`` for each pragma (values are trusted settings)"""
+    for name, value in pragmas.items():
+        if value is not None:
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver tuning each new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = get_sqlite_pragmas()
+    if connection.is_in_memory_db():
+        # No journal file or mmap for in-memory databases (e.g. tests)
+        pragmas = {name: value for name, value in pragmas.items() if name not in ('journal_mode', 'mmap_size')}
+    with connection.cursor() as cursor:
+        apply_sqlite_pragmas(cursor, pragmas)
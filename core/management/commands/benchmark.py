@@ -0,0 +1,131 @@
+import json
+import platform
+import sys
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.benchmark import Scenario, compare_results, create_missing_tables, run_scenario
+from core.sitedata import seed_site
+
+
+SCENARIOS = ('home', 'page_detail', 'sitemap', 'page_admin_change', 'jitsi_join')
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark page rendering and admin hot paths against a freshly seeded '
+        'test database: throughput, p50/p90/p99 latency and query counts per '
+        'scenario. Results can be written to JSON and compared with an earlier run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=50, help='Pages to seed (default: 50)')
+        parser.add_argument('--blocks', type=int, default=10, help='Blocks per page (default: 10)')
+        parser.add_argument('--menu-items', type=int, default=20, help='Menu items to seed (default: 20)')
+        parser.add_argument('--media', type=int, default=50, help='Media items to seed (default: 50)')
+        parser.add_argument('--themes', type=int, default=3, help='Themes to seed (default: 3)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the site data (default: 0)')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario (default: 200)')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario first (default: 20)')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help='Only run this scenario (repeatable)')
+        parser.add_argument('--output', metavar='FILE', help='Write the results to this JSON file')
+        parser.add_argument('--compare', metavar='FILE', help='Compare with the results in this JSON file')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Latency/throughput change counted as a regression with --compare (default: 0.10)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            create_missing_tables()
+            # METRICS_DIR=None keeps benchmark traffic out of the shared metrics
+            with override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False, METRICS_DIR=None):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            self.report_comparison(baseline, results, options['threshold'])
+
+    def run(self, options):
+        self.stdout.write(
+            f"Seeding {options['pages']} pages x {options['blocks']} blocks, "
+            f"{options['menu_items']} menu items, {options['media']} media items..."
+        )
+        site = seed_site(
+            pages=options['pages'], blocks_per_page=options['blocks'], menu_items=options['menu_items'],
+            media_items=options['media'], themes=options['themes'], seed=options['seed'],
+        )
+
+        scenarios = {scenario.name: scenario for scenario in self.get_scenarios(site)}
+        names = options['scenario'] or SCENARIOS
+        results = {}
+        for name in names:
+            result = run_scenario(scenarios[name], requests=options['requests'], warmup=options['warmup'])
+            results[name] = result
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<18} {result['throughput_rps']:>8.1f} req/s  "
+                f"p50 {latency['p50']:>7.2f} ms  p99 {latency['p99']:>7.2f} ms  "
+                f"queries {result['queries']['mean']:>6.1f}  status {result['status_codes']}"
+            )
+
+        return {
+            'created_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'platform': platform.platform(),
+                'argv': sys.argv[1:],
+            },
+            'parameters': {
+                key: options[key]
+                for key in ('pages', 'blocks', 'menu_items', 'media', 'themes', 'seed', 'requests', 'warmup')
+            },
+            'scenarios': results,
+        }
+
+    def get_scenarios(self, site):
+        from pagebuilder.models import Page
+
+        slugs = list(Page.objects.filter(pk__in=site['page_ids'], is_homepage=False).values_list('slug', flat=True))
+        admin_ids = site['page_ids'][:10]
+        return [
+            Scenario('home', ['/']),
+            Scenario('page_detail', [f'/{slug}/' for slug in slugs]),
+            Scenario('sitemap', ['/sitemap.xml']),
+            Scenario('page_admin_change', [f'/admin/pagebuilder/page/{pk}/change/' for pk in admin_ids], user=site['user']),
+            Scenario('jitsi_join', [f"/meetings/rooms/{site['room'].pk}/join/"], user=site['user']),
+        ]
+
+    def report_comparison(self, baseline, results, threshold):
+        rows = compare_results(baseline, results, threshold)
+        regressions = 0
+        for name, metric, old, new, change, regressed in rows:
+            line = f'{name:<18} {metric:<15} {old:>10} -> {new:<10} {change:+.1%}'
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f'{line}  REGRESSION'))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f'{regressions} regression(s) compared with the baseline.')
+        self.stdout.write(self.style.SUCCESS('No regressions compared with the baseline.'))
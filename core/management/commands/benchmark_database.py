@@ -0,0 +1,64 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark import run_sqlite_concurrency
+from core.db import get_sqlite_pragmas
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare SQLite's default configuration with the tuned PRAGMAs "
+        '(WAL, synchronous=NORMAL, mmap, cache size; see core.db) under '
+        'concurrent readers and writers, on a scratch database file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Reader threads (default: 4)')
+        parser.add_argument('--writers', type=int, default=2, help='Writer threads (default: 2)')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run (default: 5)')
+        parser.add_argument('--rows', type=int, default=10000, help='Rows in the table (default: 10000)')
+        parser.add_argument('--output', metavar='FILE', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        configurations = {
+            # What Django does without core.db: a rollback journal, full fsyncs
+            # and a 5 s busy timeout (set through the connect() timeout)
+            'default': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+            'tuned': get_sqlite_pragmas(wal=True),
+        }
+
+        directory = tempfile.mkdtemp(prefix='benchmark-database-')
+        results = {}
+        try:
+            for name, pragmas in configurations.items():
+                self.stdout.write(f"Running '{name}' for {options['seconds']:g}s...")
+                results[name] = run_sqlite_concurrency(
+                    os.path.join(directory, f'{name}.sqlite3'), pragmas,
+                    readers=options['readers'], writers=options['writers'],
+                    seconds=options['seconds'], rows=options['rows'],
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<8} reads {result['reads_per_second']:>9.1f}/s "
+                f"(p99 {result['read_latency_ms']['p99']} ms)  "
+                f"writes {result['writes_per_second']:>8.1f}/s "
+                f"(p99 {result['write_latency_ms']['p99']} ms)  "
+                f"locked errors {result['locked_errors']}"
+            )
+        default, tuned = results['default'], results['tuned']
+        for metric in ('reads_per_second', 'writes_per_second'):
+            if default[metric]:
+                self.stdout.write(f"{metric}: {tuned[metric] / default[metric]:.1f}x with the tuned configuration")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'parameters': {key: options[key] for key in ('readers', 'writers', 'seconds', 'rows')},
+                           'configurations': configurations, 'results': results}, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
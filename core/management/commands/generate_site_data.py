@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sitedata import SiteGenerator
+from pagebuilder.models import Page
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large synthetic site for capacity testing: pages in deep '
+        'parent trees with hero/WYSIWYG/HTML blocks, menu items, media items, '
+        'contact messages and newsletter subscribers. The same --seed always '
+        'produces the same data. Rows are inserted in batches with raw '
+        'executemany INSERTs, bypassing save() and signals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1000, help='Pages to create (default: 1000)')
+        parser.add_argument('--blocks-per-page', type=int, default=10,
+                            help='Average blocks per page; each page gets 0.5x to 1.5x this (default: 10)')
+        parser.add_argument('--max-depth', type=int, default=8, help='Deepest page nesting (default: 8)')
+        parser.add_argument('--menu-items', type=int, default=1000, help='Menu items to create (default: 1000)')
+        parser.add_argument('--media', type=int, default=1000, help='Media items to create (default: 1000)')
+        parser.add_argument('--contact-messages', type=int, default=10000,
+                            help='Contact messages to create (default: 10000)')
+        parser.add_argument('--subscribers', type=int, default=10000,
+                            help='Newsletter subscribers to create (default: 10000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--prefix', default='gen',
+                            help='Marks generated slugs, emails and file names; must not be in use (default: gen)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per insert transaction (default: 5000)')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if Page.objects.filter(slug__startswith=f'{prefix}-page-').exists():
+            raise CommandError(f"Pages with the prefix '{prefix}' already exist; pass a different --prefix.")
+        if options['max_depth'] > 255:
+            raise CommandError('--max-depth must be at most 255.')
+
+        self.verbosity = options['verbosity']
+        self.last_report = 0
+        generator = SiteGenerator(
+            seed=options['seed'], prefix=prefix, batch_size=options['batch_size'], progress=self.report_progress,
+        )
+
+        started = time.monotonic()
+        page_ids = self.step('pages', lambda: generator.generate_pages(options['pages'], options['max_depth']))
+        self.step('blocks', lambda: generator.generate_blocks(page_ids, options['blocks_per_page']))
+        self.step('menu items', lambda: generator.generate_menu_items(options['menu_items'], page_ids))
+        self.step('media items', lambda: generator.generate_media_items(options['media']))
+        self.step('contact messages', lambda: generator.generate_contact_messages(options['contact_messages']))
+        self.step('newsletter subscribers', lambda: generator.generate_subscribers(options['subscribers']))
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s.'))
+
+    def step(self, label, generate):
+        started = time.monotonic()
+        result = generate()
+        count = len(result) if isinstance(result, range) else result
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f'{label}: {count} rows in {elapsed:.1f}s ({rate:.0f} rows/s)')
+        return result
+
+    def report_progress(self, model, inserted):
+        # At most one line every few seconds per table
+        now = time.monotonic()
+        if self.verbosity > 1 or (self.verbosity == 1 and now - self.last_report >= 5):
+            self.last_report = now
+            self.stdout.write(f'  {model._meta.verbose_name_plural}: {inserted}...')
@@ -0,0 +1,394 @@
+"""
+In-process metrics: latency histograms and counters, each split by one
+label value (a URL name, template, cache...).
+
+Under gunicorn every worker has its own registry. With METRICS_DIR set, each
+process periodically writes its registry to a file of its own there, and the
+Prometheus endpoint adds up all the files, so every worker is counted
+whichever one answers the scrape.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: files of exited processes are kept
+    fcntl = None
+
+
+# Upper bounds (milliseconds) of latency histogram buckets; the last bucket is +Inf
+DEFAULT_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram of observed values (milliseconds)"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile from the buckets (upper bound of the bucket it falls in)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def state(self):
+        """Raw bucket counts, sum and count, for writing to and merging from files"""
+        with self._lock:
+            return {'buckets': list(self.buckets), 'counts': list(self.counts), 'sum': self.sum, 'count': self.count}
+
+    def merge(self, state):
+        """Add a state() from another process (with the same buckets)"""
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, state['counts'])]
+            self.sum += state['sum']
+            self.count += state['count']
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = []
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+                total += count
+                cumulative.append((bound, total))
+            return {
+                'count': self.count,
+                'sum_ms': round(self.sum, 3),
+                'mean_ms': round(self.sum / self.count, 3) if self.count else None,
+                'p50_ms': self.quantile(0.5),
+                'p95_ms': self.quantile(0.95),
+                'p99_ms': self.quantile(0.99),
+                'buckets': cumulative,
+            }
+
+
+class Counter:
+    """Thread-safe monotonically increasing count"""
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Registry:
+    """Named histograms and counters, each split by a label value (e.g. template name)"""
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, label):
+        key = (name, label)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name, label, value):
+        self.histogram(name, label).observe(value)
+
+    def counter(self, name, label):
+        key = (name, label)
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def inc(self, name, label, amount=1):
+        self.counter(name, label).inc(amount)
+
+    def snapshot(self):
+        """{name: {label: histogram snapshot or counter value}}"""
+        result = {}
+        for (name, label), histogram in sorted(self._histograms.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            result.setdefault(name, {})[label] = histogram.snapshot()
+        for (name, label), counter in sorted(self._counters.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            result.setdefault(name, {})[label] = counter.value
+        return result
+
+    def state(self):
+        """Everything recorded, in a JSON-serializable form merge() accepts"""
+        return {
+            'histograms': [[name, label, histogram.state()] for (name, label), histogram in list(self._histograms.items())],
+            'counters': [[name, label, counter.value] for (name, label), counter in list(self._counters.items())],
+        }
+
+    def merge(self, state):
+        for name, label, histogram_state in state.get('histograms', []):
+            histogram = self.histogram(name, label)
+            if list(histogram.buckets) == histogram_state['buckets']:
+                histogram.merge(histogram_state)
+        for name, label, value in state.get('counters', []):
+            self.inc(name, label, value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Process-wide registry
+registry = Registry()
+
+
+def count_cache(cache, hits=0, misses=0):
+    """Record lookups in one of the application's caches (hit ratio = hits / (hits + misses))"""
+    if hits:
+        registry.inc('cache_hits', cache, hits)
+    if misses:
+        registry.inc('cache_misses', cache, misses)
+
+
+class MetricsDirectory:
+    """
+    One file per process in a shared directory, written atomically, so
+    processes never write to the same file. When a process has exited, its
+    file is folded into ARCHIVE_FILENAME and removed: its counts stay in the
+    totals, as Prometheus expects of counters, and the directory doesn't
+    grow with every restarted worker. Process ids are only meaningful on one
+    host, so the directory must not be shared between servers.
+    """
+    ARCHIVE_FILENAME = 'archived.json'
+    LOCK_FILENAME = '.lock'
+
+    def __init__(self, path):
+        self.path = path
+        self._pid = None
+        self._filename = None
+
+    @property
+    def filename(self):
+        # A new name after fork(), so workers forked from a preloaded app
+        # don't share the parent's file
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._filename = os.path.join(self.path, f'{self._pid}-{uuid.uuid4().hex[:8]}.json')
+        return self._filename
+
+    def write(self, registry):
+        os.makedirs(self.path, exist_ok=True)
+        self._write_state(self.filename, registry.state())
+
+    def _write_state(self, filename, state):
+        temporary = f'{filename}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, filename)
+
+    def _read_state(self, filename):
+        try:
+            with open(os.path.join(self.path, filename)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def prune(self):
+        """
+        Fold the files of processes that are no longer running into the
+        archive file and delete them. Returns how many were removed.
+        """
+        if fcntl is None:
+            return 0
+        try:
+            filenames = os.listdir(self.path)
+        except FileNotFoundError:
+            return 0
+        dead = [filename for filename in filenames if is_dead_process_file(filename)]
+        if not dead:
+            return 0
+
+        # One pruner at a time, or a file could be archived twice
+        with open(os.path.join(self.path, self.LOCK_FILENAME), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                archive = Registry()
+                archive.merge(self._read_state(self.ARCHIVE_FILENAME) or {})
+                removed = []
+                for filename in dead:
+                    state = self._read_state(filename)
+                    if state is not None:
+                        archive.merge(state)
+                        removed.append(filename)
+                if removed:
+                    self._write_state(os.path.join(self.path, self.ARCHIVE_FILENAME), archive.state())
+                    for filename in removed:
+                        os.remove(os.path.join(self.path, filename))
+                return len(removed)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def collect(self):
+        """A Registry holding the sum of every process's file"""
+        self.prune()
+        merged = Registry()
+        try:
+            filenames = os.listdir(self.path)
+        except FileNotFoundError:
+            return merged
+        for filename in filenames:
+            if filename.endswith('.json'):
+                state = self._read_state(filename)
+                if state is not None:
+                    merged.merge(state)
+        return merged
+
+
+def is_dead_process_file(filename):
+    """True for a '<pid>-<id>.json' file whose process is no longer running"""
+    pid, _, rest = filename.partition('-')
+    if not (pid.isdigit() and rest.endswith('.json')):
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # Exists but belongs to another user, or can't be checked here
+        return False
+    return False
+
+
+_directory = None
+_flush_lock = threading.Lock()
+_flushed_at = 0
+
+
+def get_metrics_directory():
+    """The MetricsDirectory of settings.METRICS_DIR, or None if it isn't set"""
+    global _directory
+    path = getattr(settings, 'METRICS_DIR', None) if settings.configured else None
+    if not path:
+        return None
+    if _directory is None or _directory.path != path:
+        _directory = MetricsDirectory(path)
+    return _directory
+
+
+def flush(force=False):
+    """
+    Write this process's registry to METRICS_DIR, at most every
+    METRICS_FLUSH_INTERVAL seconds unless ``force``. Called after each
+    request, so a process's first request always writes its file.
+    """
+    global _flushed_at
+    directory = get_metrics_directory()
+    if directory is None:
+        return
+    now = time.monotonic()
+    if not force and now - _flushed_at < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+        return
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _flushed_at = now
+        directory.write(registry)
+    except OSError:
+        pass
+    finally:
+        _flush_lock.release()
+
+
+def collect():
+    """All processes' metrics when METRICS_DIR is set, otherwise this process's"""
+    directory = get_metrics_directory()
+    if directory is None:
+        return registry
+    flush(force=True)
+    return directory.collect()
+
+
+def flush_at_exit():
+    # Only processes that have flushed before (those serving requests), so
+    # management commands leave no files behind
+    if _flushed_at:
+        flush(force=True)
+
+
+atexit.register(flush_at_exit)
+
+
+# Registry name -> (Prometheus name, label name, help). Histograms recorded in
+# milliseconds are exposed in seconds, as Prometheus expects
+PROMETHEUS_METRICS = {
+    'request_ms': ('django_request_duration_seconds', 'view', 'Request latency by URL name.'),
+    'template_ms': ('django_template_render_duration_seconds', 'template',
+                    'Template render time, including the templates it includes.'),
+    'context_processor_ms': ('django_context_processor_duration_seconds', 'name', 'Context processor time.'),
+    'middleware_ms': ('django_middleware_duration_seconds', 'name', 'Time in traced middleware hooks.'),
+    'db_ms': ('django_db_duration_seconds', 'view', 'Database time per request by URL name.'),
+    'db_queries': ('django_db_queries_total', 'view', 'Database queries by URL name.'),
+    'cache_hits': ('django_cache_hits_total', 'cache', 'Cache hits by cache.'),
+    'cache_misses': ('django_cache_misses_total', 'cache', 'Cache misses by cache.'),
+    'jitsi_tokens': ('jitsi_tokens_generated_total', 'role', 'Jitsi JWT tokens generated.'),
+    'jitsi_webhooks': ('jitsi_webhooks_total', 'event', 'Jitsi webhook calls by event type.'),
+    'jitsi_webhook_ms': ('jitsi_webhook_duration_seconds', 'name', 'Jitsi webhook handling time.'),
+}
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(registry):
+    """The registry in the Prometheus text exposition format"""
+    histograms = {}
+    for (name, label), histogram in registry._histograms.items():
+        histograms.setdefault(name, []).append((label, histogram.state()))
+    counters = {}
+    for (name, label), counter in registry._counters.items():
+        counters.setdefault(name, []).append((label, counter.value))
+
+    lines = []
+    for name, series in sorted(histograms.items()):
+        metric, label_name, help_text = PROMETHEUS_METRICS.get(name, (name, 'label', name))
+        scale = 1000 if name.endswith('_ms') else 1
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for label, state in sorted(series, key=lambda item: str(item[0])):
+            label_pair = f'{label_name}="{escape_label(label)}"'
+            cumulative = 0
+            for bound, count in zip(state['buckets'] + ['+Inf'], state['counts']):
+                cumulative += count
+                le = bound if bound == '+Inf' else format_number(bound / scale)
+                lines.append(f'{metric}_bucket{{{label_pair},le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{label_pair}}} {format_number(state["sum"] / scale)}')
+            lines.append(f'{metric}_count{{{label_pair}}} {state["count"]}')
+    for name, series in sorted(counters.items()):
+        metric, label_name, help_text = PROMETHEUS_METRICS.get(name, (f'{name}_total', 'label', name))
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for label, value in sorted(series, key=lambda item: str(item[0])):
+            lines.append(f'{metric}{{{label_name}="{escape_label(label)}"}} {format_number(value)}')
+    return '\n'.join(lines) + '\n'
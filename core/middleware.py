@@ -0,0 +1,177 @@
+import logging
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+from .metrics import flush, registry
+from .profiling import MODES, allow_profile, profile_request
+from .queries import QueryBudgetExceeded, QueryRecorder, check_budget, get_budget
+from .tracing import Trace, current_trace, record
+
+logger = logging.getLogger('core.queries')
+
+
+# Server-Timing metric name prefix per span category
+CATEGORY_PREFIXES = {
+    'template': 'tpl',
+    'context_processor': 'ctx',
+    'middleware': 'mw',
+    'db': 'db',
+}
+
+
+class TracingMiddleware:
+    """
+    Trace each request: template renders, context processors and
+    middleware hooks decorated with core.tracing.traced. Timings feed the
+    histograms in core.metrics, which are written to METRICS_DIR after the
+    request when it is due; staff also get them in a ``Server-Timing``
+    header (shown in the browser's network panel).
+
+    Put it first in MIDDLEWARE so the total covers the other middleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.max_entries = getattr(settings, 'TRACING_SERVER_TIMING_MAX', 30)
+
+    def __call__(self, request):
+        trace = Trace()
+        reset_token = current_trace.set(trace)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_trace.reset(reset_token)
+
+        total_ms = trace.elapsed_ms()
+        match = getattr(request, 'resolver_match', None)
+        record('request', match.view_name if match else '<unresolved>', total_ms)
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = self.get_server_timing(trace, total_ms)
+        flush()
+        return response
+
+    def get_server_timing(self, trace, total_ms):
+        entries = [f'total;dur={total_ms:.1f}']
+        for index, (category, name, duration_ms, count) in enumerate(trace.summarize()[:self.max_entries]):
+            description = name if count == 1 else f'{name} x{count}'
+            description = description.replace('\\', '/').replace('"', "'")
+            prefix = CATEGORY_PREFIXES.get(category, category)
+            entries.append(f'{prefix}{index};desc="{description}";dur={duration_ms:.1f}')
+        return ', '.join(entries)
+
+
+class QueryCountMiddleware:
+    """
+    Count, time and locate the database queries of each request and check
+    them against the view's budget in settings.QUERY_BUDGETS (keyed by URL
+    name). The total database time is recorded under the ``db`` histogram
+    and trace category.
+
+    Staff (and everyone when DEBUG is on) get ``X-DB-Queries``,
+    ``X-DB-Duplicate-Queries`` and ``X-DB-Time`` headers. Requests over
+    budget are logged to ``core.queries`` with the repeated queries and the
+    template line or code that ran them; with QUERY_BUDGETS_RAISE (meant for
+    tests) they raise QueryBudgetExceeded instead.
+
+    Locating queries walks the stack on each one, so it is only done with
+    QUERY_LOCATIONS, for a QUERY_LOCATIONS_SAMPLE_RATE fraction of requests
+    and for staff; staff are only known once AuthenticationMiddleware has
+    run, so their view's queries (where N+1s are) are located, not the
+    session lookup before it.
+
+    Put it right after TracingMiddleware so it sees every other
+    middleware's queries.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.locate = getattr(settings, 'QUERY_LOCATIONS', settings.DEBUG)
+        self.sample_rate = getattr(settings, 'QUERY_LOCATIONS_SAMPLE_RATE', 0.0)
+        self.raise_over_budget = getattr(settings, 'QUERY_BUDGETS_RAISE', False)
+
+    def __call__(self, request):
+        locate = self.locate or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        recorder = request._query_recorder = QueryRecorder(locate=locate)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else '<unresolved>'
+        if recorder.count:
+            record('db', view_name, recorder.total_ms)
+            registry.inc('db_queries', view_name, recorder.count)
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['X-DB-Queries'] = str(recorder.count)
+            response['X-DB-Duplicate-Queries'] = str(recorder.duplicates)
+            response['X-DB-Time'] = f'{recorder.total_ms:.1f}ms'
+
+        budget = get_budget(view_name)
+        violations = check_budget(recorder, budget) if budget else []
+        if violations:
+            message = f"{view_name} over its query budget ({'; '.join(violations)}): {recorder.report()}"
+            if self.raise_over_budget:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        else:
+            logger.debug('%s: %d queries (%d duplicates) in %.1f ms',
+                         view_name, recorder.count, recorder.duplicates, recorder.total_ms)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            request._query_recorder.locate = True
+
+
+class ProfilerMiddleware:
+    """
+    Profile a staff request on demand: add ``?profile=sample`` (or
+    ``cprofile``) to the URL, or send an ``X-Profile`` header with the mode.
+    The profile is saved under PROFILING_DIR and listed in the admin; the
+    response's ``X-Profile`` header links to it.
+
+    Limited to PROFILING_RATE_LIMIT profiles per PROFILING_RATE_PERIOD
+    seconds and one at a time per process; other requests are served
+    unprofiled with ``X-Profile: rate-limited`` or ``busy``.
+
+    Goes after AuthenticationMiddleware, which it needs for request.user.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PROFILING_ENABLED', True)
+        self.default_mode = getattr(settings, 'PROFILING_DEFAULT_MODE', 'sample')
+
+    def __call__(self, request):
+        mode = self.get_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        if not allow_profile():
+            response = self.get_response(request)
+            response['X-Profile'] = 'rate-limited'
+            return response
+
+        response, name = profile_request(self.get_response, request, mode)
+        response['X-Profile'] = reverse('admin:profile_detail', args=[name]) if name else 'busy'
+        return response
+
+    def get_mode(self, request):
+        """The requested profiler mode, or None if this request isn't profiled"""
+        if not self.enabled:
+            return None
+        mode = request.GET.get('profile') or request.headers.get('X-Profile')
+        if not mode:
+            return None
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff:
+            return None
+        if mode not in MODES:
+            mode = self.default_mode
+        return mode
@@ -0,0 +1,266 @@
+"""
+On-demand request profiling for staff (core.middleware.ProfilerMiddleware).
+
+Two modes:
+
+- ``sample``: a background thread samples the request thread's stack every
+  PROFILING_SAMPLE_INTERVAL seconds and writes collapsed stacks
+  (``outer;inner;leaf count`` per line, the format flamegraph tools read),
+  shown as a flamegraph in the admin. Low overhead, so timings stay close
+  to the real thing.
+- ``cprofile``: deterministic profiling with cProfile, saved as a pstats
+  file (open it with ``python -m pstats`` or snakeviz); the admin shows
+  the most expensive functions.
+
+Profiles are stored in PROFILING_DIR with a JSON file describing the request.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+MODES = ('sample', 'cprofile')
+EXTENSIONS = {'sample': '.folded', 'cprofile': '.prof'}
+PROFILE_NAME_RE = re.compile(r'^[\w-]+$')
+
+# One profile at a time per process: profiling is for reproducing a slow
+# request, not for measuring concurrent load
+_profile_lock = threading.Lock()
+
+
+def get_profile_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def allow_profile():
+    """
+    Count a profile against PROFILING_RATE_LIMIT profiles per
+    PROFILING_RATE_PERIOD seconds, shared through the PROFILING_CACHE alias
+    (so across processes when that cache is shared). False once used up.
+    """
+    limit = getattr(settings, 'PROFILING_RATE_LIMIT', 10)
+    period = getattr(settings, 'PROFILING_RATE_PERIOD', 60)
+    cache = caches[getattr(settings, 'PROFILING_CACHE', 'default')]
+    key = f'core.profiling.window:{int(time.time() // period)}'
+    cache.add(key, 0, period)
+    try:
+        return cache.incr(key) <= limit
+    except ValueError:
+        # The window expired between add() and incr()
+        cache.add(key, 1, period)
+        return True
+
+
+def frame_label(code):
+    """``function (path:line)``, with paths relative to the project or site-packages"""
+    filename = code.co_filename
+    if 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    elif filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """Samples one thread's stack from a background thread into collapsed stacks"""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = None
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self.run, name='core-profiling-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                label = self._labels.get(frame.f_code)
+                if label is None:
+                    label = self._labels[frame.f_code] = frame_label(frame.f_code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def profile_request(get_response, request, mode):
+    """
+    Handle ``request`` under the profiler. Returns (response, profile name),
+    or (response, None) when another profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return get_response(request), None
+    try:
+        name = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}'
+        directory = get_profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name + EXTENSIONS[mode])
+
+        started = time.perf_counter()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                response = profiler.runcall(get_response, request)
+            finally:
+                profiler.dump_stats(path)
+        else:
+            sampler = Sampler(getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005))
+            sampler.start()
+            try:
+                response = get_response(request)
+            finally:
+                sampler.stop()
+                sampler.write(path)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        with open(os.path.join(directory, name + '.json'), 'w') as f:
+            json.dump({
+                'name': name,
+                'mode': mode,
+                'file': os.path.basename(path),
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view_name': match.view_name if match else None,
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 1),
+                'user': request.user.get_username(),
+                'created_at': timezone.now().isoformat(),
+            }, f)
+        prune_profiles(directory)
+        return response, name
+    finally:
+        _profile_lock.release()
+
+
+def prune_profiles(directory=None, keep=None):
+    """Delete all but the newest ``keep`` (PROFILING_MAX_FILES) profiles"""
+    keep = keep if keep is not None else getattr(settings, 'PROFILING_MAX_FILES', 100)
+    for profile in list_profiles(directory)[keep:]:
+        delete_profile(profile['name'], directory)
+
+
+def list_profiles(directory=None):
+    """Metadata of the stored profiles, newest first"""
+    directory = directory or get_profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in sorted(os.listdir(directory), reverse=True):
+        if filename.endswith('.json'):
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+
+def get_profile(name, directory=None):
+    """A profile's metadata and the path of its data file, or None"""
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    directory = directory or get_profile_dir()
+    try:
+        with open(os.path.join(directory, name + '.json')) as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    profile['data_path'] = os.path.join(directory, name + EXTENSIONS[profile['mode']])
+    return profile
+
+
+def delete_profile(name, directory=None):
+    directory = directory or get_profile_dir()
+    for extension in ('.json',) + tuple(EXTENSIONS.values()):
+        try:
+            os.remove(os.path.join(directory, name + extension))
+        except FileNotFoundError:
+            pass
+
+
+def read_collapsed(path):
+    """Collapsed stacks from a file, as a Counter of stack tuples"""
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                stacks[tuple(stack.split(';'))] += int(count)
+    return stacks
+
+
+def flamegraph_rows(stacks, min_fraction=0.002):
+    """
+    Lay out collapsed stacks as a flamegraph: a list of
+    (depth, left %, width %, label, samples) boxes, the root at depth 0.
+    Boxes narrower than ``min_fraction`` of the total are left out.
+    """
+    total = sum(stacks.values())
+    if not total:
+        return []
+
+    tree = {}
+    for stack, count in stacks.items():
+        node = tree
+        for label in stack:
+            child = node.setdefault(label, [0, {}])
+            child[0] += count
+            node = child[1]
+
+    rows = []
+
+    def layout(children, depth, left):
+        for label, (samples, grandchildren) in sorted(children.items()):
+            if samples / total >= min_fraction:
+                rows.append((depth, left / total * 100, samples / total * 100, label, samples))
+                layout(grandchildren, depth + 1, left)
+            left += samples
+
+    layout(tree, 0, 0)
+    return rows
+
+
+def top_functions(path, limit=50, sort='cumulative'):
+    """
+    The most expensive functions in a pstats file, as dicts with
+    function, calls, tottime and cumtime (seconds)
+    """
+    stats = pstats.Stats(path)
+    index = 3 if sort == 'cumulative' else 2
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+    return [
+        {
+            'function': f'{func} ({filename}:{line})',
+            'calls': calls if primitive_calls == calls else f'{calls}/{primitive_calls}',
+            'tottime': tottime,
+            'cumtime': cumtime,
+        }
+        for (filename, line, func), (primitive_calls, calls, tottime, cumtime, callers) in entries
+    ]
@@ -0,0 +1,130 @@
+"""
+Database query instrumentation: count, time and locate the queries run
+while handling a request or a block of code, and check them against the
+budgets in settings.QUERY_BUDGETS.
+
+Queries are grouped by their SQL with the parameters left out, so an N+1
+(the same query once per menu item or sitemap entry) shows up as one
+repeated query, with the template line or code location that ran it.
+"""
+import os
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.template.base import Node
+
+_render_annotated_code = Node.render_annotated.__code__
+_core_dir = os.path.dirname(os.path.abspath(__file__))
+# Frames skipped when looking for the code that ran a query: the
+# instrumentation itself and installed packages
+_skipped_paths = tuple(
+    os.path.join(_core_dir, name) for name in ('queries.py', 'middleware.py', 'tracing.py', 'testing.py')
+) + ('site-packages', 'dist-packages')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request or block of code runs more queries than its budget allows"""
+
+
+class QueryRecorder:
+    """
+    A database execute wrapper (see connection.execute_wrapper) recording
+    each query's SQL, duration and location. ``locate`` walks the stack on
+    every query to find the template line and project code that ran it.
+    """
+    def __init__(self, locate=True):
+        self.locate = locate
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.queries.append((sql, duration_ms, get_location() if self.locate else None))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(duration_ms for sql, duration_ms, location in self.queries)
+
+    def repeated(self):
+        """
+        Queries run more than once, as (sql, count, Counter of locations),
+        most frequent first
+        """
+        groups = {}
+        for sql, duration_ms, location in self.queries:
+            groups.setdefault(sql, Counter())[location] += 1
+        return sorted(
+            ((sql, sum(locations.values()), locations) for sql, locations in groups.items()
+             if sum(locations.values()) > 1),
+            key=lambda item: item[1], reverse=True,
+        )
+
+    @property
+    def duplicates(self):
+        """Queries that repeat an earlier one (same SQL, any parameters)"""
+        return sum(count - 1 for sql, count, locations in self.repeated())
+
+    def report(self, limit=5):
+        lines = [f'{self.count} queries ({self.duplicates} duplicates) in {self.total_ms:.1f} ms']
+        for sql, count, locations in self.repeated()[:limit]:
+            lines.append(f'  {count}x {sql[:200]}')
+            for location, location_count in locations.most_common(3):
+                lines.append(f'      {location_count}x at {location or "unknown location"}')
+        return '\n'.join(lines)
+
+
+def get_location():
+    """
+    Where the current query comes from: the innermost template node being
+    rendered (``base.html:100``), followed by any project code it called
+    (``portfolio/models.py:81 in get_url``); outside templates, the
+    innermost project code outside Django and this instrumentation
+    """
+    template = code = None
+    frame = sys._getframe(2)
+    while frame is not None and template is None:
+        if frame.f_code is _render_annotated_code:
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                template = f'{origin.template_name or origin.name}:{token.lineno}'
+        elif code is None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(str(settings.BASE_DIR)) and not any(path in filename for path in _skipped_paths):
+                code = f'{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ' / '.join(part for part in (template, code) if part) or None
+
+
+def get_budget(view_name):
+    """
+    The budget for a URL name from settings.QUERY_BUDGETS, as a dict with
+    any of 'queries', 'duplicates' and 'db_ms'; a plain number means a
+    query limit. None if the view has no budget.
+    """
+    budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+    if budget is None or isinstance(budget, dict):
+        return budget
+    return {'queries': budget}
+
+
+def check_budget(recorder, budget):
+    """The ways ``recorder`` exceeds ``budget``, as messages (empty if within it)"""
+    violations = []
+    if budget.get('queries') is not None and recorder.count > budget['queries']:
+        violations.append(f"{recorder.count} queries, budget {budget['queries']}")
+    if budget.get('duplicates') is not None and recorder.duplicates > budget['duplicates']:
+        violations.append(f"{recorder.duplicates} duplicate queries, budget {budget['duplicates']}")
+    if budget.get('db_ms') is not None and recorder.total_ms > budget['db_ms']:
+        violations.append(f"{recorder.total_ms:.1f} ms in the database, budget {budget['db_ms']} ms")
+    return violations
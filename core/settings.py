@@ -2,6 +2,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from core.db import database_config
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -43,16 +45,21 @@ INSTALLED_APPS = [
     'themes.apps.ThemesConfig',
     'media.apps.MediaConfig',
     'jitsi.apps.JitsiConfig',
+    'core.apps.CoreConfig',  # Request tracing and metrics
 ]
 
 MIDDLEWARE = [
+    'core.middleware.TracingMiddleware',  # First, so its total covers everything else
+    'core.middleware.QueryCountMiddleware',  # Query counts and budgets (QUERY_BUDGETS)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',  # Staff-only ?profile=sample|cprofile
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'themes.middleware.ThemePreviewMiddleware',  # Staff-only ?theme_preview=<signed token>
     'portfolio.middleware.SiteMiddleware',  # Custom middleware for site-wide context
 ]
 
@@ -62,7 +69,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -71,6 +77,16 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'themes.context_processors.theme_context',  # For theme support
             ],
+            # Templates edited in the admin (themes.Template) come first and are
+            # served from the database; files are compiled once and cached.
+            # Both keep theme previews in separate caches.
+            'loaders': [
+                'themes.loaders.Loader',
+                ('themes.loaders.CachedLoader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -80,18 +96,55 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite by default; if DATABASE_URL is provided, use that instead (for
+# production with PostgreSQL). Connections are kept open for
+# DATABASE_CONN_MAX_AGE seconds and health-checked before reuse (see core.db)
+DATABASE_URL = os.environ.get('DATABASE_URL')
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(
+        DATABASE_URL, sqlite_path=BASE_DIR / 'db.sqlite3', conn_max_age=DATABASE_CONN_MAX_AGE,
+    ),
 }
 
-# If DATABASE_URL is provided, use that instead (for production with PostgreSQL)
-DATABASE_URL = os.environ.get('DATABASE_URL')
-if DATABASE_URL:
-    import dj_database_url
-    DATABASES['default'] = dj_database_url.parse(DATABASE_URL)
+# PRAGMAs run on each new SQLite connection, on top of
+# core.db.DEFAULT_SQLITE_PRAGMAS (mmap, 64 MB cache, 5 s busy timeout); set a
+# pragma to None to leave SQLite's default
+SQLITE_PRAGMAS = {}
+# Switch the SQLite file to WAL with synchronous=NORMAL. This converts the
+# file itself, so enable it for the deployment database only, not for the
+# db.sqlite3 tracked in the repository
+SQLITE_WAL = os.environ.get('SQLITE_WAL', 'False') == 'True'
+
+
+# Caches: 'default' is a small per-process LRU in front of 'shared' (see
+# core.cache.TieredCache), which is Redis when REDIS_URL is set and the
+# filesystem otherwise. Both are shared by all processes on the host
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,  # seconds an entry lives in a process at most
+            'STAMP_CHECK_INTERVAL': 1,  # seconds an L1 hit is trusted before re-checking it in L2
+            'STALE_TIMEOUT': 60,  # seconds an expired value may be served while one caller refreshes it
+            'LOCK_TIMEOUT': 30,  # seconds a refresh may hold the lock
+            'LOCK_WAIT': 10,  # seconds to wait for another caller's refresh when there is no stale value
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'django_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -124,11 +177,21 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# Theme bundles written by build_theme_assets, served under /static/themes/
+THEME_ASSETS_ROOT = os.path.join(BASE_DIR, 'static_build')
+THEME_ASSET_BUNDLES = not DEBUG
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static'), ('themes', THEME_ASSETS_ROOT)]
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media_files')
+
+# Media delivery (media.views.serve_media)
+# Set to 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile) to let the front
+# proxy send local files; leave empty to stream them from Django
+MEDIA_DELIVERY_MODE = os.environ.get('MEDIA_DELIVERY_MODE') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_DELIVERY_CHUNK_SIZE = 64 * 1024
 # Configure Jitsi settings
 # Jitsi Configuration for Docker installation
 JITSI_DOMAIN = 'localhost:8443'  # Change to your Docker Jitsi domain/port
@@ -153,7 +216,7 @@ JITSI_APP_SECRET = 'secret'      # Default value that will work without JWT
 #     STATIC_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/'
     
 #     # Media files
-#     DEFAULT_FILE_STORAGE = 'core.storage_backends.MediaStorage'
+#     DEFAULT_FILE_STORAGE = 'core.storage_backends.CachedMediaStorage'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -200,4 +263,77 @@ CKEDITOR_CONFIGS = {
 # Theme settings
 ACTIVE_THEME = os.environ.get('ACTIVE_THEME', 'default')
 THEME_PATHS = os.path.join(BASE_DIR, 'themes', 'templates')
-DEFAULT_FILE_STORAGE = 'core.storage_backends.MediaStorage'
\ No newline at end of file
+
+# Database templates (themes.loaders.Loader). The version counter that tells
+# workers a template changed lives in this cache alias, so it must be shared
+# between servers (Redis, Memcached or the database cache) in production
+THEME_TEMPLATE_CACHE = 'shared'
+THEME_TEMPLATE_CACHE_SIZE = 500  # compiled templates kept per process
+THEME_TEMPLATE_VERSION_CHECK_INTERVAL = 1.0  # seconds
+THEME_MANIFEST_CHECK_INTERVAL = 2.0  # seconds between directory walks when a theme has no manifest.json
+THEME_PREVIEW_CACHE_SIZE = 100  # compiled previews, keyed by source hash
+THEME_PREVIEW_TEMPLATE_CACHE_SIZE = 100  # compiled database templates per previewed theme
+THEME_PREVIEW_MAX_AGE = 60 * 60 * 8  # seconds a theme preview link stays valid
+# Render each template against sample data after it is saved to record its
+# cost. Off by default since it slows down saving; use the "Profile render
+# cost" admin action or `manage.py profile_templates` instead
+THEME_TEMPLATE_PROFILE_ON_SAVE = False
+THEME_TEMPLATE_SLOW_MS = 50  # highlighted in the admin above this render time
+DEFAULT_FILE_STORAGE = 'core.storage_backends.CachedMediaStorage'
+
+# Local read-through cache in front of the S3 media storage
+MEDIA_CACHE_REMOTE_STORAGE = 'core.storage_backends.MediaStorage'
+MEDIA_CACHE_DIR = os.environ.get('MEDIA_CACHE_DIR', os.path.join(BASE_DIR, 'media_cache'))
+MEDIA_CACHE_MAX_SIZE = int(os.environ.get('MEDIA_CACHE_MAX_SIZE', 1024 * 1024 * 1024))  # 1 GB
+MEDIA_CACHE_MAX_FILE_SIZE = int(os.environ.get('MEDIA_CACHE_MAX_FILE_SIZE', 50 * 1024 * 1024))  # 50 MB
+
+# How long unsigned media URLs are memoized; signed URLs use half their expiry
+MEDIA_URL_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Request tracing (core.tracing): times template renders, theme_context and
+# SiteMiddleware into histograms served at /metrics/ (staff only); staff also
+# get a Server-Timing header on every response
+TRACING_ENABLED = True
+TRACING_SERVER_TIMING_MAX = 30  # slowest entries included in the header
+
+# Prometheus metrics at /metrics/prometheus/ (staff, or a scraper sending
+# "Authorization: Bearer $METRICS_TOKEN"). Set METRICS_DIR (a local directory,
+# one per server) to have each process write its metrics there so the
+# endpoint covers all gunicorn workers; files of exited workers are folded
+# into one archive file. Unset, only the answering process is reported
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 5  # seconds between writes per process
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# Query counts per request (core.middleware.QueryCountMiddleware). Budgets are
+# keyed by URL name: a number caps the queries, a dict can also cap
+# 'duplicates' (the same SQL run again) and 'db_ms'. Requests over budget are
+# logged to core.queries, or raise with QUERY_BUDGETS_RAISE (for tests). These
+# are targets for a warm process that hold however many pages, blocks and
+# menu items a site has; two of the queries load a logged-in user's session,
+# and the header and footer menus count as duplicates of each other
+QUERY_BUDGETS = {
+    'home': {'queries': 15, 'duplicates': 6},
+    'page_detail': {'queries': 15, 'duplicates': 6},
+    'django.contrib.sitemaps.views.sitemap': {'queries': 8, 'duplicates': 1},
+    'metrics': 5,
+}
+QUERY_BUDGETS_RAISE = False
+# Walking the stack to find the template line or code behind each query is
+# too slow for every request: it is done with QUERY_LOCATIONS (and in tests,
+# see core.testing), for staff requests and for a sample of other requests
+QUERY_LOCATIONS = DEBUG
+QUERY_LOCATIONS_SAMPLE_RATE = 0.0  # e.g. 0.01 to locate the queries of 1% of requests
+
+# On-demand profiling of staff requests (core.middleware.ProfilerMiddleware):
+# ?profile=sample|cprofile or an X-Profile header. Profiles are listed at
+# /admin/profiles/. The rate limit is counted in PROFILING_CACHE, so it only
+# holds across processes when that cache is shared
+PROFILING_ENABLED = True
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_DEFAULT_MODE = 'sample'
+PROFILING_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_RATE_LIMIT = 10  # profiles per PROFILING_RATE_PERIOD
+PROFILING_RATE_PERIOD = 60  # seconds
+PROFILING_CACHE = 'shared'
+PROFILING_MAX_FILES = 100  # older profiles are deleted
@@ -0,0 +1,341 @@
+"""
+Synthetic site content for benchmarks and capacity tests.
+
+Everything is generated from a seed, so the same arguments always produce
+the same site. seed_site() inserts its small site with bulk_create;
+SiteGenerator inserts its large tables with raw executemany batches
+(insert_batches). Both skip save() and signals (no media references,
+template profiling or folder paths).
+"""
+import itertools
+import random
+import uuid
+from array import array
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from jitsi.models import JitsiMeeting, JitsiRoom
+from media.models import MediaFolder, MediaItem
+from pagebuilder.models import Block, Page
+from portfolio.models import ContactMessage, MenuItem, NewsletterSubscriber, SiteSettings
+from themes.models import Theme
+
+
+WORDS = (
+    'alpha beta cloud data design engine growth insight journey launch market network '
+    'platform quality rapid scale strategy studio team vision workflow product service '
+    'solution partner customer digital creative modern simple secure'
+).split()
+
+BLOCK_TYPES = ('hero', 'wysiwyg', 'html')
+
+BATCH_SIZE = 1000
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+class TextPool:
+    """
+    Deterministic filler text. Titles and sentences are generated once and
+    then picked at random, so filling millions of rows stays cheap.
+    """
+    def __init__(self, rng, size=500):
+        self.rng = rng
+        self.titles = [words(rng, rng.randrange(2, 5)).title() for _ in range(size)]
+        self.sentences = [words(rng, rng.randrange(6, 16)).capitalize() + '.' for _ in range(size)]
+
+    def title(self):
+        return self.titles[self.rng.randrange(len(self.titles))]
+
+    def sentence(self):
+        return self.sentences[self.rng.randrange(len(self.sentences))]
+
+    def paragraph(self, sentences=4):
+        return ' '.join(self.sentence() for _ in range(sentences))
+
+
+def make_block(rng, text, page_id, position, kind):
+    block = Block(page_id=page_id, label=f'{kind.title()} {position}', position=position)
+    if kind == 'hero':
+        block.type = 'template'
+        block.template_name = 'hero'
+        block.settings = {'title': text.title(), 'subtitle': text.sentence()}
+    elif kind == 'wysiwyg':
+        block.type = 'wysiwyg'
+        block.wysiwyg_content = ''.join(f'<p>{text.paragraph()}</p>' for _ in range(3))
+    else:
+        block.type = 'html'
+        block.html_content = f'<section class="custom"><h2>{text.title()}</h2><p>{text.paragraph(2)}</p></section>'
+    return block
+
+
+def seed_site(pages=50, blocks_per_page=10, menu_items=20, media_items=50, themes=3, seed=0, prefix='bench'):
+    """
+    Create a site: ``pages`` published pages (the first is the homepage)
+    with ``blocks_per_page`` blocks each, menus, media items, themes (the
+    first active), site settings and a Jitsi room. Returns a dict with the
+    created user, room and page ids.
+    """
+    rng = random.Random(seed)
+    text = TextPool(rng)
+    now = timezone.now()
+
+    user = User.objects.create_superuser(f'{prefix}-admin', f'{prefix}@example.com', f'{prefix}-password')
+    if not SiteSettings.objects.exists():
+        SiteSettings.objects.create(site_title=f'{prefix.title()} Site', email=f'{prefix}@example.com')
+
+    Theme.objects.bulk_create([
+        Theme(name=f'{prefix.title()} Theme {i}', slug=f'{prefix}-theme-{i}', directory=f'{prefix}_{i}', is_active=i == 0)
+        for i in range(themes)
+    ], batch_size=BATCH_SIZE)
+
+    Page.objects.bulk_create([
+        Page(
+            title=text.title(), slug=f'{prefix}-page-{i}', status='published',
+            is_homepage=i == 0, publish_date=now, author=user, order=i,
+            meta_description=text.sentence(),
+            menu_placement='header' if i < 5 else 'none',
+        )
+        for i in range(pages)
+    ], batch_size=BATCH_SIZE)
+    page_ids = list(Page.objects.filter(slug__startswith=f'{prefix}-page-').order_by('order').values_list('pk', flat=True))
+
+    # A shallow tree: every page after the first ten hangs below one of them
+    children = [Page(pk=page_id, parent_id=page_ids[rng.randrange(10)]) for page_id in page_ids[10:]]
+    Page.objects.bulk_update(children, ['parent'], batch_size=BATCH_SIZE)
+
+    Block.objects.bulk_create(
+        (
+            make_block(rng, text, page_id, position, BLOCK_TYPES[position % len(BLOCK_TYPES)] if position else 'hero')
+            for page_id in page_ids for position in range(blocks_per_page)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    top_level = MenuItem.objects.bulk_create([
+        MenuItem(title=text.title(), position='header', url='/', page_id=rng.choice(page_ids), order=i)
+        for i in range(max(1, menu_items // 4))
+    ])
+    MenuItem.objects.bulk_create([
+        MenuItem(
+            title=text.title(), position=rng.choice(['header', 'footer']), url='/',
+            page_id=rng.choice(page_ids), parent=rng.choice(top_level) if i % 2 else None, order=i,
+        )
+        for i in range(menu_items - len(top_level))
+    ], batch_size=BATCH_SIZE)
+
+    folder = MediaFolder.objects.create(name=f'{prefix.title()} Media', slug=f'{prefix}-media')
+    MediaItem.objects.bulk_create([
+        make_media_item(rng, text, prefix, i, folder.pk, user.pk)
+        for i in range(media_items)
+    ], batch_size=BATCH_SIZE)
+
+    room = JitsiRoom.objects.create(name=f'{prefix.title()} Room', slug=f'{prefix}-room', creator=user, status='active')
+    JitsiMeeting.objects.create(room=room, meeting_id=f'{prefix}-meeting', subject=room.name)
+
+    return {'user': user, 'room': room, 'page_ids': page_ids}
+
+
+def make_media_item(rng, text, prefix, index, folder_id, user_id):
+    file = f'uploads/{prefix}/image-{index}.jpg'
+    return MediaItem(
+        title=text.title(), file=file, file_name=f'image-{index}.jpg',
+        file_size=rng.randrange(20000, 2000000), file_type='jpg', media_type='image',
+        folder_id=folder_id, width=1600, height=900, uploaded_by_id=user_id,
+        # Derived from the (prefix-specific) file name, so runs with different
+        # prefixes never share a UUID
+        uuid=uuid.uuid5(uuid.NAMESPACE_URL, file),
+    )
+
+
+def next_pk(model):
+    return (model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0) + 1
+
+
+def reset_sequences(*models):
+    """Move the databases's id sequences past rows inserted with explicit primary keys"""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def insert_batches(model, objects, batch_size=5000, progress=None):
+    """
+    Insert ``objects`` (any iterable, consumed lazily) in batches, one
+    transaction per batch, so memory use stays flat however many rows are
+    generated. Calls ``progress(model, inserted)`` after each batch; returns
+    the count.
+
+    This is bulk_create without its per-field SQL compilation, which
+    dominates at millions of rows: values are prepared straight from the
+    instances (defaults and auto_now fields included) and sent with a single
+    executemany per batch. The primary key is included when the objects
+    have one.
+    """
+    opts = model._meta
+    inserted = 0
+    iterator = iter(objects)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return inserted
+        fields = [field for field in opts.concrete_fields if not (field.primary_key and batch[0].pk is None)]
+        auto_fields = [field for field in fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            connection.ops.quote_name(opts.db_table),
+            ', '.join(connection.ops.quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        rows = []
+        for obj in batch:
+            for field in auto_fields:
+                field.pre_save(obj, True)
+            rows.append([field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields])
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        inserted += len(batch)
+        if progress is not None:
+            progress(model, inserted)
+
+
+class SiteGenerator:
+    """
+    Generate a large site deterministically from a seed.
+
+    Pages, menu items and blocks get explicit primary keys (continuing after
+    the current maximum), so parents can be assigned while inserting and
+    nothing is held in memory beyond one batch and the page depths.
+    Generated rows are marked with ``prefix`` (slugs, emails, file names).
+    """
+    BLOCK_WEIGHTS = (('hero', 0.2), ('wysiwyg', 0.5), ('html', 0.3))
+
+    def __init__(self, seed=0, prefix='gen', batch_size=5000, progress=None):
+        self.seed = seed
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.progress = progress
+        self.now = timezone.now()
+
+    def rng(self, name):
+        """An independent random stream per table, so changing one count doesn't reshuffle the others"""
+        return random.Random(f'{self.seed}:{name}')
+
+    def insert(self, model, objects):
+        return insert_batches(model, objects, self.batch_size, self.progress)
+
+    def get_user(self):
+        user, created = User.objects.get_or_create(
+            username=f'{self.prefix}-author', defaults={'email': f'{self.prefix}-author@example.com', 'is_staff': True},
+        )
+        return user
+
+    def generate_pages(self, count, max_depth=8):
+        """
+        Pages with a deep parent tree: each page's parent is one of the
+        recently generated pages, unless that would exceed ``max_depth``.
+        Returns the range of the new primary keys.
+        """
+        rng = self.rng('pages')
+        text = TextPool(rng)
+        author_id = self.get_user().pk
+        first_pk = next_pk(Page)
+        depths = array('B')
+
+        def pages():
+            for i in range(count):
+                parent_index = None
+                if i and rng.random() < 0.9:
+                    candidate = i - 1 - rng.randrange(min(i, 20))
+                    if depths[candidate] < max_depth:
+                        parent_index = candidate
+                depths.append(0 if parent_index is None else depths[parent_index] + 1)
+                yield Page(
+                    pk=first_pk + i, title=text.title(), slug=f'{self.prefix}-page-{i}',
+                    status='published' if rng.random() < 0.9 else 'draft', publish_date=self.now,
+                    parent_id=None if parent_index is None else first_pk + parent_index,
+                    order=i, author_id=author_id, meta_description=text.sentence(),
+                    language=rng.choice(('en', 'en', 'en', 'de', 'fr')),
+                )
+
+        self.insert(Page, pages())
+        reset_sequences(Page)
+        return range(first_pk, first_pk + count)
+
+    def generate_blocks(self, page_ids, blocks_per_page=10):
+        """Between half and one and a half times ``blocks_per_page`` blocks per page, in a hero/wysiwyg/html mix"""
+        rng = self.rng('blocks')
+        text = TextPool(rng)
+        kinds, weights = zip(*self.BLOCK_WEIGHTS)
+        low, high = max(1, blocks_per_page // 2), max(1, blocks_per_page * 3 // 2)
+
+        def blocks():
+            for page_id in page_ids:
+                count = rng.randint(low, high)
+                for position, kind in enumerate(rng.choices(kinds, weights, k=count)):
+                    yield make_block(rng, text, page_id, position, kind)
+
+        return self.insert(Block, blocks())
+
+    def generate_menu_items(self, count, page_ids):
+        """Menu items three levels deep across header, footer and sidebar"""
+        rng = self.rng('menu_items')
+        text = TextPool(rng)
+        first_pk = next_pk(MenuItem)
+        roots = max(1, count // 10)
+
+        def menu_items():
+            for i in range(count):
+                if i < roots:
+                    parent_id = None
+                elif i < roots * 4:
+                    parent_id = first_pk + rng.randrange(roots)
+                else:
+                    parent_id = first_pk + roots + rng.randrange(roots * 3)
+                yield MenuItem(
+                    pk=first_pk + i, title=text.title(), position=rng.choice(('header', 'footer', 'sidebar')),
+                    url='/', page_id=rng.choice(page_ids) if page_ids else None, parent_id=parent_id, order=i,
+                )
+
+        inserted = self.insert(MenuItem, menu_items())
+        reset_sequences(MenuItem)
+        return inserted
+
+    def generate_media_items(self, count):
+        rng = self.rng('media_items')
+        text = TextPool(rng)
+        folder, created = MediaFolder.objects.get_or_create(
+            slug=f'{self.prefix}-media', parent=None, defaults={'name': f'{self.prefix.title()} Media'},
+        )
+        user_id = self.get_user().pk
+        return self.insert(MediaItem, (
+            make_media_item(rng, text, self.prefix, i, folder.pk, user_id) for i in range(count)
+        ))
+
+    def generate_contact_messages(self, count):
+        rng = self.rng('contact_messages')
+        text = TextPool(rng)
+        return self.insert(ContactMessage, (
+            ContactMessage(
+                name=text.title(), email=f'{self.prefix}-contact-{i}@example.com', subject=text.title(),
+                message=text.paragraph(rng.randrange(1, 6)), is_read=rng.random() < 0.6,
+            )
+            for i in range(count)
+        ))
+
+    def generate_subscribers(self, count):
+        rng = self.rng('subscribers')
+        text = TextPool(rng)
+        return self.insert(NewsletterSubscriber, (
+            NewsletterSubscriber(
+                email=f'{self.prefix}-subscriber-{i}@example.com', name=text.title(), is_active=rng.random() < 0.95,
+            )
+            for i in range(count)
+        ))
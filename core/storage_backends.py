@@ -1,9 +1,339 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+from django.utils._os import safe_join
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from .metrics import count_cache
+
+
+class URLCacheMixin:
+    """
+    Memoize url() per object name in a bounded in-process LRU.
+
+    Signed S3 URLs are cached for half of their ``querystring_expire``
+    lifetime, so a URL handed out from the cache is always valid for at least
+    that long. Unsigned URLs never change and are cached for
+    ``MEDIA_URL_CACHE_TIMEOUT`` seconds.
+    """
+    url_cache_size = 10000
+
+    def _get_url_cache(self):
+        # Created lazily so that the mixin needs no __init__ of its own
+        cache = self.__dict__.get('_url_cache')
+        if cache is None:
+            cache = self.__dict__.setdefault('_url_cache', (OrderedDict(), threading.Lock()))
+        return cache
+
+    def get_url_cache_timeout(self):
+        if getattr(self, 'querystring_auth', False):
+            return getattr(self, 'querystring_expire', 3600) / 2
+        return getattr(settings, 'MEDIA_URL_CACHE_TIMEOUT', 24 * 60 * 60)
+
+    def url(self, name, *args, **kwargs):
+        if args or any(value is not None for value in kwargs.values()):
+            # Custom parameters or expiry: don't cache
+            return super().url(name, *args, **kwargs)
+        return self.urls([name])[name]
+
+    def urls(self, names):
+        """Return a {name: url} dict, generating only the URLs that aren't cached"""
+        entries, lock = self._get_url_cache()
+        now = time.monotonic()
+        result = {}
+        missing = []
+
+        with lock:
+            for name in names:
+                entry = entries.get(name)
+                if entry is not None and entry[1] > now:
+                    entries.move_to_end(name)
+                    result[name] = entry[0]
+                else:
+                    missing.append(name)
+
+        count_cache('media_urls', hits=len(result), misses=len(missing))
+        if missing:
+            expires_at = now + self.get_url_cache_timeout()
+            generated = {name: super(URLCacheMixin, self).url(name) for name in missing}
+            with lock:
+                for name, url in generated.items():
+                    entries[name] = (url, expires_at)
+                    entries.move_to_end(name)
+                while len(entries) > self.url_cache_size:
+                    entries.popitem(last=False)
+            result.update(generated)
+
+        return result
+
+    def forget_url(self, name):
+        entries, lock = self._get_url_cache()
+        with lock:
+            entries.pop(name, None)
+
+    def _save(self, name, content):
+        name = super()._save(name, content)
+        self.forget_url(name)
+        return name
+
+    def delete(self, name):
+        super().delete(name)
+        self.forget_url(name)
 
-class MediaStorage(S3Boto3Storage):
+
+def bulk_urls(files):
+    """
+    Return {name: url} for a list of FieldFiles, grouping them by storage.
+
+    Storages with a ``urls()`` method (see URLCacheMixin) answer each group in
+    one call; other storages fall back to url() per file. Empty files are
+    skipped.
+    """
+    by_storage = {}
+    for field_file in files:
+        if field_file:
+            by_storage.setdefault(field_file.storage, []).append(field_file.name)
+
+    result = {}
+    for storage, names in by_storage.items():
+        if hasattr(storage, 'urls'):
+            result.update(storage.urls(names))
+        else:
+            result.update({name: storage.url(name) for name in names})
+    return result
+
+
+class MediaStorage(URLCacheMixin, S3Boto3Storage):
     """
     Custom S3 storage for media files
     """
     location = 'media'
-    file_overwrite = False
\ No newline at end of file
+    file_overwrite = False
+
+
+@deconstructible
+class CachedMediaStorage(Storage):
+    """
+    Media storage that keeps recently read files on local disk.
+
+    Reads are served from a local cache directory when possible and fetched
+    from the remote storage (S3 by default) otherwise. Writes and deletes go
+    straight through to the remote storage. The cache is bounded by
+    ``max_size`` bytes and evicts the least recently used files first; files
+    larger than ``max_file_size`` are never cached.
+
+    Any Storage can act as the remote, so a FileSystemStorage pointed at a
+    scratch directory works as a stand-in for S3 in tests.
+    """
+    # Evict down to this fraction of max_size so we don't evict on every miss
+    low_water_mark = 0.9
+
+    def __init__(self, remote=None, location=None, max_size=None, max_file_size=None):
+        if remote is None:
+            remote = import_string(getattr(
+                settings, 'MEDIA_CACHE_REMOTE_STORAGE', 'core.storage_backends.MediaStorage'
+            ))()
+        self.remote = remote
+        self.location = os.path.abspath(
+            location or getattr(settings, 'MEDIA_CACHE_DIR', os.path.join(settings.BASE_DIR, 'media_cache'))
+        )
+        self.max_size = max_size or getattr(settings, 'MEDIA_CACHE_MAX_SIZE', 1024 * 1024 * 1024)
+        self.max_file_size = max_file_size or getattr(settings, 'MEDIA_CACHE_MAX_FILE_SIZE', 50 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._cached_bytes = None
+
+    def __getattr__(self, name):
+        # Expose remote-specific attributes such as the S3 bucket, so callers
+        # that know about the remote (e.g. ranged header reads) keep working
+        if name == 'remote':
+            raise AttributeError(name)
+        return getattr(self.remote, name)
+
+    # Cache bookkeeping
+
+    def cache_path(self, name):
+        return safe_join(self.location, name)
+
+    def is_cached(self, name):
+        return os.path.exists(self.cache_path(name))
+
+    def _scan_cache(self):
+        """Return [(mtime, size, path)] for every file in the cache directory"""
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.location):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _add_to_cache(self, source, name):
+        """Copy an open file into the cache, then evict if over the size limit"""
+        path = self.cache_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file and rename it into place, so concurrent
+        # readers never see a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: source.read(64 * 1024), b''):
+                    size += len(chunk)
+                    if size > self.max_file_size:
+                        raise OverflowError
+                    tmp.write(chunk)
+            os.replace(tmp_path, path)
+        except OverflowError:
+            os.unlink(tmp_path)
+            return False
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self._track(size)
+        return True
+
+    def _track(self, size):
+        with self._lock:
+            if self._cached_bytes is None:
+                self._cached_bytes = sum(entry[1] for entry in self._scan_cache())
+            else:
+                self._cached_bytes += size
+            over_limit = self._cached_bytes > self.max_size
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used files until the cache is below its low-water mark.
+
+        The cache directory is rescanned, so files cached by other processes
+        sharing the directory are accounted for.
+        """
+        with self._lock:
+            entries = sorted(self._scan_cache())
+            total = sum(entry[1] for entry in entries)
+            target = self.max_size * self.low_water_mark
+            for mtime, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._cached_bytes = total
+
+    def uncache(self, name):
+        """Drop the local copy of a file, if there is one"""
+        try:
+            os.unlink(self.cache_path(name))
+        except FileNotFoundError:
+            pass
+
+    def clear_cache(self):
+        with self._lock:
+            shutil.rmtree(self.location, ignore_errors=True)
+            self._cached_bytes = 0
+
+    # Storage API
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            return self.remote.open(name, mode)
+
+        path = self.cache_path(name)
+        try:
+            # Touch the file so its mtime records the last access for LRU eviction
+            os.utime(path)
+            file = File(open(path, mode), name)
+            count_cache('media_files', hits=1)
+            return file
+        except FileNotFoundError:
+            count_cache('media_files', misses=1)
+
+        # Files too big to cache are read straight from the remote, rather
+        # than downloaded once for the cache and again when that fails
+        if self.remote.size(name) > self.max_file_size:
+            return self.remote.open(name, mode)
+
+        with self.remote.open(name, 'rb') as source:
+            cached = self._add_to_cache(source, name)
+        if cached:
+            try:
+                return File(open(path, mode), name)
+            except FileNotFoundError:
+                # Evicted by another reader in the meantime
+                pass
+        return self.remote.open(name, mode)
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.remote.save(name, content, max_length=max_length)
+
+        # Write-through: keep a local copy of what we just uploaded
+        try:
+            content.seek(0)
+            self._add_to_cache(content, name)
+        except Exception:
+            pass
+        return name
+
+    def delete(self, name):
+        self.remote.delete(name)
+        self.uncache(name)
+
+    def exists(self, name):
+        return self.remote.exists(name)
+
+    def listdir(self, path):
+        return self.remote.listdir(path)
+
+    def size(self, name):
+        path = self.cache_path(name)
+        if os.path.exists(path):
+            return os.path.getsize(path)
+        return self.remote.size(name)
+
+    def url(self, name):
+        return self.remote.url(name)
+
+    def urls(self, names):
+        if hasattr(self.remote, 'urls'):
+            return self.remote.urls(names)
+        return {name: self.remote.url(name) for name in names}
+
+    def path(self, name):
+        return self.remote.path(name)
+
+    def get_valid_name(self, name):
+        return self.remote.get_valid_name(name)
+
+    def get_available_name(self, name, max_length=None):
+        return self.remote.get_available_name(name, max_length=max_length)
+
+    def generate_filename(self, filename):
+        return self.remote.generate_filename(filename)
+
+    def get_accessed_time(self, name):
+        return self.remote.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.remote.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.remote.get_modified_time(name)
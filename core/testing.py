@@ -0,0 +1,62 @@
+"""
+Test helpers enforcing query budgets:
+
+    from core.testing import assert_query_budget, query_budget
+
+    class PageTests(TestCase):
+        def test_home_page(self):
+            # Budget from settings.QUERY_BUDGETS['home']
+            assert_query_budget(self.client, '/')
+
+        def test_menu(self):
+            with query_budget(queries=5, duplicates=0):
+                render_menu()
+
+Failures raise QueryBudgetExceeded (an AssertionError) listing the
+repeated queries and the template line or code that ran them.
+"""
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.urls import resolve
+
+from .queries import QueryBudgetExceeded, QueryRecorder, check_budget, get_budget
+
+
+@contextmanager
+def query_budget(queries=None, duplicates=None, db_ms=None, using=None):
+    """
+    Fail if the block runs more than ``queries`` queries, more than
+    ``duplicates`` repeated ones or spends more than ``db_ms`` in the
+    database. Checks every connection unless ``using`` names one. Yields
+    the QueryRecorder.
+    """
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in [connections[using]] if using else connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+    violations = check_budget(recorder, {'queries': queries, 'duplicates': duplicates, 'db_ms': db_ms})
+    if violations:
+        raise QueryBudgetExceeded(f"Over the query budget ({'; '.join(violations)}): {recorder.report()}")
+
+
+def assert_query_budget(client, path, budget=None, **extra):
+    """
+    GET ``path`` with the test ``client`` within ``budget`` (a dict like
+    settings.QUERY_BUDGETS values), by default the budget of the URL name
+    ``path`` resolves to. Returns the response.
+    """
+    view_name = resolve(urlsplit(path).path).view_name
+    budget = budget if budget is not None else get_budget(view_name)
+    if budget is None:
+        raise ImproperlyConfigured(f"No query budget for '{view_name}' in settings.QUERY_BUDGETS.")
+    if not isinstance(budget, dict):
+        budget = {'queries': budget}
+    try:
+        with query_budget(**budget):
+            return client.get(path, **extra)
+    except QueryBudgetExceeded as e:
+        raise QueryBudgetExceeded(f'GET {path} ({view_name}): {e}') from None
@@ -0,0 +1,273 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from media.delivery import get_etag, parse_range_header, serve_file
+
+from .cache import TieredCache
+from .storage_backends import CachedMediaStorage
+
+
+class CachedMediaStorageTests(SimpleTestCase):
+    """CachedMediaStorage with a FileSystemStorage standing in for S3"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.remote = FileSystemStorage(location=os.path.join(self.tmp, 'remote'))
+        self.storage = CachedMediaStorage(
+            remote=self.remote, location=os.path.join(self.tmp, 'cache'), max_size=100, max_file_size=40,
+        )
+
+    def read(self, name):
+        with self.storage.open(name) as f:
+            return f.read()
+
+    def test_miss_fetches_from_remote_and_caches(self):
+        self.remote.save('a.txt', ContentFile(b'a' * 10))
+        self.assertFalse(self.storage.is_cached('a.txt'))
+        self.assertEqual(self.read('a.txt'), b'a' * 10)
+        self.assertTrue(self.storage.is_cached('a.txt'))
+
+    def test_hit_is_served_from_cache(self):
+        self.remote.save('a.txt', ContentFile(b'a' * 10))
+        self.read('a.txt')
+        with mock.patch.object(self.remote, 'open') as remote_open:
+            self.assertEqual(self.read('a.txt'), b'a' * 10)
+        remote_open.assert_not_called()
+
+    def test_save_writes_through(self):
+        name = self.storage.save('b.txt', ContentFile(b'b' * 10))
+        self.assertTrue(self.remote.exists(name))
+        self.assertTrue(self.storage.is_cached(name))
+
+    def test_delete_removes_both_copies(self):
+        name = self.storage.save('b.txt', ContentFile(b'b' * 10))
+        self.storage.delete(name)
+        self.assertFalse(self.remote.exists(name))
+        self.assertFalse(self.storage.is_cached(name))
+
+    def test_evicts_least_recently_used(self):
+        for name in ('a', 'b', 'c'):
+            self.remote.save(name, ContentFile(name.encode() * 30))
+        for age, name in enumerate(('a', 'b', 'c')):
+            self.read(name)
+            os.utime(self.storage.cache_path(name), (1000 + age, 1000 + age))
+        # Reading 'a' again makes 'b' the least recently used
+        self.read('a')
+        self.remote.save('d', ContentFile(b'd' * 30))
+        self.read('d')
+        self.assertEqual(
+            [name for name in 'abcd' if self.storage.is_cached(name)], ['a', 'c', 'd'],
+        )
+
+    def test_oversize_file_is_read_from_remote_once(self):
+        self.remote.save('big.bin', ContentFile(b'x' * 50))
+        with mock.patch.object(self.remote, 'open', wraps=self.remote.open) as remote_open:
+            self.assertEqual(self.read('big.bin'), b'x' * 50)
+        self.assertEqual(remote_open.call_count, 1)
+        self.assertFalse(self.storage.is_cached('big.bin'))
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range_header('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range_header('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range_header('bytes=-500', 100), (0, 99))
+        self.assertEqual(parse_range_header('bytes=50-500', 100), (50, 99))
+
+    def test_ignored_headers(self):
+        for header in (None, '', 'bytes=-', 'items=0-9', 'bytes=0-9,20-29'):
+            self.assertIsNone(parse_range_header(header, 100), header)
+
+    def test_unsatisfiable_ranges(self):
+        for header, size in (('bytes=100-', 100), ('bytes=9-0', 100), ('bytes=-0', 100),
+                             ('bytes=-10', 0), ('bytes=0-', 0)):
+            with self.assertRaises(ValueError, msg=header):
+                parse_range_header(header, size)
+
+
+@override_settings(MEDIA_DELIVERY_MODE=None, MEDIA_DELIVERY_CHUNK_SIZE=16)
+class ServeFileTests(SimpleTestCase):
+    """Range and If-Range handling when Django streams the file itself"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = self.write('clip.mp4', bytes(range(100)))
+        self.factory = RequestFactory()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def serve(self, path=None, **headers):
+        request = self.factory.get('/media/file/', headers=headers)
+        response = serve_file(request, path or self.path, 'clip.mp4', 'clip.mp4')
+        self.addCleanup(response.close)
+        return response
+
+    def test_full_file(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(100)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_range(self):
+        response = self.serve(Range='bytes=10-39')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-39/100')
+        self.assertEqual(response['Content-Length'], '30')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 40)))
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(Range='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_range_of_an_empty_file(self):
+        response = self.serve(self.write('empty.mp4', b''), Range='bytes=-10')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_if_range_matching_etag(self):
+        etag = get_etag(os.stat(self.path))
+        response = self.serve(Range='bytes=0-9', **{'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+
+    def test_if_range_stale_etag_gets_the_full_file(self):
+        response = self.serve(Range='bytes=0-9', **{'If-Range': '"outdated"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(100)))
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'l2': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-l2'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    """Two TieredCache instances over one LocMem L2 stand in for two processes"""
+
+    def setUp(self):
+        caches['l2'].clear()
+        self.a = self.make_cache()
+        self.b = self.make_cache()
+
+    def make_cache(self, **options):
+        options = {'STAMP_CHECK_INTERVAL': 0, 'STALE_TIMEOUT': 60, 'LOCK_WAIT': 2, **options}
+        return TieredCache('l2', {'OPTIONS': options})
+
+    def tamper(self, key, value):
+        """Change a value in L2 behind the caches' back, keeping its version"""
+        full_key = self.a.make_key(key)
+        entry = caches['l2'].get(full_key)
+        caches['l2'].set(full_key, (value,) + entry[1:])
+
+    def test_write_is_seen_by_the_other_instance(self):
+        self.a.set('key', 1)
+        self.assertEqual(self.b.get('key'), 1)
+        self.b.set('key', 2)
+        self.assertEqual(self.a.get('key'), 2)
+        self.b.delete('key')
+        self.assertIsNone(self.a.get('key'))
+
+    def test_l1_hit_is_trusted_within_the_check_interval(self):
+        a = self.make_cache(STAMP_CHECK_INTERVAL=60)
+        a.set('key', 1)
+        self.b.set('key', 2)
+        self.assertEqual(a.get('key'), 1)
+
+    def test_writes_to_other_keys_keep_l1(self):
+        self.a.set('key', 1)
+        self.tamper('key', 'from L2')
+        for value in range(5):
+            self.b.set('other', value)
+        self.b.delete('other')
+        # Still the L1 copy: its version in L2 has not changed
+        self.assertEqual(self.a.get('key'), 1)
+
+    def test_clear_drops_every_instances_l1(self):
+        self.a.get('warm-up')
+        self.a.set('key', 1)
+        self.b.clear()
+        self.assertIsNone(self.a.get('key'))
+
+    def test_clear_drops_l1_even_if_versions_survive(self):
+        self.a.get('warm-up')
+        self.a.set('key', 1)
+        full_key = self.a.make_key('key')
+        saved = caches['l2'].get_many([full_key, f'{full_key}:version'])
+        self.b.clear()
+        # Even if the key's version survived, the stamp drops the whole L1
+        caches['l2'].set_many(saved)
+        self.a.get('other')
+        self.assertNotIn(full_key, self.a._l1)
+
+    def test_add(self):
+        self.assertTrue(self.a.add('key', 1))
+        self.assertFalse(self.b.add('key', 2))
+        self.assertEqual(self.b.get('key'), 1)
+
+    def test_add_replaces_an_expired_value(self):
+        self.a.set('key', 1, timeout=0.05)
+        time.sleep(0.1)
+        self.assertTrue(self.b.add('key', 2))
+        self.assertEqual(self.a.get('key'), 2)
+
+    def test_touch(self):
+        self.assertFalse(self.a.touch('key'))
+        self.a.set('key', 1, timeout=0.05)
+        self.assertTrue(self.b.touch('key', 60))
+        time.sleep(0.1)
+        self.assertEqual(self.a.get('key'), 1)
+
+    def test_get_or_set_computes_once_per_process(self):
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        threads = [threading.Thread(target=lambda: results.append(self.a.get_or_set('key', compute)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 10)
+
+    def test_get_or_set_serves_the_stale_value_while_another_process_refreshes(self):
+        self.a.set('key', 'old', timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.b.get('key'))
+        # The other process holds the refresh lock
+        caches['l2'].add(f"{self.a.make_key('key')}:lock", 1)
+        self.assertEqual(self.b.get_or_set('key', lambda: 'new'), 'old')
+        caches['l2'].delete(f"{self.a.make_key('key')}:lock")
+        self.assertEqual(self.b.get_or_set('key', lambda: 'new'), 'new')
+        self.assertEqual(self.a.get('key'), 'new')
+
+    def test_get_or_set_waits_for_another_process_without_a_stale_value(self):
+        lock_key = f"{self.a.make_key('key')}:lock"
+        caches['l2'].add(lock_key, 1)
+        timer = threading.Timer(0.1, lambda: self.a.set('key', 'from a'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(self.b.get_or_set('key', lambda: 'from b'), 'from a')
@@ -0,0 +1,90 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.base import Template
+
+from .metrics import registry
+
+
+# Trace of the current request, set by core.middleware.TracingMiddleware
+current_trace = ContextVar('current_trace', default=None)
+
+_original_render = Template._render
+
+
+class Trace:
+    """Spans (name, category, milliseconds) recorded while handling one request"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, category, name, duration_ms):
+        self.spans.append((category, name, duration_ms))
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def summarize(self):
+        """Total time and count per (category, name), slowest first"""
+        totals = {}
+        for category, name, duration_ms in self.spans:
+            total, count = totals.get((category, name), (0.0, 0))
+            totals[(category, name)] = (total + duration_ms, count + 1)
+        return sorted(
+            ((category, name, total, count) for (category, name), (total, count) in totals.items()),
+            key=lambda item: item[2], reverse=True,
+        )
+
+
+def record(category, name, duration_ms):
+    """Add a span to the current trace and to the ``<category>_ms`` histogram"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(category, name, duration_ms)
+    registry.observe(f'{category}_ms', name, duration_ms)
+
+
+@contextmanager
+def span(category, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(category, name, (time.perf_counter() - started) * 1000)
+
+
+def traced(category, name=None):
+    """Decorator recording each call of a function as a span"""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(category, label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_render(self, context):
+    """
+    Template._render, timed. Covers the base template (rendered through
+    {% extends %}), every {% include %} and each block template. Times are
+    inclusive: a page template's time contains the blocks it includes.
+    """
+    if current_trace.get() is None:
+        return _original_render(self, context)
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        record('template', self.name or '<string>', (time.perf_counter() - started) * 1000)
+
+
+def install():
+    """Time template renders; called once from CoreConfig.ready() if TRACING_ENABLED"""
+    if getattr(settings, 'TRACING_ENABLED', True):
+        Template._render = traced_render
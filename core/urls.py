@@ -4,6 +4,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.sitemaps.views import sitemap
 from portfolio.sitemaps import PageSitemap
+from core import views as core_views
 
 sitemaps = {
     'pages': PageSitemap,
@@ -13,6 +14,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('ckeditor/', include('ckeditor_uploader.urls')),
     path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('metrics/', core_views.metrics, name='metrics'),
+    path('metrics/prometheus/', core_views.prometheus_metrics, name='prometheus_metrics'),
     
     # Include app URLs
     path('media-manager/', include('media.urls')),
@@ -0,0 +1,87 @@
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import profiling
+from .metrics import collect, registry, render_prometheus
+
+FLAMEGRAPH_ROW_HEIGHT = 18  # pixels
+
+
+@staff_member_required
+def metrics(request):
+    """Latency histograms of this process: requests per view, templates, context processors"""
+    return JsonResponse(registry.snapshot())
+
+
+def prometheus_metrics(request):
+    """
+    Every process's metrics in the Prometheus text format. Open to staff,
+    and to scrapers sending ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    authorized = (
+        (token and constant_time_compare(authorization, f'Bearer {token}'))
+        or (request.user.is_active and request.user.is_staff)
+    )
+    if not authorized:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(render_prometheus(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def profile_list(request):
+    """Stored request profiles, newest first"""
+    return render(request, 'core/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiling.list_profiles(),
+    })
+
+
+@staff_member_required
+def profile_detail(request, name):
+    """A sampled profile as a flamegraph, or the top functions of a cProfile run"""
+    profile = profiling.get_profile(name)
+    if profile is None:
+        raise Http404('Profile not found')
+
+    context = {
+        **admin.site.each_context(request),
+        'title': f"Profile of {profile['method']} {profile['path']}",
+        'profile': profile,
+    }
+    if profile['mode'] == 'sample':
+        stacks = profiling.read_collapsed(profile['data_path'])
+        rows = [
+            {
+                'top': depth * FLAMEGRAPH_ROW_HEIGHT, 'left': left, 'width': width, 'label': label, 'samples': samples,
+                # A stable warm colour per function, like classic flamegraphs
+                'hue': sum(label.encode()) % 50,
+            }
+            for depth, left, width, label, samples in profiling.flamegraph_rows(stacks)
+        ]
+        context['samples'] = sum(stacks.values())
+        context['rows'] = rows
+        context['height'] = max((row['top'] for row in rows), default=-FLAMEGRAPH_ROW_HEIGHT) + FLAMEGRAPH_ROW_HEIGHT
+    else:
+        sort = 'tottime' if request.GET.get('sort') == 'tottime' else 'cumulative'
+        context['sort'] = sort
+        context['functions'] = profiling.top_functions(profile['data_path'], sort=sort)
+    return render(request, 'core/profile_detail.html', context)
+
+
+@staff_member_required
+def profile_download(request, name):
+    """The raw pstats or collapsed-stack file"""
+    profile = profiling.get_profile(name)
+    if profile is None:
+        raise Http404('Profile not found')
+    try:
+        return FileResponse(open(profile['data_path'], 'rb'), as_attachment=True, filename=profile['file'])
+    except FileNotFoundError:
+        raise Http404('Profile not found')
@@ -4,6 +4,7 @@ import time
 import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
+from core.metrics import registry
 from .models import JitsiMeeting, JitsiCustomization, JitsiFeatureConfig
 
 def generate_jwt_token(domain, app_id, app_secret, room_name, user_id, user_name, email, is_moderator=False, expiry=24):
@@ -50,7 +51,8 @@ def generate_jwt_token(domain, app_id, app_secret, room_name, user_id, user_name
     # In some JWT libraries, encode returns a byte string
     if isinstance(token, bytes):
         token = token.decode('utf-8')
-        
+    
+    registry.inc('jitsi_tokens', 'moderator' if is_moderator else 'participant')
     return token
 
 
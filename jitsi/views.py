@@ -13,6 +13,8 @@ from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
+from core.metrics import registry
+from core.tracing import traced
 from .models import JitsiRoom, JitsiParticipant, JitsiCustomization, JitsiFeatureConfig, JitsiMeeting
 from .forms import JitsiRoomForm, JitsiCustomizationForm, JitsiFeatureConfigForm
 from .services import (
@@ -330,7 +332,12 @@ def meeting_embed(request, room_id):
     return render(request, 'jitsi/meeting_embed.html', context)
 
 
+# Event types counted by name in the webhook metrics; anything else is 'other'
+WEBHOOK_EVENTS = ('participant_joined', 'participant_left', 'meeting_ended')
+
+
 @csrf_exempt
+@traced('jitsi_webhook', 'meeting_webhook')
 def meeting_webhook(request):
     """
     Webhook for Jitsi events (participant join/leave, meeting end, etc.)
@@ -342,6 +349,7 @@ def meeting_webhook(request):
         data = json.loads(request.body)
         event_type = data.get('event_type')
         room_id = data.get('room_id')
+        registry.inc('jitsi_webhooks', event_type if event_type in WEBHOOK_EVENTS else 'other')
         
         room = JitsiRoom.objects.get(id=room_id)
         
@@ -1,3 +1,87 @@
 from django.contrib import admin
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.urls import NoReverseMatch, reverse
+from django.utils.html import format_html, format_html_join
+from django.utils.translation import gettext_lazy as _
+from .models import MediaFolder, MediaItem
+from .references import get_tracked_models
 
-# Register your models here.
+
+@admin.register(MediaFolder)
+class MediaFolderAdmin(admin.ModelAdmin):
+    """Admin interface for media folders"""
+    list_display = ('full_name', 'slug', 'depth', 'created_at')
+    search_fields = ('name', 'path')
+    ordering = ('path',)
+    prepopulated_fields = {'slug': ('name',)}
+    readonly_fields = ('path', 'depth', 'created_at')
+    fields = ('name', 'slug', 'parent', 'path', 'depth', 'created_at')
+
+
+@admin.register(MediaItem)
+class MediaItemAdmin(admin.ModelAdmin):
+    """Admin interface for media items"""
+    list_display = ('title', 'media_type', 'folder', 'file_size_display', 'uploaded_at')
+    list_filter = ('media_type', 'is_featured', 'uploaded_at')
+    search_fields = ('title', 'file_name', 'alt_text')
+    list_select_related = ('folder',)
+    readonly_fields = ('file_name', 'file_size', 'file_type', 'width', 'height',
+                       'uploaded_by', 'uploaded_at', 'modified_at', 'where_used')
+
+    fieldsets = (
+        (_('File'), {
+            'fields': ('title', 'file', 'folder', 'is_featured')
+        }),
+        (_('Metadata'), {
+            'fields': ('alt_text', 'description')
+        }),
+        (_('File Information'), {
+            'fields': ('file_name', 'file_size', 'file_type', 'width', 'height',
+                       'uploaded_by', 'uploaded_at', 'modified_at'),
+            'classes': ('collapse',)
+        }),
+        (_('Usage'), {
+            'fields': ('where_used',)
+        }),
+    )
+
+    def file_size_display(self, obj):
+        return obj.get_file_size_display()
+    file_size_display.short_description = _('File Size')
+
+    def where_used(self, obj):
+        """List the objects that reference this item, linked to their admin pages"""
+        # One query per referencing model instead of one per reference;
+        # blocks bring their page along for Block.__str__
+        querysets = [
+            model._default_manager.select_related('page') if model._meta.label == 'pagebuilder.Block'
+            else model._default_manager.all()
+            for model, fields in get_tracked_models()
+        ]
+        references = (obj.references.select_related('content_type')
+                      .prefetch_related(GenericPrefetch('content_object', querysets))
+                      .order_by('content_type', 'object_id'))
+        rows = []
+        for reference in references:
+            target = reference.content_object
+            if target is None:
+                continue
+            try:
+                url = reverse(f'admin:{reference.content_type.app_label}_{reference.content_type.model}_change',
+                              args=[reference.object_id])
+            except NoReverseMatch:
+                url = ''
+            label = f"{reference.content_type.name.capitalize()}: {target} ({reference.field})"
+            rows.append((url, label))
+        if not rows:
+            return _('Not used by any page, block or site settings')
+        return format_html('<ul>{}</ul>', format_html_join(
+            '', '<li><a href="{}">{}</a></li>', rows
+        ))
+    where_used.short_description = _('Where used')
+
+    def save_model(self, request, obj, form, change):
+        """Record the uploader automatically"""
+        if not obj.uploaded_by:
+            obj.uploaded_by = request.user
+        super().save_model(request, obj, form, change)
@@ -0,0 +1,134 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_delivery_settings():
+    """Read the delivery settings, falling back to plain Django streaming"""
+    return {
+        'mode': getattr(settings, 'MEDIA_DELIVERY_MODE', None),
+        'accel_prefix': getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/'),
+        'chunk_size': getattr(settings, 'MEDIA_DELIVERY_CHUNK_SIZE', 64 * 1024),
+    }
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single-range ``Range: bytes=...`` header.
+
+    Returns a (start, end) tuple with an inclusive end, None if the header
+    should be ignored (missing, malformed or a multi-range request, all of
+    which get the full file), or raises ValueError if the range cannot be
+    satisfied.
+    """
+    if not header:
+        return None
+
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if size == 0:
+        # No byte of an empty file can be selected
+        raise ValueError('Unsatisfiable range')
+
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError('Unsatisfiable range')
+    return start, min(end, size - 1)
+
+
+def file_range_iterator(path, start, length, chunk_size):
+    """Yield ``length`` bytes of a file from ``start`` in fixed-size chunks"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def get_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def serve_file(request, path, name, file_name):
+    """
+    Build a response for a file on local disk.
+
+    When ``MEDIA_DELIVERY_MODE`` is ``'nginx'`` or ``'apache'`` the transfer is
+    handed to the front proxy with X-Accel-Redirect or X-Sendfile, which then
+    deals with Range requests itself. Otherwise the file is streamed in fixed
+    size chunks, answering single byte-range requests with 206 responses.
+    """
+    options = get_delivery_settings()
+    content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    disposition = f"inline; filename*=UTF-8''{quote(file_name)}"
+
+    if options['mode'] == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = options['accel_prefix'].rstrip('/') + '/' + quote(name)
+        response['Content-Disposition'] = disposition
+        return response
+
+    if options['mode'] == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        response['Content-Disposition'] = disposition
+        return response
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = get_etag(stat)
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range_header(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response.block_size = options['chunk_size']
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            file_range_iterator(path, start, length, options['chunk_size']),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Content-Disposition'] = disposition
+    return response
@@ -0,0 +1,111 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from media.metadata import extract_metadata
+from media.models import MediaItem
+
+
+METADATA_FIELDS = ['file_name', 'file_size', 'file_type', 'media_type', 'width', 'height']
+
+
+class Command(BaseCommand):
+    help = 'Backfill file size, type and image dimensions for media items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute metadata for every item, not only incomplete ones')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of parallel storage readers (default: 8)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows written per bulk_update (default: 500)')
+        parser.add_argument('--placeholders', action='store_true',
+                            help='Also build low-quality image placeholders (downloads each image)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Extract metadata but do not write it to the database')
+
+    def get_queryset(self, options):
+        queryset = MediaItem.objects.exclude(file='')
+        if not options['all']:
+            incomplete = (
+                Q(file_name='') | Q(file_size=0) | Q(file_type='') |
+                Q(media_type='image', width__isnull=True) |
+                Q(media_type='image', height__isnull=True)
+            )
+            if options['placeholders']:
+                incomplete |= Q(media_type='image', placeholder='')
+            queryset = queryset.filter(incomplete)
+        return queryset.only('pk', 'file', *self.fields).order_by('pk')
+
+    def handle(self, *args, **options):
+        self.placeholders = options['placeholders']
+        self.fields = METADATA_FIELDS + (['placeholder'] if self.placeholders else [])
+        queryset = self.get_queryset(options)
+        total = queryset.count()
+        batch_size = options['batch_size']
+
+        if not total:
+            self.stdout.write('No media items need metadata.')
+            return
+
+        self.stdout.write(f'Backfilling metadata for {total} media items...')
+
+        processed = updated = failed = 0
+        started = time.monotonic()
+        last_pk = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                # Page by primary key so writes never race an open cursor
+                items = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+                if not items:
+                    break
+                last_pk = items[-1].pk
+
+                batch = []
+                for item, metadata in executor.map(self.extract, items):
+                    processed += 1
+                    if metadata is None:
+                        failed += 1
+                    elif self.apply(item, metadata):
+                        batch.append(item)
+
+                updated += self.flush(batch, options)
+                self.report(processed, total, started)
+
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {updated} media items ({failed} could not be read).'
+        ))
+
+    def extract(self, item):
+        """Read metadata for a single item; runs on a worker thread"""
+        try:
+            return item, extract_metadata(item.file.storage, item.file.name, placeholder=self.placeholders)
+        except Exception as e:
+            self.stderr.write(f'Could not read {item.file.name}: {e}')
+            return item, None
+
+    def apply(self, item, metadata):
+        """Copy extracted metadata onto the item, returning True if anything changed"""
+        changed = False
+        for field, value in metadata.items():
+            # Never blank out dimensions or placeholders we failed to build
+            if not value and field in ('width', 'height', 'placeholder'):
+                continue
+            if getattr(item, field) != value:
+                setattr(item, field, value)
+                changed = True
+        return changed
+
+    def flush(self, batch, options):
+        if batch and not options['dry_run']:
+            MediaItem.objects.bulk_update(batch, self.fields, batch_size=options['batch_size'])
+        return len(batch)
+
+    def report(self, processed, total, started):
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(f'  {processed}/{total} ({processed * 100 // total}%) - {rate:.1f} items/s')
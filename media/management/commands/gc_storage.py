@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from media.storage_gc import (
+    collect_referenced_names, delete_objects, get_file_storages, get_storage_label, iter_storage_objects,
+    unwrap_storage,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Find and delete files in storage that no database row references: '
+        'leftovers from deleted media items, CKEditor uploads and Jitsi '
+        'branding files. Files modified within the grace period are kept, so '
+        'uploads that are still in flight are never removed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report orphaned files without deleting them')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Keep files modified within this many hours (default: 24)')
+        parser.add_argument('--prefix', default='',
+                            help='Only consider files under this path, e.g. uploads/')
+        parser.add_argument('--page-size', type=int, default=1000,
+                            help='Number of objects fetched per storage listing request (default: 1000)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of files deleted per batch (default: 1000)')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+
+        storages = get_file_storages()
+        started = time.monotonic()
+        referenced = collect_referenced_names(storages)
+        self.stdout.write(
+            f'Collected {sum(len(names) for names in referenced.values())} referenced names '
+            f'in {time.monotonic() - started:.1f}s'
+        )
+
+        # Local locations of all storages, so that a storage nested inside
+        # another (Jitsi files under MEDIA_ROOT) is only scanned once
+        locations = {}
+        for key, (storage, fields) in storages.items():
+            location = getattr(unwrap_storage(storage), 'location', None)
+            if location and getattr(unwrap_storage(storage), 'bucket', None) is None:
+                locations[key] = location
+
+        totals = {'orphaned': 0, 'deleted': 0, 'failed': 0, 'bytes': 0}
+        for key, (storage, fields) in storages.items():
+            exclude_paths = [location for other, location in locations.items() if other != key]
+            self.collect_storage(storage, referenced[key], cutoff, options, exclude_paths, totals)
+
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        deleted = totals['orphaned'] if self.dry_run else totals['deleted']
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} orphaned files ({totals['bytes'] / (1024 * 1024):.1f} MB), "
+            f"{totals['failed']} failed."
+        ))
+
+    def collect_storage(self, storage, referenced, cutoff, options, exclude_paths, totals):
+        label = get_storage_label(storage)
+        self.stdout.write(f'Scanning {label}...')
+
+        scanned = recent = 0
+        batch = []
+        objects = iter_storage_objects(storage, options['prefix'], options['page_size'], exclude_paths)
+        for name, modified, size in objects:
+            scanned += 1
+            if name in referenced:
+                continue
+            if modified >= cutoff:
+                recent += 1
+                continue
+
+            totals['orphaned'] += 1
+            totals['bytes'] += size or 0
+            if self.verbosity >= 2:
+                self.stdout.write(f'  orphan: {name}')
+            batch.append(name)
+            if len(batch) >= self.batch_size:
+                self.flush(storage, batch, totals)
+                batch = []
+
+        self.flush(storage, batch, totals)
+        self.stdout.write(f'  {scanned} files scanned, {recent} unreferenced but within the grace period')
+
+    def flush(self, storage, batch, totals):
+        if not batch or self.dry_run:
+            return
+        failed = delete_objects(storage, batch)
+        for name in failed:
+            self.stderr.write(f'Could not delete {name}')
+        totals['deleted'] += len(batch) - len(failed)
+        totals['failed'] += len(failed)
@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from media.metadata import inspect_local_file
+from media.models import MediaFolder, MediaItem, folder_slug
+
+# Fields taken from the new file when --update replaces a changed one
+REPLACED_FIELDS = ['file', 'file_size', 'file_type', 'media_type', 'width', 'height', 'placeholder', 'checksum']
+
+
+def inspect_file(path):
+    """Hash and inspect a file in a worker process, returning None if it cannot be read"""
+    try:
+        return inspect_local_file(path)
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Import a directory tree into the media library, mirroring its '
+        'sub-directories as media folders. Files already imported into the '
+        'same folder under the same name are skipped when their contents are '
+        'unchanged, so an interrupted import can simply be run again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to import')
+        parser.add_argument('--folder', type=int,
+                            help='ID of the media folder to import into (default: top level)')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Processes used for hashing and metadata extraction')
+        parser.add_argument('--uploads', type=int, default=8,
+                            help='Number of concurrent uploads to storage (default: 8)')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of rows inserted per bulk_create (default: 200)')
+        parser.add_argument('--include-hidden', action='store_true',
+                            help='Also import dot-files and dot-directories')
+        parser.add_argument('--update', action='store_true',
+                            help='Replace the file of items whose contents changed since they were '
+                                 'imported (by default they are reported and skipped)')
+
+    def handle(self, *args, **options):
+        root = os.path.abspath(options['directory'])
+        if not os.path.isdir(root):
+            raise CommandError(f'{root} is not a directory')
+
+        parent = None
+        if options['folder']:
+            try:
+                parent = MediaFolder.objects.get(pk=options['folder'])
+            except MediaFolder.DoesNotExist:
+                raise CommandError(f"Media folder {options['folder']} does not exist")
+
+        self.file_field = MediaItem._meta.get_field('file')
+        self.batch_size = options['batch_size']
+        self.update = options['update']
+        self.imported = self.updated = self.skipped = self.changed = self.failed = 0
+        # Files saved to storage for the current batch, deleted again if the
+        # batch fails before their rows are written
+        self.uploaded = []
+        self.uploaded_lock = threading.Lock()
+        self.started = time.monotonic()
+
+        files = self.collect_files(root, parent, options['include_hidden'])
+        self.total = len(files)
+        self.stdout.write(f'Found {self.total} files in {root}')
+
+        with ProcessPoolExecutor(max_workers=options['processes']) as processes, \
+                ThreadPoolExecutor(max_workers=options['uploads']) as uploads:
+            for start in range(0, self.total, self.batch_size):
+                self.import_batch(files[start:start + self.batch_size], processes, uploads)
+                self.report()
+
+        if self.changed:
+            self.stdout.write(self.style.WARNING(
+                f'{self.changed} files changed since they were imported and were skipped; '
+                f'run again with --update to replace them.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} files, updated {self.updated}, skipped {self.skipped} '
+            f'already imported, {self.failed} failed.'
+        ))
+
+    def collect_files(self, root, parent, include_hidden):
+        """Walk the directory, creating folders, and return (path, folder) pairs"""
+        folders = {root: parent}
+        files = []
+
+        for dirpath, dirnames, filenames in os.walk(root):
+            if not include_hidden:
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                filenames = [f for f in filenames if not f.startswith('.')]
+            dirnames.sort()
+
+            folder = folders[dirpath]
+            for dirname in dirnames:
+                folders[os.path.join(dirpath, dirname)] = self.get_folder(dirname, folder)
+
+            for filename in sorted(filenames):
+                files.append((os.path.join(dirpath, filename), folder))
+
+        return files
+
+    def get_folder(self, name, parent):
+        folder, created = MediaFolder.objects.get_or_create(
+            parent=parent, slug=folder_slug(name), defaults={'name': name}
+        )
+        if created:
+            self.stdout.write(f'  Created folder {folder.full_name}')
+        return folder
+
+    def import_batch(self, batch, processes, uploads):
+        folders = {path: folder for path, folder in batch}
+        inspected = []
+        for path, result in zip(folders, processes.map(inspect_file, folders)):
+            if result is None:
+                self.failed += 1
+                self.stderr.write(f'Could not read {path}')
+            else:
+                inspected.append(result)
+
+        # Files are identified by folder and original name; the checksum only
+        # tells whether an already imported file has changed since
+        existing = {}
+        for folder in set(folders.values()):
+            names = [m['file_name'] for m in inspected if folders[m['path']] == folder]
+            for item in MediaItem.objects.filter(folder=folder, file_name__in=names):
+                existing.setdefault((folder.pk if folder else None, item.file_name), item)
+
+        pending, replacing = [], {}
+        for metadata in inspected:
+            folder = folders[metadata['path']]
+            key = (folder.pk if folder else None, metadata['file_name'])
+            item = existing.get(key)
+            if item is None:
+                existing[key] = True
+                pending.append((metadata, folder))
+            elif item is True or item.checksum == metadata['checksum']:
+                self.skipped += 1
+            elif self.update:
+                replacing[metadata['path']] = item
+                pending.append((metadata, folder))
+            else:
+                self.changed += 1
+                self.stderr.write(f"Skipping {metadata['path']}: changed since it was imported")
+
+        try:
+            uploaded = [item for item in uploads.map(self.upload, pending) if item is not None]
+            new, updated = [], []
+            for metadata, item in uploaded:
+                if metadata['path'] in replacing:
+                    updated.append(self.replace_file(replacing[metadata['path']], item))
+                else:
+                    new.append(item)
+            with transaction.atomic():
+                MediaItem.objects.bulk_create(new, batch_size=self.batch_size)
+                MediaItem.objects.bulk_update(updated, REPLACED_FIELDS, batch_size=self.batch_size)
+        except BaseException:
+            # Don't leave objects in storage that no row points to
+            for name in self.uploaded:
+                self.file_field.storage.delete(name)
+            raise
+        finally:
+            self.uploaded = []
+        self.imported += len(new)
+        self.updated += len(updated)
+        self.failed += len(pending) - len(uploaded)
+
+    def replace_file(self, item, new_item):
+        """
+        Point an existing item at a newly uploaded file. The old file is kept:
+        pages may still link to it, and gc_storage removes it once nothing does.
+        """
+        for field in REPLACED_FIELDS:
+            setattr(item, field, getattr(new_item, field))
+        return item
+
+    def upload(self, pending):
+        """Save one file to storage and build its (unsaved) MediaItem"""
+        metadata, folder = pending
+        item = MediaItem(
+            title=os.path.splitext(metadata['file_name'])[0],
+            folder=folder,
+            file_name=metadata['file_name'],
+            file_size=metadata['file_size'],
+            file_type=metadata['file_type'],
+            media_type=metadata['media_type'],
+            width=metadata['width'],
+            height=metadata['height'],
+            placeholder=metadata.get('placeholder', ''),
+            checksum=metadata['checksum'],
+        )
+        name = self.file_field.generate_filename(item, metadata['file_name'])
+        try:
+            with open(metadata['path'], 'rb') as f:
+                item.file.name = self.file_field.storage.save(name, File(f), max_length=self.file_field.max_length)
+        except Exception as e:
+            self.stderr.write(f"Could not upload {metadata['path']}: {e}")
+            return None
+        with self.uploaded_lock:
+            self.uploaded.append(item.file.name)
+        return metadata, item
+
+    def report(self):
+        done = self.imported + self.updated + self.skipped + self.changed + self.failed
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'  {done}/{self.total} files - {rate:.1f} files/s')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from media.models import MediaReference
+from media.references import rebuild_references
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the index of which pages, blocks and site settings use which '
+        'media items. The index is kept up to date on save; run this after '
+        'loading fixtures or bulk updates that bypass save().'
+    )
+
+    def handle(self, *args, **options):
+        scanned = rebuild_references()
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} objects, {MediaReference.objects.count()} media references indexed.'
+        ))
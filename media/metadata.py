@@ -0,0 +1,230 @@
+import base64
+import hashlib
+import io
+import os
+
+from django.core.files.images import get_image_dimensions
+
+
+IMAGE_TYPES = ['jpg', 'jpeg', 'png', 'gif', 'svg', 'webp']
+DOCUMENT_TYPES = ['pdf', 'doc', 'docx', 'xls', 'xlsx', 'txt', 'rtf', 'ppt', 'pptx']
+VIDEO_TYPES = ['mp4', 'avi', 'mov', 'wmv', 'webm']
+AUDIO_TYPES = ['mp3', 'wav', 'ogg', 'flac']
+
+# Image formats Pillow cannot parse a header for
+UNSIZED_IMAGE_TYPES = ['svg']
+
+# Never read more than this many bytes when looking for image dimensions
+MAX_HEADER_BYTES = 1024 * 1024
+
+# Longest side, in pixels, of the low-quality placeholder image
+PLACEHOLDER_SIZE = 16
+
+
+def get_file_type(file_name):
+    """Return the lower-case extension of a file name without the dot"""
+    file_ext = os.path.splitext(file_name)[1].lower()
+    return file_ext[1:] if file_ext else ''
+
+
+def get_media_type(file_type):
+    """Determine the media type based on the file extension"""
+    if file_type in IMAGE_TYPES:
+        return 'image'
+    elif file_type in DOCUMENT_TYPES:
+        return 'document'
+    elif file_type in VIDEO_TYPES:
+        return 'video'
+    elif file_type in AUDIO_TYPES:
+        return 'audio'
+    return 'other'
+
+
+class RangedFile:
+    """
+    Minimal read-only file object that fetches a stored file with ranged reads.
+
+    On S3 every read() becomes a GET with a Range header, so only the bytes
+    actually consumed are transferred. Other storages fall back to a regular
+    open/seek/read. Reads stop at ``max_bytes``.
+    """
+    def __init__(self, storage, name, max_bytes=MAX_HEADER_BYTES):
+        self.storage = storage
+        self.name = name
+        self.max_bytes = max_bytes
+        self.position = 0
+        self._file = None
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence != os.SEEK_SET:
+            raise OSError('RangedFile only supports SEEK_SET and SEEK_CUR')
+        self.position = max(offset, 0)
+        return self.position
+
+    def read(self, size=-1):
+        remaining = self.max_bytes - self.position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b''
+
+        data = self._read_range(self.position, self.position + size - 1)
+        self.position += len(data)
+        return data
+
+    def _read_range(self, start, end):
+        bucket = getattr(self.storage, 'bucket', None)
+        if bucket is not None:
+            # S3Boto3Storage: ask for the byte range only
+            from botocore.exceptions import ClientError
+            from storages.utils import clean_name
+
+            key = self.storage._normalize_name(clean_name(self.name))
+            try:
+                response = bucket.Object(key).get(Range=f'bytes={start}-{end}')
+            except ClientError as e:
+                # 416 means we asked for bytes past the end of the object
+                if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                    return b''
+                raise
+            return response['Body'].read()
+
+        if self._file is None:
+            self._file = self.storage.open(self.name, 'rb')
+        self._file.seek(start)
+        return self._file.read(end - start + 1)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_image_size(file_or_storage, name=None):
+    """
+    Return (width, height) of an image by parsing its header only.
+
+    Accepts either an open file object, or a storage and the name of a file
+    in that storage. Returns (None, None) if the size cannot be determined.
+    """
+    if name is None:
+        try:
+            return get_image_dimensions(file_or_storage)
+        except Exception:
+            return (None, None)
+
+    with RangedFile(file_or_storage, name) as f:
+        try:
+            return get_image_dimensions(f)
+        except Exception:
+            return (None, None)
+
+
+def make_placeholder(fileobj):
+    """
+    Build a tiny, blurred JPEG of an image as a data URI.
+
+    The result is a few hundred bytes, small enough to inline in the page so
+    something resembling the image shows before the real file has loaded.
+    Returns '' if the file cannot be decoded.
+    """
+    from PIL import Image, ImageFilter
+
+    try:
+        fileobj.seek(0)
+        with Image.open(fileobj) as img:
+            # Let the JPEG decoder downscale while decoding, which is much
+            # cheaper than decoding the full image and resizing it
+            img.draft('RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+            img = img.convert('RGB')
+            img.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+            img = img.filter(ImageFilter.GaussianBlur(1))
+
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=60, optimize=True)
+    except Exception:
+        return ''
+    finally:
+        fileobj.seek(0)
+
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def compute_checksum(fileobj, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file object, leaving it rewound"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def inspect_local_file(path):
+    """
+    Collect checksum and metadata for a file on local disk.
+
+    Module-level so that it can run in a process pool during bulk imports.
+    """
+    file_name = os.path.basename(path)
+    file_type = get_file_type(file_name)
+    media_type = get_media_type(file_type)
+
+    metadata = {
+        'path': path,
+        'file_name': file_name,
+        'file_type': file_type,
+        'media_type': media_type,
+        'file_size': os.path.getsize(path),
+        'width': None,
+        'height': None,
+    }
+
+    with open(path, 'rb') as f:
+        metadata['checksum'] = compute_checksum(f)
+        if media_type == 'image' and file_type not in UNSIZED_IMAGE_TYPES:
+            metadata['width'], metadata['height'] = read_image_size(f)
+            metadata['placeholder'] = make_placeholder(f)
+
+    return metadata
+
+
+def extract_metadata(storage, name, placeholder=False):
+    """
+    Collect the metadata MediaItem stores for a file already in storage.
+
+    Only the image header is read; the size comes from a storage stat call.
+    With ``placeholder=True`` images are also downloaded and decoded to build
+    their low-quality placeholder.
+    """
+    file_name = os.path.basename(name)
+    file_type = get_file_type(file_name)
+    media_type = get_media_type(file_type)
+
+    metadata = {
+        'file_name': file_name,
+        'file_type': file_type,
+        'media_type': media_type,
+        'file_size': storage.size(name),
+        'width': None,
+        'height': None,
+    }
+
+    if media_type == 'image' and file_type not in UNSIZED_IMAGE_TYPES:
+        metadata['width'], metadata['height'] = read_image_size(storage, name)
+        if placeholder:
+            with storage.open(name, 'rb') as f:
+                metadata['placeholder'] = make_placeholder(f)
+
+    return metadata
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.2 on 2026-10-19 01:38
+
+from django.db import migrations, models
+
+
+def populate_tree_fields(apps, schema_editor):
+    """Fill in path, full_name and depth for existing folders, top-down"""
+    MediaFolder = apps.get_model('media', 'MediaFolder')
+    level = list(MediaFolder.objects.filter(parent__isnull=True))
+    for folder in level:
+        folder.path = folder.slug
+        folder.full_name = folder.name
+        folder.depth = 0
+
+    while level:
+        MediaFolder.objects.bulk_update(level, ['path', 'full_name', 'depth'])
+        parents = {folder.pk: folder for folder in level}
+        level = list(MediaFolder.objects.filter(parent__in=list(parents)))
+        for folder in level:
+            parent = parents[folder.parent_id]
+            folder.path = f"{parent.path}/{folder.slug}"
+            folder.full_name = f"{parent.full_name}/{folder.name}"
+            folder.depth = parent.depth + 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediafolder',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Depth'),
+        ),
+        migrations.AddField(
+            model_name='mediafolder',
+            name='full_name',
+            field=models.CharField(default='', editable=False, max_length=1000, verbose_name='Full Name'),
+        ),
+        migrations.AddField(
+            model_name='mediafolder',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=1000, verbose_name='Path'),
+        ),
+        migrations.RunPython(populate_tree_fields, migrations.RunPython.noop),
+    ]
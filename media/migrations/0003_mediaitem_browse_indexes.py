@@ -0,0 +1,31 @@
+# Generated by Django 5.0.2 on 2026-10-19 01:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0002_mediafolder_materialized_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='mediaitem',
+            options={'ordering': ['-uploaded_at', '-id'], 'verbose_name': 'Media Item', 'verbose_name_plural': 'Media Items'},
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='media_item_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['media_type', '-uploaded_at', '-id'], name='media_item_type_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['folder', '-uploaded_at', '-id'], name='media_item_folder_uploaded_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0004_mediaitem_uuid_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='SHA-256 of the file contents', max_length=64, verbose_name='Checksum'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-19 01:44
+
+import media.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0005_mediaitem_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False, help_text='Tiny blurred preview of the image, as a data URI', verbose_name='Placeholder'),
+        ),
+        migrations.AlterField(
+            model_name='mediaitem',
+            name='file',
+            field=models.FileField(db_index=True, upload_to=media.models.get_upload_path, verbose_name='File'),
+        ),
+    ]
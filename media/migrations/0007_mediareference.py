@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-19 01:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('media', '0006_mediaitem_placeholder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Object ID')),
+                ('field', models.CharField(max_length=100, verbose_name='Field')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Content Type')),
+                ('media_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='references', to='media.mediaitem', verbose_name='Media Item')),
+            ],
+            options={
+                'verbose_name': 'Media Reference',
+                'verbose_name_plural': 'Media References',
+                'indexes': [models.Index(fields=['content_type', 'object_id'], name='media_reference_object_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mediareference',
+            constraint=models.UniqueConstraint(fields=('media_item', 'content_type', 'object_id', 'field'), name='media_reference_unique'),
+        ),
+    ]
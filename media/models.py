@@ -1,10 +1,31 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
+from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.urls import reverse
 from django.utils.text import slugify
+from django.conf import settings
+from urllib.parse import unquote, urlparse
+import hashlib
 import os
 import uuid
 
+from .metadata import (
+    UNSIZED_IMAGE_TYPES, compute_checksum, get_file_type, get_media_type, make_placeholder,
+    read_image_size,
+)
+
+
+def folder_slug(name):
+    """
+    A slug for a folder name. Names with nothing slugify() keeps (e.g. only
+    non-ASCII characters) get a stable slug derived from the name instead.
+    """
+    return slugify(name) or f"folder-{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+
 
 class MediaFolder(models.Model):
     """
@@ -16,6 +37,12 @@ class MediaFolder(models.Model):
                              on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
     
+    # Materialized tree position, maintained on save so that paths and
+    # subtree lookups never have to walk the parent chain
+    path = models.CharField(_('Path'), max_length=1000, editable=False, db_index=True, default='')
+    full_name = models.CharField(_('Full Name'), max_length=1000, editable=False, default='')
+    depth = models.PositiveIntegerField(_('Depth'), editable=False, default=0)
+    
     class Meta:
         verbose_name = _('Media Folder')
         verbose_name_plural = _('Media Folders')
@@ -23,20 +50,81 @@ class MediaFolder(models.Model):
         ordering = ['name']
     
     def __str__(self):
-        if self.parent:
-            return f"{self.parent}/{self.name}"
-        return self.name
+        return self.full_name or self.name
+    
+    def clean(self):
+        # A folder cannot be moved inside itself or one of its descendants
+        if self.pk and self.parent_id:
+            stored_path = MediaFolder.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            if self.parent_id == self.pk or self.parent.path.startswith(f"{stored_path}/"):
+                raise ValidationError({'parent': _('A folder cannot be moved into one of its own subfolders.')})
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+            self.slug = folder_slug(self.name)
+        
+        with transaction.atomic():
+            # Compare against the stored row; this instance's values may be stale
+            # if an ancestor was renamed or moved after it was loaded
+            stored = None
+            if self.pk:
+                stored = (MediaFolder.objects.select_for_update().filter(pk=self.pk)
+                          .values_list('path', 'full_name', 'depth').first())
+            self.update_tree_fields()
+            
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'path', 'full_name', 'depth'}
+            super().save(*args, **kwargs)
+            
+            # Renaming or moving a folder changes the path of every folder below it
+            if stored and stored[:2] != (self.path, self.full_name):
+                self.update_descendants(*stored)
+    
+    def update_tree_fields(self):
+        """
+        Recompute path, full_name and depth from the parent's stored row,
+        locked so a concurrent rename of the parent can't leave them stale
+        (self.parent may have been loaded before such a rename)
+        """
+        parent = None
+        if self.parent_id:
+            parent = (MediaFolder.objects.select_for_update().filter(pk=self.parent_id)
+                      .values_list('path', 'full_name', 'depth').first())
+        if parent:
+            parent_path, parent_full_name, parent_depth = parent
+            self.path = f"{parent_path}/{self.slug}"
+            self.full_name = f"{parent_full_name}/{self.name}"
+            self.depth = parent_depth + 1
+        else:
+            self.path = self.slug
+            self.full_name = self.name
+            self.depth = 0
+    
+    def update_descendants(self, old_path, old_full_name, old_depth):
+        """Rewrite the stored paths of all descendants in one bulk update"""
+        descendants = list(MediaFolder.objects.filter(path__startswith=f"{old_path}/"))
+        depth_change = self.depth - old_depth
+        for folder in descendants:
+            folder.path = self.path + folder.path[len(old_path):]
+            folder.full_name = self.full_name + folder.full_name[len(old_full_name):]
+            folder.depth += depth_change
+        MediaFolder.objects.bulk_update(descendants, ['path', 'full_name', 'depth'], batch_size=500)
     
     def get_path(self):
         """Get the full path of the folder"""
-        if self.parent:
-            return f"{self.parent.get_path()}/{self.slug}"
-        return self.slug
+        return self.path
+    
+    def is_descendant_of(self, folder):
+        """Check if this folder is somewhere below the given folder"""
+        return self.path.startswith(f"{folder.path}/")
+    
+    def get_descendants(self, include_self=False):
+        """Get all folders below this one"""
+        lookup = Q(path__startswith=f"{self.path}/")
+        if include_self:
+            lookup |= Q(pk=self.pk)
+        return MediaFolder.objects.filter(lookup)
     
     def get_absolute_url(self):
         """Get the admin URL for this folder"""
@@ -45,6 +133,10 @@ class MediaFolder(models.Model):
     def get_media_items(self):
         """Get all media items in this folder"""
         return self.media_items.all()
+    
+    def get_tree_media_items(self):
+        """Get all media items in this folder and all of its subfolders"""
+        return MediaItem.objects.in_folder_tree(self)
 
 
 def get_upload_path(instance, filename):
@@ -54,16 +146,65 @@ def get_upload_path(instance, filename):
     return os.path.join('uploads', filename)
 
 
+def get_file_name_from_url(url):
+    """
+    Turn a media URL (local /media/... or a storage URL) back into a stored file name.
+
+    Returns None for URLs that don't point into the media library.
+    """
+    if not url:
+        return None
+    path = unquote(urlparse(url).path)
+    for prefix in (urlparse(settings.MEDIA_URL).path, '/media/'):
+        if prefix and path.startswith(prefix):
+            return path[len(prefix):]
+    return None
+
+
+class MediaItemQuerySet(models.QuerySet):
+    def in_folder_tree(self, folder):
+        """Items in the given folder or any of its subfolders, in a single query"""
+        return self.filter(
+            Q(folder__path=folder.path) | Q(folder__path__startswith=f"{folder.path}/")
+        )
+
+    def for_url(self, url):
+        """Items whose file is served at the given URL"""
+        name = get_file_name_from_url(url)
+        if name is None:
+            return self.none()
+        return self.filter(file=name)
+
+    def placeholders_for_urls(self, urls):
+        """
+        {url: placeholder data URI} for many media URLs in one query; URLs
+        without an item or a placeholder map to ''
+        """
+        names = {}
+        for url in urls:
+            name = get_file_name_from_url(url)
+            if name is not None:
+                names.setdefault(name, []).append(url)
+        placeholders = dict.fromkeys(urls, '')
+        if names:
+            for name, placeholder in self.filter(file__in=names).exclude(placeholder='').values_list('file', 'placeholder'):
+                for url in names.get(name, ()):
+                    placeholders[url] = placeholder
+        return placeholders
+
+
 class MediaItem(models.Model):
     """
     Media items (images, documents, etc.) with metadata
     """
     # Basic information
     title = models.CharField(_('Title'), max_length=255)
-    file = models.FileField(_('File'), upload_to=get_upload_path)
+    file = models.FileField(_('File'), upload_to=get_upload_path, db_index=True)
     file_name = models.CharField(_('File Name'), max_length=255, editable=False)
     file_size = models.BigIntegerField(_('File Size'), editable=False, default=0)
     file_type = models.CharField(_('File Type'), max_length=100, editable=False)
+    checksum = models.CharField(_('Checksum'), max_length=64, blank=True, editable=False, db_index=True,
+                              help_text=_('SHA-256 of the file contents'))
     
     # Type categorization
     MEDIA_TYPE_CHOICES = (
@@ -82,6 +223,8 @@ class MediaItem(models.Model):
     # Image specific fields
     width = models.IntegerField(_('Width'), null=True, blank=True)
     height = models.IntegerField(_('Height'), null=True, blank=True)
+    placeholder = models.TextField(_('Placeholder'), blank=True, editable=False,
+                                 help_text=_('Tiny blurred preview of the image, as a data URI'))
     
     # Metadata
     alt_text = models.CharField(_('Alt Text'), max_length=255, blank=True,
@@ -94,12 +237,21 @@ class MediaItem(models.Model):
     
     # Additional attributes
     is_featured = models.BooleanField(_('Featured'), default=False)
-    uuid = models.UUIDField(_('UUID'), default=uuid.uuid4, editable=False)
+    uuid = models.UUIDField(_('UUID'), default=uuid.uuid4, editable=False, db_index=True)
+    
+    objects = MediaItemQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('Media Item')
         verbose_name_plural = _('Media Items')
-        ordering = ['-uploaded_at']
+        ordering = ['-uploaded_at', '-id']
+        # Match the (uploaded_at, id) keyset used by the browse API, alone
+        # and behind each of its equality filters
+        indexes = [
+            models.Index(fields=['-uploaded_at', '-id'], name='media_item_uploaded_idx'),
+            models.Index(fields=['media_type', '-uploaded_at', '-id'], name='media_item_type_uploaded_idx'),
+            models.Index(fields=['folder', '-uploaded_at', '-id'], name='media_item_folder_uploaded_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -116,33 +268,24 @@ class MediaItem(models.Model):
             except (AttributeError, FileNotFoundError):
                 pass
             
+            # Checksum, only for fresh uploads that are still in memory or a temp file
+            if not self.file._committed:
+                self.checksum = compute_checksum(self.file.file)
+            
             # File type
-            file_ext = os.path.splitext(self.file_name)[1].lower()
-            self.file_type = file_ext[1:] if file_ext else ''
+            self.file_type = get_file_type(self.file_name)
             
             # Determine media type based on file extension
-            image_types = ['jpg', 'jpeg', 'png', 'gif', 'svg', 'webp']
-            document_types = ['pdf', 'doc', 'docx', 'xls', 'xlsx', 'txt', 'rtf', 'ppt', 'pptx']
-            video_types = ['mp4', 'avi', 'mov', 'wmv', 'webm']
-            audio_types = ['mp3', 'wav', 'ogg', 'flac']
+            self.media_type = get_media_type(self.file_type)
             
-            if self.file_type in image_types:
-                self.media_type = 'image'
-                # Get image dimensions
-                try:
-                    from PIL import Image
-                    img = Image.open(self.file)
-                    self.width, self.height = img.size
-                except Exception:
-                    pass
-            elif self.file_type in document_types:
-                self.media_type = 'document'
-            elif self.file_type in video_types:
-                self.media_type = 'video'
-            elif self.file_type in audio_types:
-                self.media_type = 'audio'
-            else:
-                self.media_type = 'other'
+            if self.media_type == 'image' and self.file_type not in UNSIZED_IMAGE_TYPES:
+                # Get image dimensions from the header only, so a file that is
+                # already in remote storage is not downloaded in full
+                if self.file._committed:
+                    self.width, self.height = read_image_size(self.file.storage, self.file.name)
+                else:
+                    self.width, self.height = read_image_size(self.file.file)
+                    self.placeholder = make_placeholder(self.file.file)
         
         # If title is not provided, use filename
         if not self.title:
@@ -154,6 +297,10 @@ class MediaItem(models.Model):
         """Return the URL to the media item"""
         return self.file.url if self.file else ''
     
+    def get_delivery_url(self):
+        """Return the URL of the range-capable delivery view, for audio and video players"""
+        return reverse('media:serve_media', kwargs={'uuid': self.uuid})
+    
     def get_file_size_display(self):
         """Return human-readable file size"""
         if self.file_size < 1024:
@@ -177,4 +324,31 @@ class MediaItem(models.Model):
             return self.file.url
         
         # Return appropriate icon based on media type
-        return f"/static/img/icons/{self.media_type}.png"
\ No newline at end of file
+        return f"/static/img/icons/{self.media_type}.png"
+
+
+class MediaReference(models.Model):
+    """
+    Records that a field of some object (a page, block, site settings...)
+    refers to a media item. Maintained by media.signals on save and delete.
+    """
+    media_item = models.ForeignKey(MediaItem, verbose_name=_('Media Item'), related_name='references',
+                                 on_delete=models.CASCADE)
+    content_type = models.ForeignKey(ContentType, verbose_name=_('Content Type'), on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField(_('Object ID'))
+    content_object = GenericForeignKey('content_type', 'object_id')
+    field = models.CharField(_('Field'), max_length=100)
+
+    class Meta:
+        verbose_name = _('Media Reference')
+        verbose_name_plural = _('Media References')
+        constraints = [
+            models.UniqueConstraint(fields=['media_item', 'content_type', 'object_id', 'field'],
+                                    name='media_reference_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'], name='media_reference_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type.name} #{self.object_id} ({self.field})"
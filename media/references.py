@@ -0,0 +1,163 @@
+import re
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+
+from .models import MediaItem, MediaReference, get_file_name_from_url
+
+
+# Model label -> fields scanned for references to media library files
+TRACKED_FIELDS = {
+    'pagebuilder.Page': ['og_image', 'page_settings_json'],
+    'pagebuilder.Block': ['html_content', 'wysiwyg_content', 'settings'],
+    'portfolio.SiteSettings': ['site_logo', 'site_favicon', 'default_og_image', 'footer_content'],
+}
+
+UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE)
+
+# Anything that looks like a URL or a root-relative path, up to the next
+# quote, bracket or whitespace (covers src/href attributes, CSS url() and
+# plain URLs in JSON settings)
+URL_RE = re.compile(r'(?:https?:)?//[^\s"\'<>()]+|/[^\s"\'<>()]+')
+
+
+def get_tracked_models():
+    """Return [(model, fields)] for the tracked models that are installed"""
+    tracked = []
+    for label, fields in TRACKED_FIELDS.items():
+        try:
+            tracked.append((apps.get_model(label), fields))
+        except LookupError:
+            continue
+    return tracked
+
+
+def find_references(value, names=None, uuids=None):
+    """
+    Collect stored file names and media UUIDs mentioned in a field value.
+
+    Handles files, HTML or plain text, and JSON (dicts and lists are walked
+    recursively). Returns the (names, uuids) sets.
+    """
+    names = set() if names is None else names
+    uuids = set() if uuids is None else uuids
+
+    if isinstance(value, FieldFile):
+        if value:
+            names.add(value.name)
+    elif isinstance(value, dict):
+        for item in value.values():
+            find_references(item, names, uuids)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            find_references(item, names, uuids)
+    elif isinstance(value, str) and value:
+        for url in URL_RE.findall(value):
+            name = get_file_name_from_url(url)
+            if name:
+                names.add(name)
+        uuids.update(match.lower() for match in UUID_RE.findall(value))
+
+    return names, uuids
+
+
+def get_referenced_items(instance, fields):
+    """Return {(media item id, field)} for the media items an object refers to"""
+    by_field = {field: find_references(getattr(instance, field, None)) for field in fields}
+
+    all_names = set().union(*(names for names, uuids in by_field.values()))
+    all_uuids = set().union(*(uuids for names, uuids in by_field.values()))
+    if not all_names and not all_uuids:
+        return set()
+
+    by_name = dict(MediaItem.objects.filter(file__in=all_names).values_list('file', 'pk')) if all_names else {}
+    by_uuid = {
+        str(uuid): pk for uuid, pk in MediaItem.objects.filter(uuid__in=all_uuids).values_list('uuid', 'pk')
+    } if all_uuids else {}
+
+    found = set()
+    for field, (names, uuids) in by_field.items():
+        found.update((by_name[name], field) for name in names if name in by_name)
+        found.update((by_uuid[uuid], field) for uuid in uuids if uuid in by_uuid)
+    return found
+
+
+def update_references(instance, fields):
+    """Bring the reference index for one object in line with its current content"""
+    content_type = ContentType.objects.get_for_model(instance)
+    wanted = get_referenced_items(instance, fields)
+
+    existing = {
+        (media_item_id, field): pk
+        for pk, media_item_id, field in MediaReference.objects.filter(
+            content_type=content_type, object_id=instance.pk
+        ).values_list('pk', 'media_item_id', 'field')
+    }
+
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    new = [
+        MediaReference(media_item_id=media_item_id, field=field,
+                       content_type=content_type, object_id=instance.pk)
+        for media_item_id, field in wanted if (media_item_id, field) not in existing
+    ]
+
+    if stale or new:
+        with transaction.atomic():
+            if stale:
+                MediaReference.objects.filter(pk__in=stale).delete()
+            if new:
+                MediaReference.objects.bulk_create(new)
+
+
+def delete_references(instance):
+    MediaReference.objects.filter(
+        content_type=ContentType.objects.get_for_model(instance), object_id=instance.pk
+    ).delete()
+
+
+def rebuild_references():
+    """Re-index every tracked object, returning the number of objects scanned"""
+    scanned = 0
+    for model, fields in get_tracked_models():
+        for instance in model.objects.only('pk', *fields).iterator():
+            update_references(instance, fields)
+            scanned += 1
+    return scanned
+
+
+def get_pages_using(media_items):
+    """
+    Return the pages that show any of the given media items.
+
+    Accepts a MediaItem, a list of them or a queryset. Pages are found through
+    their own fields and through their blocks. Use is_used_site_wide() to
+    check for files that appear on every page (logo, footer, ...).
+    """
+    from pagebuilder.models import Block, Page
+
+    if isinstance(media_items, MediaItem):
+        media_items = [media_items]
+    references = MediaReference.objects.filter(media_item__in=media_items)
+
+    page_ids = set(references.filter(
+        content_type=ContentType.objects.get_for_model(Page)
+    ).values_list('object_id', flat=True))
+    block_ids = references.filter(
+        content_type=ContentType.objects.get_for_model(Block)
+    ).values_list('object_id', flat=True)
+    page_ids.update(Block.objects.filter(pk__in=block_ids).values_list('page_id', flat=True))
+
+    return Page.objects.filter(pk__in=page_ids)
+
+
+def is_used_site_wide(media_items):
+    """True if any of the media items is used by the site settings"""
+    from portfolio.models import SiteSettings
+
+    if isinstance(media_items, MediaItem):
+        media_items = [media_items]
+    return MediaReference.objects.filter(
+        media_item__in=media_items, content_type=ContentType.objects.get_for_model(SiteSettings)
+    ).exists()
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+
+from .references import delete_references, get_tracked_models, update_references
+
+
+def make_save_handler(fields):
+    def handler(sender, instance, raw=False, **kwargs):
+        # Fixtures are loaded raw; run rebuild_media_references afterwards
+        if not raw:
+            update_references(instance, fields)
+    return handler
+
+
+def handle_delete(sender, instance, **kwargs):
+    delete_references(instance)
+
+
+def connect_signals():
+    """Keep the media reference index up to date for every tracked model"""
+    for model, fields in get_tracked_models():
+        post_save.connect(make_save_handler(fields), sender=model, weak=False,
+                          dispatch_uid=f'media_references_save_{model._meta.label_lower}')
+        post_delete.connect(handle_delete, sender=model,
+                            dispatch_uid=f'media_references_delete_{model._meta.label_lower}')
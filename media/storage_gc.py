@@ -0,0 +1,235 @@
+import bisect
+import hashlib
+import os
+import posixpath
+from array import array
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models
+
+from .references import find_references
+
+
+# S3 DeleteObjects accepts at most 1000 keys per request
+S3_DELETE_BATCH_SIZE = 1000
+
+
+def hash_name(name):
+    """64-bit hash of a stored file name"""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class NameSet:
+    """
+    Compact set of file names, kept as a sorted array of 64-bit hashes.
+
+    Costs 8 bytes per name instead of a full Python string. A hash collision
+    can only make an orphan look referenced, never the other way round, so
+    it is safe for deciding what to keep.
+    """
+    def __init__(self):
+        self._hashes = array('Q')
+        self._sorted = True
+
+    def add(self, name):
+        self._hashes.append(hash_name(name))
+        self._sorted = False
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, name):
+        if not self._sorted:
+            self._hashes = array('Q', sorted(set(self._hashes)))
+            self._sorted = True
+        value = hash_name(name)
+        index = bisect.bisect_left(self._hashes, value)
+        return index < len(self._hashes) and self._hashes[index] == value
+
+
+def unwrap_storage(storage):
+    """Return the storage that actually holds the files (the remote of a CachedMediaStorage)"""
+    return getattr(storage, 'remote', storage)
+
+
+def get_storage_label(storage):
+    storage = unwrap_storage(storage)
+    location = getattr(storage, 'bucket_name', None) or getattr(storage, 'location', '')
+    return f"{storage.__class__.__name__}({location})"
+
+
+def get_file_storages():
+    """
+    Return {id(storage): (storage, [(model, field name)])} for every file field.
+
+    The default storage is always included, since CKEditor uploads go there
+    without any model field pointing at them.
+    """
+    storages = {id(default_storage): (default_storage, [])}
+    for model in apps.get_models():
+        if model._meta.proxy:
+            continue
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                storages.setdefault(id(field.storage), (field.storage, []))[1].append((model, field.name))
+    return storages
+
+
+def get_url_prefix(storage):
+    """
+    Return the part of a MEDIA_URL-relative name that maps to this storage's
+    root, e.g. 'jitsi/' for the Jitsi storage, or None if its files are not
+    served under MEDIA_URL.
+    """
+    if storage is default_storage:
+        return ''
+    base_url = getattr(unwrap_storage(storage), 'base_url', None)
+    if base_url and base_url.startswith(settings.MEDIA_URL):
+        return base_url[len(settings.MEDIA_URL):]
+    return None
+
+
+def get_content_fields():
+    """
+    Return [(model, [field names])] of text-like and JSON fields in the
+    project's own apps.
+
+    CharField subclasses are included too, since URL fields (e.g.
+    MenuItem.url) can link straight to an uploaded file.
+    """
+    base_dir = str(settings.BASE_DIR)
+    content_fields = []
+    for app_config in apps.get_app_configs():
+        if not app_config.path.startswith(base_dir):
+            continue
+        for model in app_config.get_models():
+            if model._meta.proxy:
+                continue
+            fields = [
+                field.name for field in model._meta.concrete_fields
+                if isinstance(field, (models.CharField, models.TextField, models.JSONField))
+            ]
+            if fields:
+                content_fields.append((model, fields))
+    return content_fields
+
+
+def collect_referenced_names(storages, chunk_size=2000):
+    """
+    Build a NameSet per storage of every file name that is still in use.
+
+    Includes the values of all file fields, plus media URLs found in the
+    text, char and JSON content of the project's models (rich text uploads are
+    only referenced from there). CKEditor thumbnails of referenced images
+    are kept as well.
+    """
+    referenced = {key: NameSet() for key in storages}
+
+    for key, (storage, fields) in storages.items():
+        for model, field_name in fields:
+            values = (
+                model._default_manager.exclude(**{f'{field_name}__isnull': True})
+                .exclude(**{field_name: ''})
+                .values_list(field_name, flat=True)
+            )
+            for name in values.iterator(chunk_size=chunk_size):
+                referenced[key].add(name)
+
+    prefixes = {
+        key: prefix for key, (storage, fields) in storages.items()
+        if (prefix := get_url_prefix(storage)) is not None
+    }
+    for model, fields in get_content_fields():
+        for row in model._default_manager.values_list(*fields).iterator(chunk_size=chunk_size):
+            names, uuids = find_references(list(row))
+            for name in names:
+                thumbnail = '{0}_thumb{1}'.format(*os.path.splitext(name))
+                for key, prefix in prefixes.items():
+                    if name.startswith(prefix):
+                        referenced[key].add(name[len(prefix):])
+                        referenced[key].add(thumbnail[len(prefix):])
+
+    return referenced
+
+
+def iter_storage_objects(storage, prefix='', page_size=1000, exclude_paths=()):
+    """
+    Yield (name, modified time, size) for every file in a storage.
+
+    S3 buckets are listed page by page with ListObjectsV2, so the listing is
+    streamed rather than loaded at once. Other storages are walked with
+    listdir(); directories in ``exclude_paths`` (other storages nested inside
+    this one) are skipped.
+    """
+    storage = unwrap_storage(storage)
+    bucket = getattr(storage, 'bucket', None)
+
+    if bucket is not None:
+        location = storage.location.strip('/')
+        key_prefix = posixpath.join(location, prefix) if location else prefix
+        for obj in bucket.objects.filter(Prefix=key_prefix).page_size(page_size):
+            if obj.key.endswith('/'):
+                continue
+            name = obj.key[len(location) + 1:] if location else obj.key
+            yield name, obj.last_modified, obj.size
+        return
+
+    exclude_paths = {os.path.abspath(path) for path in exclude_paths}
+
+    def walk(path):
+        try:
+            dirs, files = storage.listdir(path)
+        except FileNotFoundError:
+            return
+        for file_name in sorted(files):
+            name = posixpath.join(path, file_name) if path else file_name
+            yield name, storage.get_modified_time(name), storage.size(name)
+        for dir_name in sorted(dirs):
+            sub_path = posixpath.join(path, dir_name) if path else dir_name
+            try:
+                if os.path.abspath(storage.path(sub_path)) in exclude_paths:
+                    continue
+            except NotImplementedError:
+                pass
+            yield from walk(sub_path)
+
+    yield from walk(prefix.strip('/'))
+
+
+def delete_objects(storage, names):
+    """
+    Delete files from a storage, returning the names that could not be deleted.
+
+    On S3 up to 1000 files are removed per DeleteObjects request. Local cache
+    copies and memoized URLs are dropped too.
+    """
+    remote = unwrap_storage(storage)
+    bucket = getattr(remote, 'bucket', None)
+    failed = []
+
+    if bucket is not None:
+        location = remote.location.strip('/')
+        for start in range(0, len(names), S3_DELETE_BATCH_SIZE):
+            chunk = names[start:start + S3_DELETE_BATCH_SIZE]
+            keys = {posixpath.join(location, name) if location else name: name for name in chunk}
+            response = bucket.delete_objects(Delete={
+                'Objects': [{'Key': key} for key in keys],
+                'Quiet': True,
+            })
+            failed.extend(keys.get(error['Key'], error['Key']) for error in response.get('Errors', []))
+    else:
+        for name in names:
+            try:
+                remote.delete(name)
+            except OSError:
+                failed.append(name)
+
+    for name in names:
+        if hasattr(storage, 'uncache'):
+            storage.uncache(name)
+        if hasattr(remote, 'forget_url'):
+            remote.forget_url(name)
+
+    return failed
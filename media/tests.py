@@ -1,3 +1,69 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from portfolio.models import MenuItem
+
+from .models import MediaItem
+from .storage_gc import get_content_fields
+from .templatetags.media_tags import media_urls
+
+
+class StorageGCTests(TestCase):
+    """gc_storage against a FileSystemStorage standing in for the default storage"""
+
+    def setUp(self):
+        # The jitsi app has no migrations, so its tables are missing here
+        content_fields = [(model, fields) for model, fields in get_content_fields()
+                          if model._meta.app_label != 'jitsi']
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.storage = FileSystemStorage(location=self.tmp, base_url='/media/')
+        for patcher in (
+            mock.patch('media.storage_gc.default_storage', self.storage),
+            mock.patch('media.management.commands.gc_storage.get_file_storages',
+                       return_value={id(self.storage): (self.storage, [])}),
+            mock.patch('media.storage_gc.get_content_fields', return_value=content_fields),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_char_fields_are_scanned(self):
+        self.assertIn('url', dict(get_content_fields())[MenuItem])
+
+    def gc(self):
+        call_command('gc_storage', grace_hours=0, stdout=StringIO())
+
+    def test_file_linked_from_a_char_field_is_kept(self):
+        self.storage.save('docs/guide.pdf', ContentFile(b'%PDF'))
+        self.storage.save('docs/orphan.pdf', ContentFile(b'%PDF'))
+        MenuItem.objects.create(title='Guide', url='/media/docs/guide.pdf')
+        self.gc()
+        self.assertTrue(self.storage.exists('docs/guide.pdf'))
+        self.assertFalse(self.storage.exists('docs/orphan.pdf'))
+
+    def test_dry_run_deletes_nothing(self):
+        self.storage.save('docs/orphan.pdf', ContentFile(b'%PDF'))
+        call_command('gc_storage', grace_hours=0, dry_run=True, stdout=StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, 'docs', 'orphan.pdf')))
+
+
+class MediaUrlsTagTests(SimpleTestCase):
+    def test_items_sharing_a_file_all_get_its_url(self):
+        items = [MediaItem(pk=pk, file=name) for pk, name in
+                 ((1, 'uploads/shared.jpg'), (2, 'uploads/shared.jpg'), (3, 'uploads/other.jpg'), (4, ''))]
+        with mock.patch('media.templatetags.media_tags.bulk_urls',
+                        side_effect=lambda files: {f.name: f'/media/{f.name}' for f in files}) as bulk_urls:
+            urls = media_urls(items)
+        self.assertEqual(urls, {
+            1: '/media/uploads/shared.jpg', 2: '/media/uploads/shared.jpg', 3: '/media/uploads/other.jpg',
+        })
+        # Each file is resolved once
+        self.assertEqual([f.name for f in bulk_urls.call_args.args[0]], ['uploads/shared.jpg', 'uploads/other.jpg'])
@@ -11,5 +11,10 @@ urlpatterns = [
     # path('upload/', views.upload_media, name='upload_media'),
     # path('folder/create/', views.create_folder, name='create_folder'),
     
-    # For now, you can leave it empty if you don't have views yet
+    # File delivery with byte-range support
+    path('file/<uuid:uuid>/', views.serve_media, name='serve_media'),
+    
+    # JSON API
+    path('api/browse/', views.browse_media, name='browse_media'),
+    path('api/<uuid:uuid>/usage/', views.media_usage, name='media_usage'),
 ]
\ No newline at end of file
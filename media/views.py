@@ -1,3 +1,176 @@
-from django.shortcuts import render
+import base64
+import json
 
-# Create your views here.
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_safe
+
+from core.storage_backends import bulk_urls
+
+from .delivery import serve_file
+from .models import MediaFolder, MediaItem
+from .references import get_pages_using, is_used_site_wide
+
+
+BROWSE_PAGE_SIZE = 50
+BROWSE_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(item):
+    """Encode the (uploaded_at, id) position of an item as an opaque cursor"""
+    position = json.dumps([item.uploaded_at.isoformat(), item.pk])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into (uploaded_at, id), raising ValueError if invalid"""
+    try:
+        uploaded_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        uploaded_at = parse_datetime(uploaded_at)
+        pk = int(pk)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if uploaded_at is None:
+        raise ValueError('Invalid cursor')
+    return uploaded_at, pk
+
+
+def serialize_media_item(item, urls=None):
+    """
+    Return the JSON representation of a media item used by the browse API.
+
+    ``urls`` is an optional {file name: url} dict from bulk_urls(), used to
+    avoid generating the URL for each item separately.
+    """
+    url = urls.get(item.file.name) if urls else None
+    if url is None:
+        url = item.get_absolute_url()
+    return {
+        'id': item.pk,
+        'uuid': str(item.uuid),
+        'title': item.title,
+        'media_type': item.media_type,
+        'file_type': item.file_type,
+        'file_size': item.file_size,
+        'width': item.width,
+        'height': item.height,
+        'placeholder': item.placeholder,
+        'alt_text': item.alt_text,
+        'url': url,
+        'thumbnail_url': url if item.is_image() else item.get_thumbnail_url(),
+        'folder': {'id': item.folder.pk, 'path': item.folder.path} if item.folder else None,
+        'uploaded_at': item.uploaded_at.isoformat(),
+    }
+
+
+@staff_member_required
+def browse_media(request):
+    """
+    JSON listing of the media library, newest first.
+
+    Uses keyset pagination on (uploaded_at, id): each page returns a
+    ``next_cursor`` to pass back as ``?cursor=``, so every page costs the
+    same regardless of how deep into the library it is.
+
+    Filters: ``folder`` (id, includes subfolders unless ``recursive=0``),
+    ``media_type`` and ``q`` (searches title, file name and alt text).
+    """
+    try:
+        limit = min(int(request.GET.get('limit', BROWSE_PAGE_SIZE)), BROWSE_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+
+    items = MediaItem.objects.select_related('folder').order_by('-uploaded_at', '-id')
+
+    folder_id = request.GET.get('folder')
+    if folder_id:
+        try:
+            folder = MediaFolder.objects.get(pk=folder_id)
+        except (MediaFolder.DoesNotExist, ValueError):
+            return JsonResponse({'error': 'Folder not found'}, status=404)
+        if request.GET.get('recursive', '1') == '0':
+            items = items.filter(folder=folder)
+        else:
+            items = items.in_folder_tree(folder)
+
+    media_type = request.GET.get('media_type')
+    if media_type:
+        items = items.filter(media_type=media_type)
+
+    search = request.GET.get('q', '').strip()
+    if search:
+        items = items.filter(
+            Q(title__icontains=search) | Q(file_name__icontains=search) | Q(alt_text__icontains=search)
+        )
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            uploaded_at, pk = decode_cursor(cursor)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        items = items.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk))
+
+    # Fetch one extra row to know whether there is another page
+    page = list(items[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    urls = bulk_urls(item.file for item in page)
+    return JsonResponse({
+        'results': [serialize_media_item(item, urls) for item in page],
+        'has_more': has_more,
+        'next_cursor': encode_cursor(page[-1]) if has_more else None,
+    })
+
+
+@staff_member_required
+def media_usage(request, uuid):
+    """
+    JSON list of the pages that show a media item.
+
+    These are the pages to purge from caches when the file changes.
+    ``site_wide`` is true when the item is used by the site settings (logo,
+    footer...), in which case every page shows it.
+    """
+    item = get_object_or_404(MediaItem, uuid=uuid)
+    pages = get_pages_using(item).order_by('pk')
+    return JsonResponse({
+        'id': item.pk,
+        'uuid': str(item.uuid),
+        'site_wide': is_used_site_wide(item),
+        'pages': [
+            {'id': page.pk, 'title': page.title, 'url': page.get_absolute_url(), 'status': page.status}
+            for page in pages
+        ],
+    })
+
+
+@require_safe
+def serve_media(request, uuid):
+    """
+    Deliver a media file with support for HTTP Range requests.
+
+    Files on local storage are streamed (or handed off to the front proxy);
+    files on remote storage such as S3 are redirected to, since the storage
+    service already supports ranges.
+    """
+    item = get_object_or_404(MediaItem.objects.only('file', 'file_name'), uuid=uuid)
+    if not item.file:
+        raise Http404('Media item has no file')
+
+    storage = item.file.storage
+    try:
+        path = storage.path(item.file.name)
+    except NotImplementedError:
+        return redirect(item.file.url)
+
+    if not storage.exists(item.file.name):
+        raise Http404('File not found')
+
+    return serve_file(request, path, item.file.name, item.file_name or item.file.name.rsplit('/', 1)[-1])
@@ -119,6 +119,30 @@ class Page(models.Model):
         else:
             return reverse('page_detail', kwargs={'slug': self.slug})
 
+    def get_template_names(self, theme_dir=''):
+        """Candidate templates for rendering this page, most specific first"""
+        # Try theme-specific template first
+        if theme_dir:
+            templates = [
+                f'themes/{theme_dir}/pages/{self.slug}.html',
+                f'themes/{theme_dir}/pages/default.html',
+            ]
+        else:
+            templates = []
+        
+        # Fall back to default templates
+        templates.extend([
+            f'pages/{self.slug}.html',
+            'pages/default.html',
+        ])
+        
+        if self.is_homepage:
+            if theme_dir:
+                templates.insert(0, f'themes/{theme_dir}/pages/home.html')
+            templates.insert(len(templates) - 1, 'pages/home.html')
+        
+        return templates
+
     def get_blocks(self):
         """Get all blocks for this page in the correct order"""
         return self.blocks.filter(is_active=True).order_by('position')
@@ -142,10 +166,7 @@ def get_available_templates():
     try:
         # Try to get templates from the Template model if it exists
         from themes.models import Template
-        template_choices = [
-            (template.slug, template.name) 
-            for template in Template.objects.filter(type='block')
-        ]
+        template_choices = list(Template.objects.filter(type='block').values_list('slug', 'name'))
         
         # Also scan the template directories for HTML files
         block_dir = os.path.join(settings.BASE_DIR, 'templates', 'blocks')
@@ -2,6 +2,7 @@
 
 from django.shortcuts import render
 from django.http import HttpResponse
+from django.template import TemplateSyntaxError
 from django.contrib.admin.views.decorators import staff_member_required
 import os
 from django.conf import settings
@@ -9,18 +10,29 @@ from django.conf import settings
 @staff_member_required
 def preview_template(request, template_name):
     """Preview a block template in the admin"""
-    # Check if template exists
+    from themes.models import Template
+    from themes.previews import get_sample_context, render_preview
+    
+    # Templates edited in the admin live in the database, others on disk
+    template_content = Template.objects.filter(type='block', slug=template_name).values_list('content', flat=True).first()
     template_path = os.path.join(settings.BASE_DIR, 'templates', 'blocks', f"{template_name}.html")
     
-    if os.path.exists(template_path):
+    if template_content is None and os.path.exists(template_path):
         # Read the template file
         with open(template_path, 'r') as f:
             template_content = f.read()
-            
-        # Return a simple preview
+    
+    if template_content is not None:
+        # Render with sample data through the shared preview cache
+        try:
+            preview = render_preview(template_content, get_sample_context('block'))
+        except TemplateSyntaxError as e:
+            preview = {'error': str(e)}
+        
         return render(request, 'pagebuilder/template_preview.html', {
             'template_name': template_name,
             'template_content': template_content,
+            'preview': preview,
         })
     else:
         return HttpResponse("Template not found")
\ No newline at end of file
@@ -1,4 +1,6 @@
 from django.conf import settings
+from django.db.models import Prefetch
+from core.tracing import traced
 from .models import SiteSettings, MenuItem
 
 
@@ -15,6 +17,7 @@ class SiteMiddleware:
         # Process response after view is called
         return response
 
+    @traced('middleware', 'SiteMiddleware')
     def process_template_response(self, request, response):
         """
         Add site-wide context to template responses
@@ -28,21 +31,25 @@ class SiteMiddleware:
             except:
                 response.context_data['site_settings'] = None
             
-            # Add menus
+            # Add menus, with pages and submenus loaded up front so that
+            # rendering them takes no further queries
             try:
-                response.context_data['header_menu'] = MenuItem.objects.filter(
+                menu_items = MenuItem.objects.select_related('page').prefetch_related(
+                    Prefetch('children', queryset=MenuItem.objects.select_related('page'))
+                )
+                response.context_data['header_menu'] = menu_items.filter(
                     position__in=['header', 'header_footer'],
                     parent__isnull=True,
                     is_active=True
                 ).order_by('order')
                 
-                response.context_data['footer_menu'] = MenuItem.objects.filter(
+                response.context_data['footer_menu'] = menu_items.filter(
                     position__in=['footer', 'header_footer'],
                     parent__isnull=True,
                     is_active=True
                 ).order_by('order')
                 
-                response.context_data['sidebar_menu'] = MenuItem.objects.filter(
+                response.context_data['sidebar_menu'] = menu_items.filter(
                     position='sidebar',
                     parent__isnull=True,
                     is_active=True
@@ -55,8 +62,8 @@ class SiteMiddleware:
             
             # Add theme context
             try:
-                from themes.models import Theme
-                active_theme = Theme.objects.filter(is_active=True).first()
+                from themes.theme_preview import get_active_theme
+                active_theme = get_active_theme()
                 response.context_data['active_theme'] = active_theme
             except:
                 response.context_data['active_theme'] = None
@@ -29,7 +29,7 @@ class PageSitemap(Sitemap):
         """
         if obj.is_homepage:
             return 1.0
-        elif obj.parent is None:
+        elif obj.parent_id is None:
             return 0.8
         else:
             return 0.5
\ No newline at end of file
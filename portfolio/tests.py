@@ -1,3 +1,69 @@
 from django.test import TestCase
 
-# Create your tests here.
+from core.queries import QueryBudgetExceeded
+from core.testing import assert_query_budget, query_budget
+from pagebuilder.models import Block, Page
+
+from .models import MenuItem
+
+
+class PageQueryBudgetTests(TestCase):
+    """
+    Public pages stay within settings.QUERY_BUDGETS however big the site is.
+    The budgets are for a warm process, so each page is requested once first
+    to compile and cache its templates.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.home = Page.objects.create(title='Home', slug='home', status='published', is_homepage=True)
+        cls.about = Page.objects.create(title='About', slug='about', status='published')
+        for position in range(5):
+            Block.objects.create(page=cls.about, label=f'Block {position}', type='template',
+                                 template_name='hero', position=position,
+                                 settings={'heading': 'Hello', 'background_image': '/media/uploads/hero.jpg'})
+
+    def assert_within_budget(self, path):
+        self.client.get(path)
+        assert_query_budget(self.client, path)
+
+    def add_menu(self, count):
+        for position in range(count):
+            parent = MenuItem.objects.create(title=f'Item {position}', position='header_footer', url='',
+                                             page=self.about, order=position)
+            MenuItem.objects.create(title=f'Child {position}', url='', page=self.home, parent=parent)
+
+    def test_home_page(self):
+        self.add_menu(3)
+        self.assert_within_budget('/')
+
+    def test_page_detail(self):
+        self.add_menu(3)
+        self.assert_within_budget('/about/')
+
+    def test_sitemap(self):
+        for index in range(10):
+            Page.objects.create(title=f'Page {index}', slug=f'page-{index}', status='published', parent=self.about)
+        self.assert_within_budget('/sitemap.xml')
+
+    def test_query_count_does_not_grow_with_the_menu(self):
+        self.add_menu(2)
+        self.client.get('/about/')
+        with query_budget() as small:
+            self.client.get('/about/')
+        self.add_menu(10)
+        with query_budget() as large:
+            self.client.get('/about/')
+        self.assertEqual(large.count, small.count)
+        self.assertEqual(large.duplicates, small.duplicates)
+
+    def test_repeated_queries_are_reported_with_their_location(self):
+        self.add_menu(3)
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(duplicates=0):
+                for item in MenuItem.objects.filter(parent__isnull=True):
+                    item.children.exists()
+        message = str(raised.exception)
+        self.assertIn('2 duplicate queries, budget 0', message)
+        self.assertIn('3x at portfolio/tests.py:', message)
+        self.assertIn('in test_repeated_queries_are_reported_with_their_location', message)
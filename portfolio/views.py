@@ -5,6 +5,7 @@ from django.views.generic import TemplateView, DetailView, FormView
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
+from media.models import MediaItem
 from pagebuilder.models import Page, Block
 from .forms import ContactForm, NewsletterForm
 from .models import SiteSettings, ContactMessage, NewsletterSubscriber
@@ -85,34 +86,14 @@ class PageDetailView(DetailView):
         theme_dir = ''
         
         try:
-            from themes.models import Theme
-            active_theme = Theme.objects.filter(is_active=True).first()
+            from themes.theme_preview import get_active_theme
+            active_theme = get_active_theme()
             if active_theme:
                 theme_dir = active_theme.directory
         except:
             pass
             
-        # Try theme-specific template first
-        if theme_dir:
-            templates = [
-                f'themes/{theme_dir}/pages/{page.slug}.html',
-                f'themes/{theme_dir}/pages/default.html',
-            ]
-        else:
-            templates = []
-        
-        # Fall back to default templates
-        templates.extend([
-            f'pages/{page.slug}.html',
-            'pages/default.html',
-        ])
-        
-        if page.is_homepage:
-            if theme_dir:
-                templates.insert(0, f'themes/{theme_dir}/pages/home.html')
-            templates.insert(len(templates) - 1, 'pages/home.html')
-        
-        return templates
+        return page.get_template_names(theme_dir)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -122,7 +103,16 @@ class PageDetailView(DetailView):
         context['site_settings'] = get_site_settings()
         
         # Add blocks to context
-        context['blocks'] = page.get_blocks()
+        context['blocks'] = blocks = list(page.get_blocks())
+        
+        # Placeholders for every media URL in the blocks' settings, in one
+        # query rather than one per block ({% get_media_placeholder %})
+        urls = set()
+        for block in blocks:
+            block_settings = block.get_settings()
+            if isinstance(block_settings, dict):
+                urls.update(value for value in block_settings.values() if isinstance(value, str) and value)
+        context['media_placeholders'] = MediaItem.objects.placeholders_for_urls(urls)
         
         # Add page settings
         context['page_settings'] = page.get_page_settings()
@@ -2,15 +2,20 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import format_html
+from django.conf import settings
+from .dependencies import get_affected
 from .models import Template
+from .profiling import update_profile
 
 @admin.register(Template)
 class TemplateAdmin(admin.ModelAdmin):
-    list_display = ('name', 'type', 'template_preview', 'updated_at')
+    list_display = ('name', 'type', 'template_preview', 'render_time_display', 'query_count', 'node_count', 'updated_at')
     list_filter = ('type', 'created_at', 'updated_at')
     search_fields = ('name', 'slug', 'description', 'content')
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ('created_at', 'updated_at', 'template_preview')
+    readonly_fields = ('created_at', 'updated_at', 'template_preview', 'affected_display',
+                       'render_time_ms', 'query_count', 'node_count', 'profile_error', 'profiled_at')
+    actions = ['profile_templates']
     fieldsets = (
         (_('Basic Information'), {
             'fields': ('name', 'slug', 'type', 'description')
@@ -18,6 +23,13 @@ class TemplateAdmin(admin.ModelAdmin):
         (_('Template Content'), {
             'fields': ('content', 'template_preview')
         }),
+        (_('Usage'), {
+            'fields': ('affected_display',)
+        }),
+        (_('Performance'), {
+            'fields': ('render_time_ms', 'query_count', 'node_count', 'profile_error', 'profiled_at'),
+            'description': _('Measured on save by rendering the template against sample data'),
+        }),
         (_('Metadata'), {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -34,6 +46,38 @@ class TemplateAdmin(admin.ModelAdmin):
         return "-"
     template_preview.short_description = _('Preview')
     
+    def affected_display(self, obj):
+        """Templates, pages and blocks affected by a change to this template"""
+        if not obj.pk:
+            return "-"
+        names, pages, blocks = get_affected(obj.get_template_name())
+        return format_html(
+            '{}<br>{}: {}<br>{}: {}',
+            ', '.join(sorted(names)),
+            _('Pages'), ', '.join(page.title for page in pages) or '-',
+            _('Blocks'), blocks.count(),
+        )
+    affected_display.short_description = _('Affected by changes')
+    
+    def render_time_display(self, obj):
+        """Render time, highlighted when over THEME_TEMPLATE_SLOW_MS"""
+        if obj.profile_error:
+            return format_html('<span style="color: #ba2121;" title="{}">{}</span>', obj.profile_error, _('error'))
+        if obj.render_time_ms is None:
+            return "-"
+        if obj.render_time_ms > getattr(settings, 'THEME_TEMPLATE_SLOW_MS', 50):
+            return format_html('<strong style="color: #ba2121;">{} ms</strong>', f'{obj.render_time_ms:.2f}')
+        return f'{obj.render_time_ms:.2f} ms'
+    render_time_display.short_description = _('Render Time')
+    render_time_display.admin_order_field = 'render_time_ms'
+    
+    def profile_templates(self, request, queryset):
+        """Admin action to measure render cost again, e.g. after content changes"""
+        for template in queryset:
+            update_profile(template)
+        self.message_user(request, _('%(count)d templates profiled.') % {'count': queryset.count()})
+    profile_templates.short_description = _('Profile render cost of selected templates')
+    
     class Media:
         css = {
             'all': ('css/codemirror.css',)
@@ -0,0 +1,262 @@
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.utils import timezone
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz variants are written
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:  # in requirements.txt; build_theme_assets warns when it is missing
+    rjsmin = None
+
+
+ASSETS_MANIFEST_FILENAME = 'assets.json'
+
+# URL prefix (under STATIC_URL) the assets root is served from; must match
+# the prefix of THEME_ASSETS_ROOT in STATICFILES_DIRS
+ASSETS_URL_PREFIX = 'themes'
+
+CSS_TOKEN_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)''', re.S)
+CSS_URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+CSS_IMPORT_RE = re.compile(r'''@import\s+(?:url\(\s*)?(['"]?)([^'")\s;]+)\1\s*\)?\s*;''')
+
+# In-memory asset manifests: {slug: (manifest file mtime or None, manifest)}
+_manifests = {}
+_lock = threading.Lock()
+
+
+def get_assets_root():
+    return getattr(settings, 'THEME_ASSETS_ROOT', os.path.join(settings.BASE_DIR, 'static_build'))
+
+
+def get_theme_assets_dir(theme):
+    return os.path.join(get_assets_root(), theme.slug)
+
+
+def get_static_path(path):
+    """
+    Turn a Theme.css_file/js_file value into a path relative to the static
+    folder, or None for remote URLs that cannot be bundled.
+    """
+    if not path or re.match(r'^([a-z]+:)?//', path):
+        return None
+    if path.startswith(settings.STATIC_URL):
+        path = path[len(settings.STATIC_URL):]
+    return path.lstrip('/')
+
+
+def get_bundle_sources(theme):
+    """
+    Static paths that go into each of a theme's bundles, in load order.
+
+    The theme stylesheet replaces css/style.css (as in base.html); the theme
+    script runs after js/main.js.
+    """
+    css = get_static_path(theme.css_file) if theme.css_file else 'css/style.css'
+    js = get_static_path(theme.js_file) if theme.js_file else None
+    return {
+        'css': [css] if css else [],
+        'js': ['js/main.js'] + ([js] if js else []),
+    }
+
+
+def read_static(path):
+    found = finders.find(path)
+    if not found:
+        raise FileNotFoundError(f'Static file not found: {path}')
+    with open(found, encoding='utf-8') as f:
+        return f.read()
+
+
+def rewrite_css_urls(css, path):
+    """Make relative url()s absolute, since the bundle lives in another directory"""
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        url = match.group(2).strip()
+        if re.match(r'^([a-z]+:|//|/|#)', url):
+            return match.group(0)
+        return f'url("{settings.STATIC_URL}{posixpath.normpath(posixpath.join(base, url))}")'
+
+    return CSS_URL_RE.sub(replace, css)
+
+
+def load_css(path, seen=None):
+    """Read a stylesheet with local @imports inlined and url()s rewritten"""
+    seen = set() if seen is None else seen
+    if path in seen:
+        return ''
+    seen.add(path)
+    base = posixpath.dirname(path)
+
+    def inline(match):
+        url = match.group(2)
+        if re.match(r'^([a-z]+:|//)', url):
+            return match.group(0)
+        if url.startswith(settings.STATIC_URL):
+            imported = url[len(settings.STATIC_URL):]
+        else:
+            imported = posixpath.normpath(posixpath.join(base, url))
+        return load_css(imported, seen)
+
+    return CSS_IMPORT_RE.sub(inline, rewrite_css_urls(read_static(path), path))
+
+
+def minify_css(css):
+    """Drop comments (except /*! ones) and collapse whitespace outside strings"""
+    parts = []
+    position = 0
+    for match in CSS_TOKEN_RE.finditer(css):
+        parts.append(compact_css(css[position:match.start()]))
+        if match.group(1):
+            parts.append(match.group(1))
+        elif match.group(2).startswith('/*!'):
+            parts.append(match.group(2))
+        position = match.end()
+    parts.append(compact_css(css[position:]))
+    return ''.join(parts).strip()
+
+
+def compact_css(css):
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}')
+
+
+def minify_js(js):
+    return rjsmin.jsmin(js) if rjsmin else js
+
+
+def build_bundle(kind, paths):
+    """Concatenate and minify the given static files; returns the bundle source"""
+    if kind == 'css':
+        seen = set()
+        return minify_css('\n'.join(load_css(path, seen) for path in paths))
+    # Separate scripts so a missing trailing semicolon can't join statements
+    return ';\n'.join(minify_js(read_static(path)).strip() for path in paths) + '\n'
+
+
+def write_compressed(path, data):
+    """Write precompressed .gz (and .br if brotli is installed) next to a file"""
+    with open(f'{path}.gz', 'wb') as f:
+        # mtime=0 keeps the output byte-identical between builds
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    if brotli is not None:
+        with open(f'{path}.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_theme_assets(theme):
+    """
+    Build a theme's bundles into THEME_ASSETS_ROOT/<slug>/ as
+    ``<kind>.<hash>.<ext>`` plus compressed variants, write its
+    assets.json and return the manifest.
+    """
+    output_dir = get_theme_assets_dir(theme)
+    os.makedirs(output_dir, exist_ok=True)
+
+    bundles = {}
+    sources = get_bundle_sources(theme)
+    for kind, paths in sources.items():
+        if not paths:
+            continue
+        data = build_bundle(kind, paths).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        filename = f'{kind}.{digest}.{kind}'
+        path = os.path.join(output_dir, filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+            write_compressed(path, data)
+        bundles[kind] = {'file': filename, 'size': len(data)}
+
+    manifest = {
+        'theme': theme.slug,
+        'built_at': timezone.now().isoformat(),
+        'bundles': bundles,
+        'sources': sources,
+        'previous': get_current_files(theme),
+    }
+    tmp_path = os.path.join(output_dir, f'{ASSETS_MANIFEST_FILENAME}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, ASSETS_MANIFEST_FILENAME))
+
+    prune_builds(theme, manifest)
+    return manifest
+
+
+def get_current_files(theme):
+    manifest = read_assets_manifest(theme)
+    if manifest is None:
+        return []
+    return [bundle['file'] for bundle in manifest['bundles'].values()]
+
+
+def prune_builds(theme, manifest):
+    """Delete bundles older than the previous build, which pages cached before a deploy may still use"""
+    keep = set(manifest['previous']) | {bundle['file'] for bundle in manifest['bundles'].values()}
+    output_dir = get_theme_assets_dir(theme)
+    for filename in os.listdir(output_dir):
+        if filename == ASSETS_MANIFEST_FILENAME:
+            continue
+        if re.sub(r'\.(gz|br)$', '', filename) not in keep:
+            os.remove(os.path.join(output_dir, filename))
+
+
+def read_assets_manifest(theme):
+    try:
+        with open(os.path.join(get_theme_assets_dir(theme), ASSETS_MANIFEST_FILENAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_assets_manifest(theme):
+    """A theme's asset manifest from memory, re-read when assets.json changes"""
+    path = os.path.join(get_theme_assets_dir(theme), ASSETS_MANIFEST_FILENAME)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+
+    cached = _manifests.get(theme.slug)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _lock:
+        manifest = read_assets_manifest(theme) if mtime is not None else None
+        _manifests[theme.slug] = (mtime, manifest)
+    return manifest
+
+
+def get_bundle_urls(theme):
+    """
+    Return {'css': url, 'js': url} for a theme's built bundles, or {} when
+    bundling is off (THEME_ASSET_BUNDLES) or the theme has not been built.
+    """
+    if not getattr(settings, 'THEME_ASSET_BUNDLES', not settings.DEBUG):
+        return {}
+    manifest = get_assets_manifest(theme)
+    if manifest is None:
+        return {}
+    # Rebuild needed if the theme's files changed since the build
+    if manifest['sources'] != get_bundle_sources(theme):
+        return {}
+    return {
+        kind: f"{settings.STATIC_URL}{ASSETS_URL_PREFIX}/{theme.slug}/{bundle['file']}"
+        for kind, bundle in manifest['bundles'].items()
+    }
@@ -1,7 +1,11 @@
 from django.conf import settings
-from .models import Theme, ThemeOption
+from core.tracing import traced
+from .assets import get_bundle_urls, get_static_path
+from .models import ThemeOption
+from .theme_preview import get_active_theme
 
 
+@traced('context_processor', 'theme_context')
 def theme_context(request):
     """
     Context processor that adds theme-related context to all templates
@@ -9,8 +13,8 @@ def theme_context(request):
     context = {}
     
     try:
-        # Get active theme
-        active_theme = Theme.objects.filter(is_active=True).first()
+        # Get active theme (or the theme staff are previewing)
+        active_theme = get_active_theme()
         
         if active_theme:
             context['theme'] = active_theme
@@ -30,6 +34,15 @@ def theme_context(request):
             
             if active_theme.js_file:
                 context['theme_js'] = active_theme.js_file
+            
+            # Built bundles (see themes.assets) replace the separate files
+            bundles = get_bundle_urls(active_theme)
+            if 'css' in bundles:
+                context['theme_css'] = bundles['css']
+            if 'js' in bundles:
+                context['theme_bundle_js'] = bundles['js']
+                if get_static_path(active_theme.js_file):
+                    context.pop('theme_js', None)
     except:
         # If there's any error, use default theme settings
         context['theme'] = None
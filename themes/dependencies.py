@@ -0,0 +1,173 @@
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.template import Engine, TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader_tags import ExtendsNode, IncludeNode
+
+from .loaders import get_template_name
+from .models import Template, TemplateDependency
+
+
+def get_constant_name(filter_expression):
+    """
+    Return the template name used by an {% extends %} or {% include %} tag,
+    or None if the name is only known at render time (a variable).
+    """
+    if isinstance(filter_expression.var, str) and not filter_expression.filters:
+        return str(filter_expression.var)
+    return None
+
+
+def find_dependencies(template):
+    """Return {(name, relation)} for the templates a compiled template extends or includes"""
+    found = set()
+    for node in template.nodelist.get_nodes_by_type(ExtendsNode):
+        name = get_constant_name(node.parent_name)
+        if name:
+            found.add((name, 'extends'))
+    for node in template.nodelist.get_nodes_by_type(IncludeNode):
+        name = get_constant_name(node.template)
+        if name:
+            found.add((name, 'include'))
+    return found
+
+
+def parse_dependencies(template_name):
+    """
+    Load a template the way rendering would (database first, then files)
+    and return its dependencies. Missing or broken templates have none.
+    """
+    try:
+        return find_dependencies(Engine.get_default().get_template(template_name))
+    except (TemplateDoesNotExist, TemplateSyntaxError):
+        return set()
+
+
+def update_dependencies(template_name):
+    """Re-parse one template and replace its edges in the graph"""
+    edges = parse_dependencies(template_name)
+    with transaction.atomic():
+        TemplateDependency.objects.filter(template_name=template_name).delete()
+        TemplateDependency.objects.bulk_create([
+            TemplateDependency(template_name=template_name, depends_on=name, relation=relation)
+            for name, relation in edges
+        ])
+    return edges
+
+
+def iter_filesystem_templates():
+    """Yield the names of the .html templates in DIRS and in the project's own apps"""
+    base_dir = str(settings.BASE_DIR)
+    directories = list(Engine.get_default().dirs)
+    for app_config in apps.get_app_configs():
+        if app_config.path.startswith(base_dir):
+            directories.append(os.path.join(app_config.path, 'templates'))
+
+    for directory in directories:
+        for root, dirnames, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith('.html'):
+                    path = os.path.relpath(os.path.join(root, filename), directory)
+                    yield path.replace(os.sep, '/')
+
+
+def rebuild_dependencies():
+    """Rebuild the whole graph from database and filesystem templates; returns the number of edges"""
+    names = set(iter_filesystem_templates())
+    names.update(get_template_name(template) for template in Template.objects.only('type', 'slug'))
+
+    edges = [
+        TemplateDependency(template_name=template_name, depends_on=name, relation=relation)
+        for template_name in sorted(names)
+        for name, relation in parse_dependencies(template_name)
+    ]
+    with transaction.atomic():
+        TemplateDependency.objects.all().delete()
+        TemplateDependency.objects.bulk_create(edges)
+    return len(edges)
+
+
+def get_dependents(template_names):
+    """
+    Return the given templates plus every template that extends or includes
+    them, directly or indirectly. Costs one query per level of the graph.
+    """
+    affected = set(template_names)
+    frontier = set(template_names)
+    while frontier:
+        parents = set(
+            TemplateDependency.objects.filter(depends_on__in=frontier).values_list('template_name', flat=True)
+        ) - affected
+        affected |= parents
+        frontier = parents
+    return affected
+
+
+def get_affected_blocks(template_names):
+    """Blocks rendered with any of the given templates (mirrors Block.get_template)"""
+    from pagebuilder.models import Block
+
+    slugs = {
+        name[len('blocks/'):-len('.html')] for name in template_names
+        if name.startswith('blocks/') and name.endswith('.html')
+    }
+    conditions = Q(type='template', template_name__in=slugs - {''})
+    if 'blocks/wysiwyg.html' in template_names:
+        conditions |= Q(type='wysiwyg')
+    if 'blocks/raw_html.html' in template_names:
+        conditions |= Q(type='html')
+    if 'blocks/default.html' in template_names:
+        conditions |= Q(type='template', template_name='') | ~Q(type__in=['template', 'wysiwyg', 'html'])
+    return Block.objects.filter(conditions)
+
+
+def get_affected_pages(template_names, blocks=None):
+    """
+    Pages whose output depends on any of the given templates.
+
+    A page is affected if one of its candidate templates (for the active
+    theme) or one of its blocks uses them. Candidates that would be shadowed
+    by a more specific template still count, so this errs on the side of
+    purging too much rather than too little.
+    """
+    from pagebuilder.models import Page
+
+    if blocks is None:
+        blocks = get_affected_blocks(template_names)
+
+    # Turn the names back into what Page.get_template_names builds them
+    # from, so the pages are found in SQL rather than by checking each one
+    theme = apps.get_model('themes', 'Theme').objects.filter(is_active=True).first()
+    prefixes = ['pages/']
+    if theme and theme.directory:
+        prefixes.append(f'themes/{theme.directory}/pages/')
+    slugs = set()
+    conditions = Q(pk__in=blocks.values('page_id'))
+    for name in template_names:
+        for prefix in prefixes:
+            if name.startswith(prefix) and name.endswith('.html'):
+                slug = name[len(prefix):-len('.html')]
+                if slug == 'default':
+                    # Every page falls back to the default template
+                    return Page.objects.all()
+                if slug == 'home':
+                    conditions |= Q(is_homepage=True)
+                slugs.add(slug)
+    if slugs:
+        conditions |= Q(slug__in=slugs)
+    return Page.objects.filter(conditions)
+
+
+def get_affected(template_names):
+    """
+    Return (template names, pages, blocks) affected by a change to the given
+    templates, following the extends/include graph.
+    """
+    if isinstance(template_names, str):
+        template_names = [template_names]
+    names = get_dependents(template_names)
+    blocks = get_affected_blocks(names)
+    return names, get_affected_pages(names, blocks), blocks
@@ -0,0 +1,195 @@
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.template import Origin, Template as DjangoTemplate, TemplateDoesNotExist
+from django.template.loaders.base import Loader as BaseLoader
+from django.template.loaders.cached import Loader as DjangoCachedLoader
+
+from core.metrics import count_cache
+
+from .theme_preview import get_cache_partition
+from .template_cache import CompiledTemplateCache, get_template_version
+
+
+# Directory each template type is addressed by, e.g. "blocks/hero.html"
+TEMPLATE_TYPE_DIRECTORIES = {
+    'page': 'pages',
+    'block': 'blocks',
+    'partial': 'partials',
+}
+
+TEMPLATE_NAME_RE = re.compile(r'^(?P<directory>pages|blocks|partials)/(?P<slug>[-\w]+)\.html$')
+
+# Marks names we looked up and know are not in the database
+MISSING = object()
+
+
+def parse_template_name(template_name):
+    """Return (type, slug) for names like "blocks/hero.html", or None"""
+    match = TEMPLATE_NAME_RE.match(template_name)
+    if match is None:
+        return None
+    directories = {directory: type for type, directory in TEMPLATE_TYPE_DIRECTORIES.items()}
+    return directories[match['directory']], match['slug']
+
+
+def get_template_name(template):
+    """Return the name a themes.Template is loaded by"""
+    return f"{TEMPLATE_TYPE_DIRECTORIES[template.type]}/{template.slug}.html"
+
+
+class Loader(BaseLoader):
+    """
+    Load templates from themes.Template rows.
+
+    A Template of type "block" with slug "hero" is served as
+    "blocks/hero.html" (likewise "pages/..." and "partials/..."), taking
+    precedence over files with the same name.
+
+    Compiled templates are kept in memory keyed by (type, slug, updated_at). Each
+    worker remembers which version of each name it last saw; when a
+    template is saved or deleted the shared version counter is bumped and
+    every worker looks the names up again on next use, recompiling only the
+    templates that actually changed. The counter is re-read at most every
+    ``THEME_TEMPLATE_VERSION_CHECK_INTERVAL`` seconds.
+
+    Theme previews get their own, smaller compiled caches (see
+    themes.theme_preview.get_cache_partition).
+    """
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.production_cache = CompiledTemplateCache(
+            getattr(settings, 'THEME_TEMPLATE_CACHE_SIZE', 500), name='database_templates',
+        )
+        self.preview_caches = {}
+        self.check_interval = getattr(settings, 'THEME_TEMPLATE_VERSION_CHECK_INTERVAL', 1.0)
+        self._names = {}
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def compiled(self):
+        """The compiled-template cache of the current request's partition"""
+        partition = get_cache_partition()
+        if partition is None:
+            return self.production_cache
+        cache = self.preview_caches.get(partition)
+        if cache is None:
+            size = getattr(settings, 'THEME_PREVIEW_TEMPLATE_CACHE_SIZE', 100)
+            cache = self.preview_caches.setdefault(partition, CompiledTemplateCache(size, name='database_templates_preview'))
+        return cache
+
+    def get_origin(self, template_name):
+        return Origin(name=f'themes.Template:{template_name}', template_name=template_name, loader=self)
+
+    def get_template_sources(self, template_name):
+        if parse_template_name(template_name) is not None:
+            yield self.get_origin(template_name)
+
+    def get_contents(self, origin):
+        from .models import Template
+
+        template_type, slug = parse_template_name(origin.template_name)
+        content = Template.objects.filter(type=template_type, slug=slug).values_list('content', flat=True).first()
+        if content is None:
+            raise TemplateDoesNotExist(origin)
+        return content
+
+    def get_template(self, template_name, skip=None):
+        parsed = parse_template_name(template_name)
+        if parsed is None:
+            raise TemplateDoesNotExist(template_name)
+
+        origin = self.get_origin(template_name)
+        if skip is not None and origin in skip:
+            raise TemplateDoesNotExist(template_name, tried=[(origin, 'Skipped to avoid recursion')])
+
+        self.check_version()
+        key = self._names.get(template_name)
+        if key is None:
+            key = self.lookup(template_name, parsed)
+        if key is MISSING:
+            raise TemplateDoesNotExist(template_name, tried=[(origin, 'Source does not exist')])
+
+        template = self.compiled.get(key)
+        if template is None:
+            template = self.compile(template_name, parsed, origin)
+        return template
+
+    def lookup(self, template_name, parsed):
+        """Find the (type, slug, updated_at) key of a name, remembering misses too"""
+        from .models import Template
+
+        template_type, slug = parsed
+        updated_at = Template.objects.filter(type=template_type, slug=slug).values_list('updated_at', flat=True).first()
+        key = MISSING if updated_at is None else (template_type, slug, updated_at)
+        self._names[template_name] = key
+        return key
+
+    def compile(self, template_name, parsed, origin):
+        from .models import Template
+
+        template_type, slug = parsed
+        row = Template.objects.filter(type=template_type, slug=slug).values_list('content', 'updated_at').first()
+        if row is None:
+            self._names[template_name] = MISSING
+            raise TemplateDoesNotExist(template_name, tried=[(origin, 'Source does not exist')])
+
+        content, updated_at = row
+        key = (template_type, slug, updated_at)
+        template = DjangoTemplate(content, origin, template_name, self.engine)
+        self._names[template_name] = key
+        self.compiled.set(key, template)
+        return template
+
+    def check_version(self):
+        """Forget which versions we know if another worker changed a template"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            version = get_template_version()
+            if version != self._version:
+                self._version = version
+                self._names = {}
+
+    def reset(self):
+        """Called on template changes in this process, and by Django's autoreloader"""
+        with self._lock:
+            self._names = {}
+            self._checked_at = 0
+
+
+class CachedLoader(DjangoCachedLoader):
+    """
+    Django's cached loader with a separate cache per theme preview, so
+    previewing a theme never adds to or evicts production's templates.
+    """
+    def __init__(self, engine, loaders):
+        self.preview_caches = {}
+        super().__init__(engine, loaders)
+
+    def get_template(self, template_name, skip=None):
+        hit = self.cache_key(template_name, skip) in self.get_template_cache
+        count_cache('file_templates' if get_cache_partition() is None else 'file_templates_preview',
+                    hits=hit, misses=not hit)
+        return super().get_template(template_name, skip)
+
+    @property
+    def get_template_cache(self):
+        partition = get_cache_partition()
+        if partition is None:
+            return self.production_cache
+        return self.preview_caches.setdefault(partition, {})
+
+    @get_template_cache.setter
+    def get_template_cache(self, value):
+        self.production_cache = value
+
+    def reset(self):
+        self.production_cache.clear()
+        self.preview_caches.clear()
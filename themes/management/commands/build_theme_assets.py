@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from themes.assets import brotli, build_theme_assets, get_theme_assets_dir, rjsmin
+from themes.models import Theme
+
+
+class Command(BaseCommand):
+    help = (
+        "Bundle and minify each theme's CSS and JS into content-hashed files "
+        'with precompressed .gz (and .br, if brotli is installed) variants. '
+        'Run before collectstatic on deploy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--theme', metavar='SLUG',
+                            help='Only build the assets of this theme')
+
+    def handle(self, *args, **options):
+        themes = Theme.objects.all()
+        if options['theme']:
+            themes = themes.filter(slug=options['theme'])
+            if not themes.exists():
+                raise CommandError(f"Theme '{options['theme']}' does not exist.")
+
+        if rjsmin is None:
+            self.stderr.write(self.style.WARNING(
+                'rjsmin is not installed, so JavaScript bundles are NOT minified, only concatenated. '
+                'Install the requirements (pip install -r requirements.txt) and build again.'
+            ))
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed; writing .gz variants only.'))
+
+        for theme in themes:
+            try:
+                manifest = build_theme_assets(theme)
+            except FileNotFoundError as e:
+                self.stderr.write(self.style.ERROR(f'{theme.slug}: {e}'))
+                continue
+            for kind, bundle in manifest['bundles'].items():
+                self.stdout.write(self.style.SUCCESS(
+                    f"{theme.slug}: {' + '.join(manifest['sources'][kind])} -> "
+                    f"{get_theme_assets_dir(theme)}/{bundle['file']} ({bundle['size']} bytes)"
+                ))
@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from themes.manifest import build_manifest, get_manifest_path, manifest_changed, read_manifest, write_manifest
+from themes.models import Theme
+
+
+class Command(BaseCommand):
+    help = (
+        "Write each theme's manifest.json: the path, mtime and hash of every "
+        'template in the theme directory, plus block metadata. Theme template '
+        'lookups are served from it. Run on deploy, or with --watch during '
+        'development.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--theme', metavar='SLUG',
+                            help='Only build the manifest of this theme')
+        parser.add_argument('--watch', action='store_true',
+                            help='Keep running and rewrite manifests when templates change')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds between checks with --watch (default: 1)')
+
+    def handle(self, *args, **options):
+        themes = Theme.objects.all()
+        if options['theme']:
+            themes = themes.filter(slug=options['theme'])
+            if not themes.exists():
+                raise CommandError(f"Theme '{options['theme']}' does not exist.")
+
+        for theme in themes:
+            if not os.path.isdir(theme.get_template_dir()):
+                self.stdout.write(self.style.WARNING(f'{theme.slug}: no template directory at {theme.get_template_dir()}'))
+                continue
+            manifest = write_manifest(theme)
+            self.stdout.write(self.style.SUCCESS(
+                f"{theme.slug}: {len(manifest['templates'])} templates -> {get_manifest_path(theme)}"
+            ))
+
+        if options['watch']:
+            self.stdout.write(f"Watching for template changes every {options['interval']}s (Ctrl+C to stop)")
+            try:
+                while True:
+                    time.sleep(options['interval'])
+                    # Re-query each time so new themes and directory changes are seen
+                    for theme in themes.all():
+                        self.refresh(theme)
+            except KeyboardInterrupt:
+                pass
+
+    def refresh(self, theme):
+        if not os.path.isdir(theme.get_template_dir()):
+            return
+        previous = read_manifest(theme)
+        manifest = build_manifest(theme, previous=previous)
+        if manifest_changed(previous, manifest):
+            write_manifest(theme, manifest)
+            self.stdout.write(f"{theme.slug}: manifest updated ({len(manifest['templates'])} templates)")
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from themes.models import Template
+from themes.profiling import update_profile
+
+
+class Command(BaseCommand):
+    help = (
+        'Render database templates against sample data and record their '
+        'render time, node count and query count, as shown in the admin.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Slugs of the templates to profile (default: all)')
+
+    def handle(self, *args, **options):
+        templates = Template.objects.order_by('type', 'slug')
+        if options['slugs']:
+            templates = templates.filter(slug__in=options['slugs'])
+
+        slow_ms = getattr(settings, 'THEME_TEMPLATE_SLOW_MS', 50)
+        for template in templates:
+            result = update_profile(template)
+            if result['profile_error']:
+                self.stdout.write(self.style.ERROR(f"{template.slug}: {result['profile_error']}"))
+                continue
+            line = (f"{template.slug}: {result['render_time_ms']:.2f} ms, "
+                    f"{result['node_count']} nodes, {result['query_count']} queries")
+            self.stdout.write(self.style.WARNING(line) if result['render_time_ms'] > slow_ms else line)
+        self.stdout.write(self.style.SUCCESS(f'Profiled {templates.count()} templates.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from themes.dependencies import get_affected, rebuild_dependencies
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the extends/include graph of database and filesystem '
+        'templates. Database templates are kept up to date on save; run this '
+        'after deploying template file changes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show', metavar='TEMPLATE',
+                            help='Afterwards, list what a change to this template affects, e.g. partials/footer.html')
+
+    def handle(self, *args, **options):
+        edges = rebuild_dependencies()
+        self.stdout.write(self.style.SUCCESS(f'Stored {edges} template dependencies.'))
+
+        if options['show']:
+            names, pages, blocks = get_affected(options['show'])
+            self.stdout.write(f"Templates: {', '.join(sorted(names))}")
+            self.stdout.write(f"Pages: {', '.join(page.slug for page in pages) or '-'}")
+            self.stdout.write(f"Blocks: {', '.join(str(block.pk) for block in blocks) or '-'}")
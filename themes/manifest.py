@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# In-memory manifests, keyed by theme template directory:
+# {template_dir: (manifest file mtime or None, manifest, time.monotonic() when built)}
+_manifests = {}
+_lock = threading.Lock()
+
+
+def get_manifest_path(theme):
+    return os.path.join(theme.get_template_dir(), MANIFEST_FILENAME)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def get_block_metadata(path):
+    """Metadata the block picker needs for a template in the theme's blocks/ directory"""
+    name = os.path.basename(path)[:-len('.html')]
+    return {'name': name, 'label': name.replace('_', ' ').title()}
+
+
+def build_manifest(theme, previous=None):
+    """
+    Walk the theme's template directory and describe every .html file.
+
+    Files whose mtime and size match ``previous`` (an earlier manifest)
+    keep their hash instead of being read again.
+    """
+    template_dir = theme.get_template_dir()
+    known = (previous or {}).get('templates', {})
+    templates = {}
+
+    for root, dirs, files in os.walk(template_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if not file.endswith('.html'):
+                continue
+            path = os.path.join(root, file)
+            rel_path = os.path.relpath(path, template_dir).replace(os.sep, '/')
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Removed while walking
+                continue
+
+            entry = {'mtime': stat.st_mtime, 'size': stat.st_size}
+            old = known.get(rel_path)
+            if old and old['mtime'] == entry['mtime'] and old['size'] == entry['size']:
+                entry['hash'] = old['hash']
+            else:
+                entry['hash'] = hash_file(path)
+            if os.path.dirname(rel_path) == 'blocks':
+                entry['block'] = get_block_metadata(rel_path)
+            templates[rel_path] = entry
+
+    return {
+        'version': MANIFEST_VERSION,
+        'theme': theme.slug,
+        'directory': theme.directory,
+        'generated_at': timezone.now().isoformat(),
+        'templates': templates,
+    }
+
+
+def manifest_changed(old, new):
+    """True if two manifests describe different files (generated_at aside)"""
+    return old is None or old.get('templates') != new['templates']
+
+
+def write_manifest(theme, manifest=None):
+    """Write the theme's manifest.json (atomically) and return the manifest"""
+    if manifest is None:
+        manifest = build_manifest(theme, previous=read_manifest(theme))
+    path = get_manifest_path(theme)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_manifest(theme):
+    """Read the theme's manifest.json, or None if it is missing, unreadable or outdated"""
+    try:
+        with open(get_manifest_path(theme), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def get_manifest(theme):
+    """
+    Return the theme's manifest from memory.
+
+    manifest.json is re-read only when its mtime changes (one stat per
+    call). Without a manifest file the directory is walked again at most
+    every THEME_MANIFEST_CHECK_INTERVAL seconds, so added, removed and
+    edited templates show up without a restart; only changed files are
+    hashed again. Run ``build_theme_manifest`` to write one.
+    """
+    template_dir = theme.get_template_dir()
+    try:
+        mtime = os.stat(os.path.join(template_dir, MANIFEST_FILENAME)).st_mtime
+    except OSError:
+        mtime = None
+
+    now = time.monotonic()
+    cached = _manifests.get(template_dir)
+    if cached is not None and cached[0] == mtime:
+        if mtime is not None or now - cached[2] < getattr(settings, 'THEME_MANIFEST_CHECK_INTERVAL', 2.0):
+            return cached[1]
+
+    with _lock:
+        manifest = read_manifest(theme) if mtime is not None else None
+        if manifest is None:
+            manifest = build_manifest(theme, previous=cached[1] if cached is not None else None)
+        _manifests[template_dir] = (mtime, manifest, now)
+    return manifest
+
+
+def clear_manifests():
+    """Forget the manifests held in memory"""
+    with _lock:
+        _manifests.clear()
@@ -0,0 +1,52 @@
+from django.utils.cache import add_never_cache_headers, patch_vary_headers
+
+from .theme_preview import PREVIEW_PARAM, get_preview_max_age, preview_theme, unsign_preview
+
+
+class ThemePreviewMiddleware:
+    """
+    Let staff render the site with another theme without activating it.
+
+    A signed ``?theme_preview=<token>`` (see themes.theme_preview.sign_preview)
+    starts preview mode and stores the token in a cookie so links keep
+    working; ``?theme_preview=off`` ends it. Preview responses are marked
+    private and uncacheable. Must come after AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        param = request.GET.get(PREVIEW_PARAM)
+        token = param or request.COOKIES.get(PREVIEW_PARAM)
+        theme = None
+        if token and token != 'off' and request.user.is_staff:
+            theme = self.get_theme(token)
+
+        if theme is None:
+            response = self.get_response(request)
+        else:
+            request.theme_preview = theme
+            reset_token = preview_theme.set(theme)
+            try:
+                response = self.get_response(request)
+            finally:
+                preview_theme.reset(reset_token)
+            add_never_cache_headers(response)
+
+        if param and theme is not None:
+            response.set_cookie(PREVIEW_PARAM, param, max_age=get_preview_max_age(),
+                                httponly=True, samesite='Lax')
+        elif param or (token and theme is None):
+            # Turned off, or an invalid, expired or non-staff token
+            response.delete_cookie(PREVIEW_PARAM, samesite='Lax')
+        if PREVIEW_PARAM in request.COOKIES:
+            patch_vary_headers(response, ('Cookie',))
+        return response
+
+    def get_theme(self, token):
+        from .models import Theme
+
+        slug = unsign_preview(token)
+        if slug is None:
+            return None
+        return Theme.objects.filter(slug=slug).first()
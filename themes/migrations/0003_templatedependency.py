@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-19 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('themes', '0002_template'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TemplateDependency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('template_name', models.CharField(db_index=True, max_length=255, verbose_name='Template')),
+                ('depends_on', models.CharField(db_index=True, max_length=255, verbose_name='Depends On')),
+                ('relation', models.CharField(choices=[('extends', 'Extends'), ('include', 'Includes')], max_length=10, verbose_name='Relation')),
+            ],
+            options={
+                'verbose_name': 'Template Dependency',
+                'verbose_name_plural': 'Template Dependencies',
+                'unique_together': {('template_name', 'depends_on', 'relation')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-19 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('themes', '0003_templatedependency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='template',
+            name='node_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Node Count'),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='profile_error',
+            field=models.TextField(blank=True, editable=False, verbose_name='Profiling Error'),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='profiled_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Profiled At'),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='query_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Query Count'),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='render_time_ms',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Render Time (ms)'),
+        ),
+    ]
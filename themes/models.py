@@ -5,6 +5,7 @@ from colorfield.fields import ColorField
 import os
 import json
 from django.core.exceptions import ValidationError
+from django.template import TemplateSyntaxError
 
 
 
@@ -61,40 +62,18 @@ class Theme(models.Model):
         return os.path.join(settings.THEME_PATHS, self.directory)
     
     def get_available_templates(self):
-        """Returns a list of available templates for this theme"""
-        templates = []
-        template_dir = self.get_template_dir()
-        
-        try:
-            for root, dirs, files in os.walk(template_dir):
-                for file in files:
-                    if file.endswith('.html'):
-                        # Get relative path from theme directory
-                        rel_path = os.path.relpath(os.path.join(root, file), template_dir)
-                        templates.append(rel_path)
-        except Exception:
-            # Directory might not exist yet
-            pass
-            
-        return templates
+        """Returns a list of available templates for this theme (from its manifest)"""
+        from .manifest import get_manifest
+        return list(get_manifest(self)['templates'])
     
     def get_block_templates(self):
-        """Returns a list of available block templates for this theme"""
-        block_templates = []
-        template_dir = os.path.join(self.get_template_dir(), 'blocks')
-        
-        try:
-            if os.path.exists(template_dir):
-                for file in os.listdir(template_dir):
-                    if file.endswith('.html'):
-                        # Remove .html extension
-                        template_name = file[:-5]
-                        block_templates.append((template_name, template_name.replace('_', ' ').title()))
-        except Exception:
-            # Directory might not exist yet
-            pass
-            
-        return block_templates
+        """Returns a list of available block templates for this theme (from its manifest)"""
+        from .manifest import get_manifest
+        return [
+            (entry['block']['name'], entry['block']['label'])
+            for entry in get_manifest(self)['templates'].values()
+            if 'block' in entry
+        ]
 
 
 class ThemeOption(models.Model):
@@ -211,6 +190,13 @@ class Template(models.Model):
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
     
+    # Render cost, measured against sample data on save (see themes.profiling)
+    render_time_ms = models.FloatField(_('Render Time (ms)'), null=True, blank=True, editable=False)
+    node_count = models.PositiveIntegerField(_('Node Count'), null=True, blank=True, editable=False)
+    query_count = models.PositiveIntegerField(_('Query Count'), null=True, blank=True, editable=False)
+    profile_error = models.TextField(_('Profiling Error'), blank=True, editable=False)
+    profiled_at = models.DateTimeField(_('Profiled At'), null=True, blank=True, editable=False)
+    
     class Meta:
         verbose_name = _('Template')
         verbose_name_plural = _('Templates')
@@ -219,15 +205,28 @@ class Template(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_type_display()})"
     
-    def save(self, *args, **kwargs):
-        # Save the template to the database
-        super().save(*args, **kwargs)
+    def clean(self):
+        # Reject templates that don't compile, instead of failing when visited
+        from .profiling import compile_template
         
-        # Also save it to the file system for Django to use
-        self.save_to_filesystem()
+        if self.content:
+            try:
+                compile_template(self.content)
+            except TemplateSyntaxError as e:
+                raise ValidationError({'content': _('Template syntax error: %(error)s') % {'error': e}})
+    
+    def get_template_name(self):
+        """Name this template is loaded by, e.g. "blocks/hero.html" (see themes.loaders)"""
+        from .loaders import get_template_name
+        return get_template_name(self)
     
     def save_to_filesystem(self):
-        """Save the template to the filesystem so Django can use it"""
+        """
+        Export the template to the filesystem.
+        
+        Not needed for rendering: templates are served from the database by
+        themes.loaders.Loader.
+        """
         from django.conf import settings
         
         # Determine directory based on template type
@@ -246,4 +245,28 @@ class Template(models.Model):
         filepath = os.path.join(directory, filename)
         
         with open(filepath, 'w', encoding='utf-8') as file:
-            file.write(self.content)            
\ No newline at end of file
+            file.write(self.content)            
+
+
+class TemplateDependency(models.Model):
+    """
+    Edge of the template dependency graph: ``template_name`` extends or
+    includes ``depends_on``. Covers database and filesystem templates and is
+    maintained by themes.dependencies.
+    """
+    RELATION_CHOICES = (
+        ('extends', _('Extends')),
+        ('include', _('Includes')),
+    )
+    
+    template_name = models.CharField(_('Template'), max_length=255, db_index=True)
+    depends_on = models.CharField(_('Depends On'), max_length=255, db_index=True)
+    relation = models.CharField(_('Relation'), max_length=10, choices=RELATION_CHOICES)
+    
+    class Meta:
+        verbose_name = _('Template Dependency')
+        verbose_name_plural = _('Template Dependencies')
+        unique_together = ('template_name', 'depends_on', 'relation')
+    
+    def __str__(self):
+        return f"{self.template_name} {self.relation} {self.depends_on}"
@@ -0,0 +1,106 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.template import Engine, Node, RequestContext, Template as DjangoTemplate, TemplateSyntaxError
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .previews import get_sample_context
+
+
+# Renders per profile; the median time is recorded
+PROFILE_RUNS = 5
+
+
+def compile_template(content):
+    """Compile template source with the project's engine, raising TemplateSyntaxError"""
+    return DjangoTemplate(content, engine=Engine.get_default())
+
+
+def count_nodes(compiled):
+    """Number of nodes in a compiled template, including nested ones"""
+    return len(compiled.nodelist.get_nodes_by_type(Node))
+
+
+def get_profile_request():
+    """An anonymous GET request for a host the site accepts"""
+    hosts = [host for host in settings.ALLOWED_HOSTS if host and host[0] not in '.*']
+    request = RequestFactory().get('/', SERVER_NAME=hosts[0] if hosts else 'localhost')
+    request.user = AnonymousUser()
+    return request
+
+
+def get_profile_context(template):
+    """
+    Context to profile a template with: a real block or page that uses it
+    when there is one, so lazy lookups and queries are representative, and
+    the preview sample data otherwise.
+    """
+    from pagebuilder.models import Block, Page
+    from portfolio.models import SiteSettings
+
+    if template.type == 'block':
+        block = Block.objects.filter(type='template', template_name=template.slug).select_related('page').first()
+        if block:
+            return {'block': block, 'page': block.page}
+    elif template.type == 'page':
+        published = Page.objects.filter(status='published')
+        page = published.filter(slug=template.slug).first() or published.first()
+        if page:
+            return {
+                'page': page,
+                'blocks': page.get_blocks(),
+                'page_settings': page.get_page_settings(),
+                'site_settings': SiteSettings.objects.first(),
+            }
+    return get_sample_context(template.type)
+
+
+def profile_template(template, runs=PROFILE_RUNS):
+    """
+    Compile a themes.Template and render it against a representative context.
+
+    Returns a dict with ``render_time_ms`` (median of ``runs`` renders),
+    ``node_count``, ``query_count`` (ORM queries triggered by one render) and
+    ``profile_error`` if it could not be compiled or rendered.
+    """
+    result = {'render_time_ms': None, 'node_count': None, 'query_count': None, 'profile_error': ''}
+    try:
+        compiled = compile_template(template.content)
+    except TemplateSyntaxError as e:
+        result['profile_error'] = str(e)
+        return result
+    result['node_count'] = count_nodes(compiled)
+
+    request = get_profile_request()
+    timings = []
+    try:
+        for run in range(runs):
+            # A fresh context each time, so querysets are evaluated again
+            context = RequestContext(request, get_profile_context(template))
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                compiled.render(context)
+                timings.append((time.perf_counter() - started) * 1000)
+            if run == 0:
+                result['query_count'] = len(queries.captured_queries)
+    except Exception as e:
+        result['profile_error'] = f'{e.__class__.__name__}: {e}'
+        return result
+
+    result['render_time_ms'] = statistics.median(timings)
+    return result
+
+
+def update_profile(template):
+    """Profile a template and store the results without touching updated_at"""
+    result = profile_template(template)
+    result['profiled_at'] = timezone.now()
+    type(template).objects.filter(pk=template.pk).update(**result)
+    for field, value in result.items():
+        setattr(template, field, value)
+    return result
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal
+from django.template import engines
+
+from .loaders import Loader, get_template_name
+from .template_cache import bump_template_version
+
+
+# Sent after a database template changes, with ``template_names``: the
+# changed template and every template that extends or includes it. Receivers
+# can purge page and fragment caches for just those templates, e.g. using
+# themes.dependencies.get_affected_pages().
+templates_changed = Signal()
+
+
+def reset_local_loaders():
+    """Make this process's database template loaders look templates up again"""
+    for engine in engines.all():
+        for loader in getattr(getattr(engine, 'engine', None), 'template_loaders', []):
+            if isinstance(loader, Loader):
+                loader.reset()
+
+
+def remember_old_name(sender, instance, raw=False, **kwargs):
+    # A change of slug or type renames the template; both names are affected
+    instance._old_template_name = None
+    if instance.pk and not raw:
+        old = sender.objects.filter(pk=instance.pk).values('type', 'slug').first()
+        if old:
+            instance._old_template_name = get_template_name(sender(**old))
+
+
+def template_changed(sender, instance, **kwargs):
+    from .dependencies import get_dependents, update_dependencies
+
+    bump_template_version()
+    reset_local_loaders()
+
+    names = {get_template_name(instance)}
+    if getattr(instance, '_old_template_name', None):
+        names.add(instance._old_template_name)
+    for name in names:
+        update_dependencies(name)
+
+    if templates_changed.has_listeners(sender):
+        templates_changed.send(sender=sender, instance=instance, template_names=get_dependents(names))
+
+
+def profile_saved_template(sender, instance, raw=False, **kwargs):
+    from .profiling import update_profile
+
+    # Off by default: profiling renders the template several times, which
+    # would slow down every save in the admin. When enabled, it runs once the
+    # save has committed, outside the transaction.
+    if not raw and getattr(settings, 'THEME_TEMPLATE_PROFILE_ON_SAVE', False):
+        transaction.on_commit(lambda: update_profile(instance))
+
+
+def connect_signals():
+    from .models import Template
+
+    pre_save.connect(remember_old_name, sender=Template, dispatch_uid='themes_template_pre_save')
+    post_save.connect(template_changed, sender=Template, dispatch_uid='themes_template_saved')
+    post_save.connect(profile_saved_template, sender=Template, dispatch_uid='themes_template_profile')
+    post_delete.connect(template_changed, sender=Template, dispatch_uid='themes_template_deleted')
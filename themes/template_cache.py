@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.metrics import count_cache
+
+
+VERSION_KEY = 'themes:template_version'
+
+
+class CompiledTemplateCache:
+    """
+    Thread-safe, bounded LRU of compiled templates.
+
+    Keys are anything hashable that changes whenever the template source
+    does, e.g. (slug, updated_at), so stale entries are never returned and
+    simply fall out of the cache. Lookups are counted in core.metrics
+    under ``name``.
+    """
+    def __init__(self, max_size=500, name='templates'):
+        self.max_size = max_size
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            template = self._entries.get(key)
+            if template is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+        count_cache(self.name, hits=template is not None, misses=template is None)
+        return template
+
+    def set(self, key, template):
+        with self._lock:
+            self._entries[key] = template
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_version_cache():
+    """The cache shared by all workers that holds the template version counter"""
+    return caches[getattr(settings, 'THEME_TEMPLATE_CACHE', 'default')]
+
+
+def get_template_version():
+    """Return the current template version, shared by all workers"""
+    cache = get_version_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Missing or evicted: start from a value no worker has seen before
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_template_version():
+    """Tell every worker that database templates have changed"""
+    cache = get_version_cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(VERSION_KEY, version, None)
+        return version
@@ -0,0 +1,53 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+
+
+# Query parameter and cookie carrying a signed theme slug. The salt predates
+# the module's rename and is kept so that issued tokens stay valid
+PREVIEW_PARAM = 'theme_preview'
+PREVIEW_SALT = 'themes.preview'
+
+# Theme being previewed in the current request, set by ThemePreviewMiddleware
+preview_theme = ContextVar('preview_theme', default=None)
+
+
+def get_preview_max_age():
+    return getattr(settings, 'THEME_PREVIEW_MAX_AGE', 60 * 60 * 8)
+
+
+def sign_preview(theme):
+    """A token that lets staff preview ``theme``, valid for THEME_PREVIEW_MAX_AGE seconds"""
+    return signing.TimestampSigner(salt=PREVIEW_SALT).sign(theme.slug)
+
+
+def unsign_preview(token):
+    """Return the theme slug in a preview token, or None if it is invalid or expired"""
+    try:
+        return signing.TimestampSigner(salt=PREVIEW_SALT).unsign(token, max_age=get_preview_max_age())
+    except signing.BadSignature:
+        return None
+
+
+def get_active_theme():
+    """
+    The theme to render the current request with: the previewed theme for
+    staff in preview mode, the active theme otherwise (or None).
+    """
+    from .models import Theme
+
+    theme = preview_theme.get()
+    if theme is not None:
+        return theme
+    return Theme.objects.filter(is_active=True).first()
+
+
+def get_cache_partition():
+    """
+    Name of the compiled-template cache partition for the current request:
+    None in production, one per theme in preview, so preview renders never
+    fill or evict production's caches.
+    """
+    theme = preview_theme.get()
+    return None if theme is None else f'preview:{theme.slug}'
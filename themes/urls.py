@@ -11,4 +11,5 @@ urlpatterns = [
     path('templates/delete/<int:template_id>/', views.delete_template, name='delete_template'),
     path('templates/import/', views.import_template, name='import_template'),
     path('templates/export/<int:template_id>/', views.export_template, name='export_template'),
+    path('preview/<slug:slug>/', views.preview_theme, name='preview_theme'),
 ]
\ No newline at end of file
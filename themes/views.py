@@ -1,10 +1,14 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import HttpResponse
-from django.template import Template as DjangoTemplate, Context
+from django.template import TemplateSyntaxError
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.translation import gettext_lazy as _
-from .models import Template
+from .models import Template, Theme
+from .theme_preview import PREVIEW_PARAM, sign_preview
+from .previews import get_sample_context, render_preview
 
 @staff_member_required
 def template_dashboard(request):
@@ -26,37 +30,17 @@ def preview_template(request, template_id):
     """Preview a template with sample data"""
     template = get_object_or_404(Template, pk=template_id)
     
-    # Create sample data based on template type
-    sample_data = {}
-    if template.type == 'page':
-        sample_data = {
-            'page': {
-                'title': 'Sample Page',
-                'content': 'This is sample content for preview.',
-                'meta_title': 'Sample Page Title',
-                'meta_description': 'Sample meta description',
-            },
-            'blocks': []
-        }
-    elif template.type == 'block':
-        sample_data = {
-            'block': {
-                'id': 1,
-                'label': 'Sample Block',
-                'css_class': 'sample-block',
-                'position': 1,
-                'get_style': 'background-color: #f5f5f5; padding: 20px;',
-                'content': 'This is sample block content for preview.',
-            }
-        }
-    
-    # Render the template with sample data
-    django_template = DjangoTemplate(template.content)
-    html = django_template.render(Context(sample_data))
+    # Render with sample data, reusing the compiled template when the
+    # source hasn't changed since the last preview
+    try:
+        preview = render_preview(template.content, get_sample_context(template.type))
+    except TemplateSyntaxError as e:
+        preview = {'error': str(e)}
     
     return render(request, 'themes/preview.html', {
         'template': template,
-        'html': html,
+        'html': preview.get('html', ''),
+        'preview': preview,
         'raw_template': template.content,
     })
 
@@ -80,9 +64,12 @@ def create_template(request):
         )
         
         try:
+            template.full_clean()
             template.save()
             messages.success(request, _('Template created successfully.'))
             return redirect('themes:dashboard')
+        except ValidationError as e:
+            messages.error(request, _(f'Error creating template: {" ".join(e.messages)}'))
         except Exception as e:
             messages.error(request, _(f'Error creating template: {str(e)}'))
     
@@ -107,9 +94,12 @@ def edit_template(request, template_id):
         template.content = request.POST.get('content')
         
         try:
+            template.full_clean()
             template.save()
             messages.success(request, _('Template updated successfully.'))
             return redirect('themes:dashboard')
+        except ValidationError as e:
+            messages.error(request, _(f'Error updating template: {" ".join(e.messages)}'))
         except Exception as e:
             messages.error(request, _(f'Error updating template: {str(e)}'))
     
@@ -157,9 +147,12 @@ def import_template(request):
                 content=content
             )
             
+            template.full_clean()
             template.save()
             messages.success(request, _('Template imported successfully.'))
             return redirect('themes:dashboard')
+        except ValidationError as e:
+            messages.error(request, _(f'Error importing template: {" ".join(e.messages)}'))
         except Exception as e:
             messages.error(request, _(f'Error importing template: {str(e)}'))
     
@@ -173,4 +166,15 @@ def export_template(request, template_id):
     response = HttpResponse(template.content, content_type='text/html')
     response['Content-Disposition'] = f'attachment; filename="{template.slug}.html"'
     
-    return response
\ No newline at end of file
+    return response
+
+
+@staff_member_required
+def preview_theme(request, slug):
+    """Browse the site with a theme without activating it (for this staff user only)"""
+    theme = get_object_or_404(Theme, slug=slug)
+    next_url = request.GET.get('next', '/')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = '/'
+    separator = '&' if '?' in next_url else '?'
+    return redirect(f'{next_url}{separator}{PREVIEW_PARAM}={sign_preview(theme)}')